@@ -1,170 +1,1214 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+try:
+    import tkinter as tk # Only the window needs Tk, command-line runs work without it
+    from tkinter import ttk, filedialog, messagebox
+except ImportError:
+    tk = ttk = filedialog = messagebox = None
 import pandas as pd
 import numpy as np # For pd.NA / np.nan
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
+try:
+    import xlsxwriter # Optional, used by the Fast output writer
+except ImportError:
+    xlsxwriter = None
+try:
+    import python_calamine # Optional, Rust-backed xlsx reader used by the Calamine input reader
+except ImportError:
+    python_calamine = None
 import threading
 import datetime
 from dateutil.relativedelta import relativedelta
 import os
 import subprocess
 import sys
+import math
+import time
+import logging
+import logging.handlers
+import collections
+import concurrent.futures
+import hashlib
+import importlib.util
+import pickle
+import functools
+from fadl_metrics import (METRICS_FILE_PATH, RUN_STATS_COLUMNS, RunStats, write_run_report,
+                          update_metrics_file) # Shared with Step 2, next to this script
 
-class LoadProcessorApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("FADL Load Processor - New Logic") 
-        self.root.geometry("875x500") 
-        self.root.minsize(600, 500)
-
-        self.file_path_var = tk.StringVar()
-        self.month_var = tk.StringVar()
-        self.start_load_type_var = tk.StringVar(value="FinalAvailabilityHourly") 
-        self.custom_load_var = tk.DoubleVar(value=0.0)
-        self.export_dir_var = tk.StringVar()
-        self.df_dispatch = None
-        self.df_availability = None
-        self.availability_series_hourly_lookup = None 
 
-        main_frame = ttk.Frame(root, padding="10")
-        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        root.columnconfigure(0, weight=1)
-        root.rowconfigure(0, weight=1)
+def ramp_load(seg, positions):
+    """
+    Load of a 'ramp' segment at whole minute positions (an int or an array). Like the minute
+    loop, the rate is added to the start value once per minute up to the minute 'stop', so the
+    float rounding accumulates the same way and rounded results match it exactly.
+    """
+    steps = np.minimum(positions, seg['stop']) - seg['start']
+    accumulated = np.cumsum(np.concatenate(([seg['value']], np.full(int(np.max(steps, initial=0)), seg['rate']))))
+    return accumulated[steps]
 
-        file_frame = ttk.LabelFrame(main_frame, text="Input File", padding="10")
-        file_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), padx=5, pady=5)
-        file_frame.columnconfigure(1, weight=1)
-        ttk.Label(file_frame, text="Excel File:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        ttk.Entry(file_frame, textvariable=self.file_path_var, width=60).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
-        ttk.Button(file_frame, text="Browse...", command=self.browse_file).grid(row=0, column=2, sticky=tk.E, padx=5, pady=5)
 
-        config_frame = ttk.LabelFrame(main_frame, text="Processing Configuration", padding="10")
-        config_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
-        config_frame.columnconfigure(1, weight=1)
-        ttk.Label(config_frame, text="Month to Process:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        self.month_combo = ttk.Combobox(config_frame, textvariable=self.month_var, state="readonly", width=15)
-        self.month_combo.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
-        self.month_combo['values'] = ["Select a file first"]
-        ttk.Label(config_frame, text="Starting Load Type:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
-        final_avail_radio = ttk.Radiobutton(config_frame, 
-                                            text="Use Final Availability (hourly from Col D)", 
-                                            variable=self.start_load_type_var, 
-                                            value="FinalAvailabilityHourly", 
-                                            command=self.toggle_custom_load_entry)
-        final_avail_radio.grid(row=1, column=1, sticky=tk.W, padx=5, pady=2)
-        custom_load_frame = ttk.Frame(config_frame) 
-        custom_load_frame.grid(row=2, column=1, sticky=(tk.W, tk.E), padx=0, pady=0) 
-        custom_radio = ttk.Radiobutton(custom_load_frame, 
-                                       text="Custom Load:", 
-                                       variable=self.start_load_type_var, 
-                                       value="Custom", 
-                                       command=self.toggle_custom_load_entry)
-        custom_radio.grid(row=0, column=0, sticky=tk.W, pady=2)
-        self.custom_load_entry = ttk.Entry(custom_load_frame, 
-                                           textvariable=self.custom_load_var, 
-                                           width=10, 
-                                           state=tk.DISABLED) 
-        self.custom_load_entry.grid(row=0, column=1, sticky=tk.W, padx=5, pady=2)
-        
-        export_frame = ttk.LabelFrame(main_frame, text="Output", padding="10")
-        export_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5) 
-        export_frame.columnconfigure(1, weight=1)
-        ttk.Label(export_frame, text="Export Folder:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        ttk.Entry(export_frame, textvariable=self.export_dir_var, width=40).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
-        ttk.Button(export_frame, text="Browse...", command=self.browse_export_dir).grid(row=0, column=2, sticky=tk.E, padx=5, pady=5)
+def round_like_python(values, decimals):
+    """
+    values rounded to decimals exactly like round(), which the minute loop uses. np.round
+    (scale, round half to even, scale back) can be one last-place unit off for values within
+    rounding error of a half unit, so those few are rounded with round() itself.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+    scaled = values * 10.0 ** decimals
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+        rounded[i] = round(float(values[i]), decimals)
+    return rounded
 
-        run_frame = ttk.Frame(main_frame, padding="10")
-        run_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), padx=5, pady=5)
-        run_frame.columnconfigure(0, weight=1) 
-        self.process_button = ttk.Button(run_frame, text="Start Processing", command=self.start_processing_thread, width=20)
-        self.process_button.grid(row=0, column=1, sticky=tk.E, padx=5, pady=5)
-        self.progress_bar = ttk.Progressbar(run_frame, orient=tk.HORIZONTAL, mode='determinate')
-        self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=5, pady=5)
-        
-        log_frame = ttk.LabelFrame(main_frame, text="Status Log", padding="10")
-        log_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
-        log_frame.columnconfigure(0, weight=1)
-        log_frame.rowconfigure(0, weight=1) 
-        self.log_text = tk.Text(log_frame, height=10, wrap=tk.WORD, state=tk.DISABLED)
-        log_scroll = ttk.Scrollbar(log_frame, orient=tk.VERTICAL, command=self.log_text.yview)
-        self.log_text['yscrollcommand'] = log_scroll.set
-        self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        log_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        
-        self.status_log("Application started. Please select an Excel file.")
-        self.toggle_custom_load_entry() 
 
-    def browse_file(self):
-        file_path = filedialog.askopenfilename(title="Select Excel File", filetypes=(("Excel files", "*.xlsx *.xls"), ("All files", "*.*")))
-        if file_path:
-            self.file_path_var.set(file_path)
-            self.status_log(f"Selected input file: {file_path}")
-            self.df_dispatch, self.df_availability, self.availability_series_hourly_lookup = None, None, None
-            self.process_button.config(state=tk.DISABLED) 
-            _, _, available_months = self.read_excel_data(file_path) 
-            if self.df_dispatch is not None and available_months: 
-                self.month_combo['values'] = available_months
-                self.month_var.set(available_months[0] if available_months else "")
-                self.status_log(f"Available months populated: {available_months if available_months else 'None'}")
-                if self.df_availability is not None : 
-                    self.process_button.config(state=tk.NORMAL) 
-                    self._prepare_hourly_availability_lookup()
+def build_load_segments(parsed_instructions, month_start_dt, total_minutes, minute_availability, start_load, start_following_fcbl, log=None,
+                        checkpoints=None, resume=None):
+    """
+    Turn the sorted dispatch instructions of one month into piecewise load segments.
+    Each segment is a dict covering minute positions [start, end) of the month:
+      'hold' - constant 'value'
+      'ramp' - 'value' plus 'rate' once per minute from 'start' to 'stop' (see ramp_load)
+      'fcbl' - follows minute_availability, using 'fallback' (or the last known load, seeded
+               with 'seed') for minutes without availability
+    Instruction matching follows the minute loop: an instruction only applies when it falls
+    exactly on a minute, and one that never matches blocks all later instructions.
+    If checkpoints is a list, the engine state before each applied instruction (and before the
+    end of the month) is appended to it as {'position', 'state', 'segment_count'}. resume, an
+    (applied instruction index, state, segments before it) triple from an earlier run with the
+    same instructions up to that index, continues from there instead of the start of the month.
+    """
+    log = log or (lambda message: None)
+    month_start = pd.Timestamp(month_start_dt)
+    one_minute = pd.Timedelta(minutes=1)
+
+    def minute_position(ts):
+        return (pd.Timestamp(ts) - month_start) / one_minute
+
+    def value_at(seg, i):
+        if seg['kind'] == 'hold':
+            return seg['value']
+        if seg['kind'] == 'ramp':
+            return float(ramp_load(seg, i))
+        if not np.isnan(minute_availability[i]):
+            return float(minute_availability[i])
+        if pd.notna(seg['fallback']):
+            return seg['fallback']
+        window = minute_availability[seg['start']:i]
+        valid = np.flatnonzero(~np.isnan(window))
+        return float(window[valid[-1]]) if valid.size else seg['seed']
+
+    def target_reached_state(i, target, post_type, label):
+        if post_type == "FCBL":
+            if not np.isnan(minute_availability[i]):
+                log(f"    {label} FCBL. Load set to: {minute_availability[i]:.2f} MW.")
+                return {'kind': 'fcbl', 'start': i, 'fallback': target, 'seed': target}
+            log(f"    {label} FCBL, no availability. Load remains target: {target:.2f} MW.")
+        return {'kind': 'hold', 'start': i, 'value': target}
+
+    segments = []
+
+    def close(seg, end):
+        if end > seg['start']:
+            seg['end'] = end
+            segments.append(seg)
+
+    def finish_ramp_before(position, current):
+        # An on-grid ramp end snaps to target, unless an instruction arrives on that same minute
+        if current['kind'] == 'ramp' and current['end_index'] is not None and current['end_index'] < position:
+            end_index = current['end_index']
+            close(current, end_index)
+            log(f"  Minute {(month_start + end_index * one_minute).strftime('%H:%M')}: Ongoing ramp ended. Load at target: {current['target']:.2f} MW.")
+            return target_reached_state(end_index, current['target'], current['post_type'], "Post-ramp")
+        return current
+
+    applicable = []
+    last_position = -1
+    for instr in parsed_instructions:
+        position = minute_position(instr['instr_time'])
+        if not float(position).is_integer() or position <= last_position or not 0 <= position < total_minutes:
+            log(f"Warning: Instruction at {instr['instr_time']} does not fall on a new minute of the month. It and the {len(parsed_instructions) - len(applicable) - 1} instruction(s) after it are not applied.")
+            break
+        applicable.append((int(position), instr))
+        last_position = position
+
+    if resume is not None:
+        resume_index, resume_state, resume_segments = resume
+        current = dict(resume_state)
+        segments.extend(resume_segments)
+        applicable = applicable[resume_index:]
+    elif start_following_fcbl:
+        current = {'kind': 'fcbl', 'start': 0, 'fallback': np.nan, 'seed': float(start_load)}
+    else:
+        current = {'kind': 'hold', 'start': 0, 'value': float(start_load)}
+
+    def save_checkpoint(position):
+        if checkpoints is not None:
+            checkpoints.append({'position': position, 'state': dict(current), 'segment_count': len(segments)})
+
+    for position, instr in applicable:
+        save_checkpoint(position)
+        current = finish_ramp_before(position, current)
+        pre_load = value_at(current, position)
+        close(current, position)
+
+        ts = instr['instr_time']
+        target = float(instr['target_demand_mw'])
+        post_type = instr['post_ramp_target_type']
+        target_ts = instr['target_time_stamp']
+        duration = instr['ramp_duration_minutes']
+        log(f"  Minute {ts.strftime('%H:%M')}: Instruction at {ts}. Target: {target:.2f}, Duration: {duration}, TargetTime: {target_ts}, PostRamp: {post_type}")
+
+        if pd.notna(target_ts) and target_ts == ts:
+            log(f"    Instantaneous change to target: {target:.2f} MW.")
+            current = target_reached_state(position, target, post_type, "Instantaneous")
+        elif pre_load == target:
+            log(f"    Load {pre_load:.2f} already at new target. No ramp. Checking post-ramp.")
+            current = target_reached_state(position, target, post_type, "No-ramp")
+        else:
+            if pd.notna(target_ts) and target_ts > ts:
+                ramp_end_position = minute_position(target_ts)
+                effective_duration_minutes = max(1.0, ramp_end_position - position)
+                if abs(effective_duration_minutes - duration) > 1 and duration > 0:
+                    log(f"    Note: Ramp Duration (Col C: {duration} min) differs from time to Target Time Stamp (Col B). Using duration to Target Time Stamp ({effective_duration_minutes:.1f} min).")
+                duration = effective_duration_minutes
             else:
-                self.month_combo['values'] = ["Error reading/parsing file"]
-                self.month_var.set("")
-                self.status_log("Could not populate months. Check file/sheet integrity and Dispatch Col A for dates.")
-        else: self.status_log("File selection cancelled.")
+                ramp_end_position = position + duration
+                if pd.notna(target_ts):
+                    log(f"    Warning: Target Time Stamp {target_ts} is not in future or invalid. Using Ramp Duration {duration} min.")
+            rate = (target - pre_load) / duration
+            end_index = int(ramp_end_position) if float(ramp_end_position).is_integer() else None
+            current = {'kind': 'ramp', 'start': position, 'value': pre_load, 'rate': rate,
+                       'stop': math.ceil(ramp_end_position), 'end_index': end_index,
+                       'target': target, 'post_type': post_type}
+            log(f"    New ramp started. Rate: {rate:.2f} MW/min towards {target:.2f} by {(month_start + ramp_end_position * one_minute).strftime('%Y-%m-%d %H:%M')}.")
 
-    def browse_export_dir(self):
-        dir_path = filedialog.askdirectory(title="Select Export Directory")
-        if dir_path: self.export_dir_var.set(dir_path); self.status_log(f"Selected export directory: {dir_path}")
-        else: self.status_log("Export directory selection cancelled.")
+    save_checkpoint(total_minutes)
+    current = finish_ramp_before(total_minutes, current)
+    close(current, total_minutes)
+    return segments
+
+
+def render_load_segments(segments, total_minutes, minute_availability, base_load=None, from_minute=0):
+    """
+    Fill the minute-level load array for a month from build_load_segments output.
+    With base_load, minutes before from_minute are copied from it and only segments reaching
+    from_minute are rendered.
+    """
+    load = np.empty(total_minutes, dtype=np.float64) if base_load is None else np.array(base_load, dtype=np.float64)
+    positions = np.arange(total_minutes)
+    for seg in segments:
+        start, end = seg['start'], seg['end']
+        if end <= from_minute:
+            continue
+        if seg['kind'] == 'hold':
+            load[start:end] = seg['value']
+        elif seg['kind'] == 'ramp':
+            load[start:end] = ramp_load(seg, positions[start:end])
+        else:
+            avail = minute_availability[start:end]
+            valid = ~np.isnan(avail)
+            if pd.notna(seg['fallback']):
+                load[start:end] = np.where(valid, avail, seg['fallback'])
+            else:
+                last_valid = np.maximum.accumulate(np.where(valid, np.arange(end - start), -1))
+                load[start:end] = np.where(last_valid >= 0, avail[np.maximum(last_valid, 0)], seg['seed'])
+    return load
+
+
+ENGINE_CHECKPOINT_VERSION = 2 # Bump when build_load_segments / render_load_segments change their results
+
+
+def instruction_key(instr):
+    """Comparable identity of a parsed dispatch instruction, used to diff runs."""
+    target_ts = instr['target_time_stamp']
+    return (pd.Timestamp(instr['instr_time']), pd.Timestamp(target_ts) if pd.notna(target_ts) else None,
+            float(instr['ramp_duration_minutes']), instr['post_ramp_target_type'], float(instr['target_demand_mw']))
+
+
+def engine_inputs_key(month_start_dt, start_load, start_following_fcbl, minute_availability):
+    """Hash of everything besides the instructions that the segment engine result depends on."""
+    inputs_hash = hashlib.sha256(f"{ENGINE_CHECKPOINT_VERSION}|{pd.Timestamp(month_start_dt)}|{float(start_load)!r}|{bool(start_following_fcbl)}".encode('utf-8'))
+    inputs_hash.update(np.ascontiguousarray(minute_availability, dtype=np.float64).tobytes())
+    return inputs_hash.hexdigest()
+
+
+def find_resume_point(checkpoint, inputs_key, parsed_instructions, month_start_dt):
+    """
+    Where a run with parsed_instructions can pick up from the checkpoint of an earlier run
+    (see LoadProcessor._run_segment_engine): (applied instruction index to resume at, first
+    minute whose load can differ). None when the checkpoint cannot be used.
+    """
+    if checkpoint is None or checkpoint['inputs'] != inputs_key:
+        return None
+    old_keys = checkpoint['instructions']
+    new_keys = [instruction_key(instr) for instr in parsed_instructions]
+    first_changed = 0
+    while first_changed < min(len(old_keys), len(new_keys)) and old_keys[first_changed] == new_keys[first_changed]:
+        first_changed += 1
+    # Instructions past the last applied one were blocked in the earlier run, and still are
+    resume_index = min(first_changed, len(checkpoint['states']) - 1)
+    first_minute = checkpoint['states'][resume_index]['position']
+    if resume_index == first_changed and first_changed < len(new_keys):
+        new_position = (pd.Timestamp(new_keys[first_changed][0]) - pd.Timestamp(month_start_dt)) / pd.Timedelta(minutes=1)
+        first_minute = min(first_minute, max(0, math.floor(new_position)))
+    return resume_index, first_minute
+
+
+def compute_lpm_half_hourly(timestamps, load, previous=None, from_minute=0):
+    """
+    LPM (30 Min Sum) for every :00 and :30 minute: the sum of Load / 30 over the 30 minutes
+    ending at that minute (minutes 1-30, and minutes 31 to the next hour's :00).
+    Half-hours without a full window in the data (the first minute of the month) are NaN.
+    With previous (the result for the same timestamps), half-hours ending before from_minute
+    are taken from it. Returns a float Series indexed by the half-hour timestamps.
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    per_minute = np.asarray(load, dtype=np.float64) / 30.0
+    positions = np.flatnonzero((timestamps.minute % 30 == 0) & (timestamps.second == 0))
+    lpm = np.full(len(positions), np.nan)
+    complete = positions >= 29
+    if previous is not None and previous.index.equals(timestamps[positions]):
+        reused = positions < from_minute
+        lpm[reused] = previous.to_numpy()[reused]
+        complete &= ~reused
+    if len(per_minute) >= 30 and complete.any():
+        windows = np.lib.stride_tricks.sliding_window_view(per_minute, 30)
+        lpm[complete] = np.round(windows[positions[complete] - 29].sum(axis=1), 5)
+    return pd.Series(lpm, index=timestamps[positions], name='LPM (30 Min Sum)')
+
+
+def availability_column(minute_availability):
+    """Availability output column: float64 rounded to 2 decimals, NaN (a blank cell) for minutes without availability."""
+    return round_like_python(minute_availability, 2)
+
+
+def lpm_column(timestamps, lpm_half_hourly=None):
+    """
+    LPM (30 Min Sum) output column as a nullable Float64 array: the half-hourly LPM on its
+    rows, missing elsewhere (all missing without lpm_half_hourly).
+    """
+    values = np.full(len(timestamps), np.nan)
+    if lpm_half_hourly is not None:
+        positions = pd.Series(timestamps).searchsorted(lpm_half_hourly.index)
+        values[positions] = lpm_half_hourly.to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.arrays.FloatingArray(values, np.isnan(values))
+
+
+def carry_over_state(segments, total_minutes, minute_availability):
+    """
+    Engine state at the start of the next month, from the segments of a month: the segment
+    active at the end of the month, moved to minute 0. A ramp keeps its rate and remaining
+    duration, FCBL mode keeps its fallback target and the last known load as seed.
+    """
+    state = {key: value for key, value in segments[-1].items() if key != 'end'}
+    if state['kind'] == 'ramp':
+        state['value'] = float(ramp_load(state, total_minutes))
+        state['stop'] = max(0, state['stop'] - total_minutes)
+        if state['end_index'] is not None:
+            state['end_index'] -= total_minutes
+    elif state['kind'] == 'fcbl':
+        window = minute_availability[state['start']:total_minutes]
+        valid = np.flatnonzero(~np.isnan(window))
+        if valid.size:
+            state['seed'] = float(window[valid[-1]])
+    state['start'] = 0
+    return state
+
+
+def compute_month_load(month_start_dt, parsed_instructions, minute_availability, segments):
+    """
+    Load, Target Load and Highlight_Row of one month from its load segments (built from the
+    state the previous month handed over, see carry_over_state). parsed_instructions are the
+    instructions whose windows reach the month (see carry_instruction_windows).
+    """
+    total_minutes = len(minute_availability)
+    timestamps = pd.date_range(start=month_start_dt, periods=total_minutes, freq='min')
+    load = render_load_segments(segments, total_minutes, minute_availability)
+    target_load, highlight_rows = mark_instruction_windows(timestamps, parsed_instructions)
+    return pd.DataFrame({
+        'Date Time Stamp': timestamps,
+        'Availability': availability_column(minute_availability),
+        'Load': round_like_python(load, 3),
+        'Target Load': target_load,
+        'Highlight_Row': highlight_rows,
+    })
+
+
+def combine_month_results(month_results):
+    """One result frame for consecutive months, with LPM (30 Min Sum) computed across month boundaries."""
+    # Merging the category lists keeps Target Load as codes, concat would turn it into strings
+    target_load = pd.api.types.union_categoricals([month_df['Target Load'] for month_df in month_results])
+    results_df = pd.concat([month_df.drop(columns='Target Load') for month_df in month_results], ignore_index=True)
+    results_df.insert(3, 'Target Load', target_load)
+    lpm_half_hourly = compute_lpm_half_hourly(results_df['Date Time Stamp'], results_df['Load'].to_numpy(dtype=np.float64))
+    results_df['LPM (30 Min Sum)'] = lpm_column(results_df['Date Time Stamp'], lpm_half_hourly)
+    results_df.attrs['lpm_half_hourly'] = lpm_half_hourly
+    return results_df
+
+
+def instruction_window_end(instr):
+    """When the highlighted window of an instruction ends: its Target Time Stamp, else instruction time + Ramp Duration."""
+    if pd.notna(instr['target_time_stamp']):
+        return pd.Timestamp(instr['target_time_stamp'])
+    return pd.Timestamp(instr['instr_time']) + datetime.timedelta(minutes=instr['ramp_duration_minutes'])
+
+
+def carry_instruction_windows(previous_instructions, month_start_dt, parsed_instructions):
+    """
+    The instructions to mark a month with in a multi-month run: those of earlier months whose
+    windows are still open at month_start_dt, then the month's own.
+    """
+    month_start = pd.Timestamp(month_start_dt)
+    return [instr for instr in previous_instructions if instruction_window_end(instr) >= month_start] + list(parsed_instructions)
+
+
+def mark_instruction_windows(timestamps, parsed_instructions):
+    """
+    Target Load labels and Highlight_Row flags for the sorted minute timestamps of a month.
+    Each instruction labels the row at its instruction time and highlights the rows from the
+    instruction time until its target is due (Target Time Stamp, else instruction time + Ramp
+    Duration). Windows are found by binary search and filled as slices.
+    Returns (categorical Target Load, boolean highlight array).
+    """
+    stamps = np.asarray(timestamps, dtype='datetime64[ns]')
+    codes = np.full(len(stamps), -1, dtype=np.int32)
+    highlight_edges = np.zeros(len(stamps) + 1, dtype=np.int32)
+    label_codes = {}
+    for instr in parsed_instructions:
+        instr_time = pd.Timestamp(instr['instr_time'])
+        target_time = instr['target_time_stamp']
+
+        # Create the target load string
+        if instr['post_ramp_target_type'] == 'FCBL':
+            target_load_text = 'FCBL'
+        else:
+            target_load_text = f"{instr['target_demand_mw']:.0f} MW"
+
+        # Add timestamp if available
+        if pd.notna(target_time):
+            target_load_display = f"{target_load_text} @ {target_time.strftime('%d.%b.%y %H:%M')}"
+        else:
+            target_load_display = target_load_text
+        ramp_end_time = instruction_window_end(instr)
+
+        start = np.searchsorted(stamps, instr_time.to_datetime64(), side='left')
+        if start < len(stamps) and stamps[start] == instr_time.to_datetime64():
+            codes[start] = label_codes.setdefault(target_load_display, len(label_codes))
+        end = np.searchsorted(stamps, ramp_end_time.to_datetime64(), side='right')
+        if end > start:
+            highlight_edges[start] += 1
+            highlight_edges[end] -= 1
+    target_load = pd.Categorical.from_codes(codes, categories=list(label_codes))
+    return target_load, np.cumsum(highlight_edges[:-1]) > 0
+
+
+INSTRUCTION_ISSUE_COLUMNS = ['Row', 'Notification Time', 'Issue', 'Detail']
+INSTRUCTION_ISSUES_LOGGED = 20 # The rest only go to the Instruction Check file
+
+
+def _instruction_dtype(text_width):
+    """Fields of the instruction table; Row is the sheet row of the instruction."""
+    return np.dtype([('row', np.int64), ('instr_time', 'datetime64[ns]'), ('target_time_stamp', 'datetime64[ns]'),
+                     ('ramp_duration_minutes', np.float64), ('post_ramp_target_type', f'U{max(text_width, 1)}'),
+                     ('target_demand_mw', np.float64)])
+
+
+def parse_dispatch_table(df_dispatch):
+    """
+    Parse the Dispatch Instructions rows (Cols A-F) into a structured array sorted by
+    Notification Time, with the fields of _instruction_dtype (Target Time Stamp NaT when
+    missing, a missing or non-positive Ramp Duration defaulted to 1 minute). Rows without a
+    Notification Time or Target Demand are dropped. Also checks the instructions the way the
+    engines will see them and returns (table, issues) where issues is a DataFrame of
+    INSTRUCTION_ISSUE_COLUMNS. An instruction off the minute grid, or at the same time as the
+    previous one, is never applied and stops every later instruction of its month.
+    """
+    issues = []
+    if df_dispatch is None or len(df_dispatch.columns) < 6:
+        return np.empty(0, dtype=_instruction_dtype(1)), pd.DataFrame(issues, columns=INSTRUCTION_ISSUE_COLUMNS)
+    if pd.api.types.is_integer_dtype(df_dispatch.index):
+        rows = df_dispatch.index.to_numpy(dtype=np.int64) + 2 # Sheet rows below the header
+    else:
+        rows = np.arange(len(df_dispatch), dtype=np.int64) + 2
+    instr_times = pd.to_datetime(df_dispatch.iloc[:, 0], errors='coerce').to_numpy(dtype='datetime64[ns]')
+    target_times = pd.to_datetime(df_dispatch.iloc[:, 1], errors='coerce').to_numpy(dtype='datetime64[ns]')
+    durations = pd.to_numeric(df_dispatch.iloc[:, 2], errors='coerce').to_numpy(dtype=np.float64)
+    post_types = df_dispatch.iloc[:, 4].astype(str).str.upper().str.strip().fillna('').to_numpy(dtype=str)
+    target_mw = pd.to_numeric(df_dispatch.iloc[:, 5], errors='coerce').to_numpy(dtype=np.float64)
+
+    for missing, column_name in ((np.isnat(instr_times), 'Notification Time (Col A)'), (np.isnan(target_mw) & ~np.isnat(instr_times), 'Target Demand (Col F)')):
+        for row in rows[missing]:
+            issues.append((int(row), pd.NaT, 'missing value', f"No valid {column_name}; the row is ignored."))
+    keep = ~np.isnat(instr_times) & ~np.isnan(target_mw)
+    order = np.flatnonzero(keep)[np.argsort(instr_times[keep], kind='stable')]
+    table = np.empty(len(order), dtype=_instruction_dtype(max((len(text) for text in post_types[order]), default=1)))
+    table['row'] = rows[order]
+    table['instr_time'] = instr_times[order]
+    table['target_time_stamp'] = target_times[order]
+    table['ramp_duration_minutes'] = durations[order]
+    table['post_ramp_target_type'] = post_types[order]
+    table['target_demand_mw'] = target_mw[order]
+
+    invalid_duration = ~(table['ramp_duration_minutes'] > 0)
+    table['ramp_duration_minutes'][invalid_duration] = 1.0
+    for instr in table[invalid_duration]:
+        issues.append((instr['row'], instr['instr_time'], 'invalid duration', "Missing or non-positive Ramp Duration (Col C); defaulted to 1 minute."))
+
+    times, targets = table['instr_time'], table['target_time_stamp']
+    months = times.astype('datetime64[M]')
+    # Instructions left of the month after each position; an instruction the engines skip also stops all of them
+    later_in_month = np.searchsorted(months, months, side='right') - np.arange(len(table)) - 1
+    off_minute = times != times.astype('datetime64[m]')
+    for position in np.flatnonzero(off_minute):
+        instr = table[position]
+        issues.append((instr['row'], instr['instr_time'], 'not on a minute', f"Notification Time is not on a whole minute; it and the {later_in_month[position]} later instruction(s) of its month are not applied."))
+    same_time = np.zeros(len(table), dtype=bool)
+    same_time[1:] = times[1:] == times[:-1]
+    for position in np.flatnonzero(same_time & ~off_minute):
+        instr, previous = table[position], table[position - 1]
+        if all(instr[field] == previous[field] or (field == 'target_time_stamp' and np.isnat(instr[field]) and np.isnat(previous[field]))
+               for field in table.dtype.names if field != 'row'):
+            issue = 'duplicate'
+            detail = f"Same instruction as row {previous['row']}"
+        else:
+            issue = 'same time'
+            detail = f"Same Notification Time as row {previous['row']}"
+        issues.append((instr['row'], instr['instr_time'], issue, f"{detail}; it and the {later_in_month[position]} later instruction(s) of its month are not applied."))
+    past_target = targets < times
+    for instr in table[past_target]:
+        issues.append((instr['row'], instr['instr_time'], 'target in the past',
+                       f"Target Time Stamp {pd.Timestamp(instr['target_time_stamp']):%d.%b.%y %H:%M} is before the Notification Time; the Ramp Duration is used instead."))
+    # Where the ramp of each instruction should end: its Target Time Stamp, else after its Ramp Duration
+    ramp_ends = np.where(targets > times, targets, times + (table['ramp_duration_minutes'] * 60e9).astype('timedelta64[ns]'))
+    ramp_ends = np.where(targets == times, times, ramp_ends) # Instantaneous
+    overlapping = np.zeros(len(table), dtype=bool)
+    overlapping[:-1] = (ramp_ends[:-1] > times[1:]) & (months[:-1] == months[1:]) & ~same_time[1:]
+    for position in np.flatnonzero(overlapping):
+        instr, following = table[position], table[position + 1]
+        issues.append((instr['row'], instr['instr_time'], 'overlapping ramp',
+                       f"Ramp until {pd.Timestamp(ramp_ends[position]):%d.%b.%y %H:%M} is cut short by the instruction at {pd.Timestamp(following['instr_time']):%d.%b.%y %H:%M} (row {following['row']})."))
+    issues_df = pd.DataFrame(issues, columns=INSTRUCTION_ISSUE_COLUMNS)
+    issues_df['Notification Time'] = pd.to_datetime(issues_df['Notification Time'])
+    issues_df = issues_df.sort_values(['Row', 'Issue'], kind='stable', ignore_index=True)
+    return table, issues_df
+
+
+def instruction_dicts(table):
+    """The parsed instruction dicts the engines take, from rows of a parse_dispatch_table table."""
+    return [{'instr_time': pd.Timestamp(instr_time),
+             'target_time_stamp': pd.Timestamp(target_time) if not np.isnat(target_time) else None,
+             'ramp_duration_minutes': float(duration),
+             'post_ramp_target_type': str(post_type),
+             'target_demand_mw': float(target_mw)}
+            for instr_time, target_time, duration, post_type, target_mw in zip(table['instr_time'], table['target_time_stamp'], table['ramp_duration_minutes'],
+                                                                                table['post_ramp_target_type'], table['target_demand_mw'])]
+
+
+def write_fadl_workbook_fast(result_df, export_path, run_stats_rows=None):
+    """
+    Write the FADL_Calculation and half-hourly summary sheets with XlsxWriter in constant-memory
+    (row streaming) mode. Number formats are set once per column, timestamps are written as
+    Excel serial numbers and highlighted instruction periods become conditional-formatting
+    ranges instead of per-cell fills. run_stats_rows (RunStats.rows) add a 'Run Stats' sheet.
+    Returns the number of summary rows written.
+    """
+    excel_epoch = np.datetime64('1899-12-30T00:00:00', 'ns')
+
+    def excel_serials(stamps):
+        return ((np.asarray(stamps, dtype='datetime64[ns]') - excel_epoch) / np.timedelta64(1, 'D')).tolist()
+
+    def cell_values(column):
+        # Missing values become blank cells, XlsxWriter cannot write NaN or pd.NA
+        return [None if pd.isna(v) else v for v in column.astype(object).tolist()]
+
+    def column_width(title, column):
+        if title == 'Date Time Stamp':
+            return 22
+        if title == 'Target Load':
+            return 25
+        values = pd.to_numeric(column, errors='coerce').dropna()
+        data_len = len(f"{values.abs().max():.3f}") if not values.empty else 0
+        return min(max((max(len(title), data_len) + 2) * 1.1, 10), 50)
+
+    cols = ['Date Time Stamp', 'Availability', 'Load', 'Target Load', 'LPM (30 Min Sum)']
+    cols = [col for col in cols if col in result_df.columns]
+    workbook = xlsxwriter.Workbook(export_path, {'constant_memory': True})
+    try:
+        header_format = workbook.add_format({'bold': True, 'font_color': '#FFFFFF', 'font_name': 'Calibri',
+                                             'bg_color': '#0070C0', 'align': 'center', 'valign': 'vcenter'})
+        date_format = workbook.add_format({'num_format': 'dd.mmm.yy hh:mm'})
+        number_formats = {'Availability': workbook.add_format({'num_format': '#,##0.00'}),
+                          'Load': workbook.add_format({'num_format': '#,##0.00'}),
+                          'LPM (30 Min Sum)': workbook.add_format({'num_format': '#,##0.000'})}
+        highlight_format = workbook.add_format({'bg_color': '#FFFFCD'})
+
+        worksheet = workbook.add_worksheet("FADL_Calculation")
+        for col_idx, col_name in enumerate(cols):
+            col_format = date_format if col_name == 'Date Time Stamp' else number_formats.get(col_name)
+            worksheet.set_column(col_idx, col_idx, column_width(col_name, result_df[col_name]), col_format)
+        worksheet.freeze_panes(1, 0)
+        worksheet.write_row(0, 0, cols, header_format)
+        columns = [excel_serials(result_df[col]) if col == 'Date Time Stamp' else cell_values(result_df[col]) for col in cols]
+        for row_idx, row in enumerate(zip(*columns), start=1):
+            worksheet.write_row(row_idx, 0, row)
+
+        # Highlight rows during dispatch instruction periods (from instruction until target met)
+        if 'Highlight_Row' in result_df.columns and cols:
+            edges = np.diff(np.concatenate(([0], result_df['Highlight_Row'].to_numpy(dtype=np.int8), [0])))
+            band_starts, band_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+            last_col = xlsxwriter.utility.xl_col_to_name(len(cols) - 1)
+            bands = [f"A{start + 2}:{last_col}{end + 2}" for start, end in zip(band_starts, band_ends)]
+            for chunk_start in range(0, len(bands), 100):
+                chunk = bands[chunk_start:chunk_start + 100]
+                worksheet.conditional_format(chunk[0], {'type': 'formula', 'criteria': '=TRUE', 'format': highlight_format,
+                                                        'multi_range': ' '.join(chunk)})
+
+        # Summary sheet with half-hourly LPM data
+        summary_df = half_hourly_summary(result_df)
+        summary_sheet = workbook.add_worksheet(summary_sheet_name(result_df))
+        summary_sheet.set_column(0, 0, 22, date_format)
+        summary_sheet.set_column(1, 1, 15, number_formats['LPM (30 Min Sum)'])
+        summary_sheet.freeze_panes(1, 0)
+        summary_sheet.write_row(0, 0, ['Half Hourly Date', 'LPM (30 Min Sum)'], header_format)
+        for row_idx, row in enumerate(zip(excel_serials(summary_df['Half Hourly Date']), cell_values(summary_df['LPM (30 Min Sum)'])), start=1):
+            summary_sheet.write_row(row_idx, 0, row)
+
+        if run_stats_rows is not None:
+            stats_sheet = workbook.add_worksheet("Run Stats")
+            stats_sheet.set_column(0, 0, 18)
+            stats_sheet.set_column(1, len(RUN_STATS_COLUMNS) - 1, 16)
+            stats_sheet.write_row(0, 0, RUN_STATS_COLUMNS, header_format)
+            for row_idx, row in enumerate(run_stats_rows, start=1):
+                stats_sheet.write_row(row_idx, 0, row)
+    finally:
+        workbook.close()
+    return len(summary_df)
+
+
+def summary_sheet_name(result_df):
+    """'May-25' for a one-month result, 'Jan-25 to Dec-25' for a multi-month one."""
+    first_month = result_df['Date Time Stamp'].iloc[0].strftime('%b-%y')
+    last_month = result_df['Date Time Stamp'].iloc[-1].strftime('%b-%y')
+    return first_month if first_month == last_month else f"{first_month} to {last_month}"
+
+
+def half_hourly_summary(result_df):
+    """
+    Half Hourly Date / LPM (30 Min Sum) rows for the summary outputs, taken from the
+    half-hourly LPM series of perform_minute_wise_processing, else from the :00 and :30 rows.
+    """
+    lpm_half_hourly = result_df.attrs.get('lpm_half_hourly')
+    if lpm_half_hourly is None:
+        half_hourly_rows = result_df[result_df['Date Time Stamp'].dt.minute.isin([0, 30])]
+        lpm_half_hourly = pd.Series(pd.to_numeric(half_hourly_rows['LPM (30 Min Sum)'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan),
+                                    index=pd.DatetimeIndex(half_hourly_rows['Date Time Stamp']))
+    return pd.DataFrame({'Half Hourly Date': lpm_half_hourly.index,
+                         'LPM (30 Min Sum)': lpm_half_hourly.to_numpy(dtype=np.float64, na_value=np.nan)})
+
+
+COLUMNAR_FORMATS = {"Parquet": ".parquet", "Feather": ".feather", "CSV": ".csv"}
+EXCEL_MAX_DATA_ROWS = 1048575 # Rows below the header on one worksheet
+ALL_MONTHS_LABEL = "All Months"
+
+
+def typed_result_frame(result_df):
+    """Minute-level result with datetime64, float64, categorical and bool columns."""
+    typed = pd.DataFrame({'Date Time Stamp': pd.to_datetime(result_df['Date Time Stamp'])})
+    for col in ['Availability', 'Load', 'Target Load', 'LPM (30 Min Sum)', 'Highlight_Row']:
+        if col not in result_df.columns:
+            continue
+        if col == 'Target Load':
+            typed[col] = result_df[col].astype('category')
+        elif col == 'Highlight_Row':
+            typed[col] = result_df[col].astype(bool)
+        else:
+            typed[col] = pd.to_numeric(result_df[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return typed
+
+
+def write_columnar_outputs(result_df, export_path, output_format):
+    """
+    Write the minute-level result and the half-hourly summary next to export_path as
+    Parquet, Feather or CSV ('<name>.<ext>' and '<name> Summary.<ext>').
+    Returns the paths written.
+    """
+    extension = COLUMNAR_FORMATS[output_format]
+    base_path = os.path.splitext(export_path)[0]
+    outputs = [(base_path + extension, typed_result_frame(result_df)),
+               (base_path + " Summary" + extension, half_hourly_summary(result_df))]
+    for path, frame in outputs:
+        if output_format == "Parquet":
+            frame.to_parquet(path, index=False)
+        elif output_format == "Feather":
+            frame.to_feather(path)
+        else:
+            frame.to_csv(path, index=False)
+    return [path for path, _ in outputs]
+
+
+STEP_SECONDS_CHOICES = (60, 30, 20, 15, 10, 5, 2, 1) # Divisors of a minute, so every minute and half-hour is a sample
+SUB_MINUTE_CHUNK_ROWS = 1 << 20 # Samples computed and written at a time in sub-minute mode
+
+
+def render_load_at(segments, positions, minute_load):
+    """
+    Load at sorted fractional minute positions of a month (e.g. every 10 seconds), from the
+    segments of build_load_segments and the month's minute load from render_load_segments.
+    Ramps go on from the minute's load at their rate up to the exact position, hold and FCBL
+    segments are constant within a minute, so at whole minutes the result equals minute_load.
+    """
+    load = minute_load[positions.astype(np.int64)]
+    for seg in segments:
+        if seg['kind'] != 'ramp':
+            continue
+        start, end = np.searchsorted(positions, [seg['start'], seg['end']])
+        if end > start:
+            minutes = np.floor(positions[start:end])
+            load[start:end] += seg['rate'] * np.clip(np.minimum(positions[start:end], seg['stop']) - minutes, 0, None)
+    return load
+
+
+class HalfHourlyAggregator:
+    """
+    Half-hourly aggregates of a load sampled every step_seconds from range_start, added in
+    order in chunks. The half-hour ending at each :00 and :30 covers the samples after the
+    previous one up to and including its own timestamp, like the minute LPM (30 Min Sum),
+    which is the mean load of a complete window (NaN for a partial one). Min Load, Max Load
+    and the steepest change between consecutive samples, in MW/min, are kept as well.
+    """
+    COLUMNS = ['Half Hourly Date', 'LPM (30 Min Sum)', 'Min Load', 'Max Load', 'Max Ramp Rate (MW/min)']
+
+    def __init__(self, range_start, total_samples, step_seconds):
+        self.range_start = pd.Timestamp(range_start)
+        self.step_seconds = step_seconds
+        self.window = 1800 // step_seconds
+        half_hours = (total_samples - 1) // self.window + 1 # Those ending on a sample of the range
+        self.sums = np.zeros(half_hours + 1)
+        self.counts = np.zeros(half_hours + 1, dtype=np.int64)
+        self.mins = np.full(half_hours + 1, np.inf)
+        self.maxs = np.full(half_hours + 1, -np.inf)
+        self.ramps = np.full(half_hours + 1, np.nan)
+        self.previous = np.nan
+
+    def add(self, first_sample, load):
+        """Add the load of samples first_sample, first_sample + 1, ... of the range."""
+        bins = -(-np.arange(first_sample, first_sample + len(load)) // self.window) # Half-hour each sample ends up in
+        first_bin = bins[0]
+        local = bins - first_bin
+        self.sums[first_bin:first_bin + local[-1] + 1] += np.bincount(local, weights=load)
+        self.counts[first_bin:first_bin + local[-1] + 1] += np.bincount(local)
+        starts = np.flatnonzero(np.r_[True, local[1:] != local[:-1]])
+        chunk_bins = bins[starts]
+        self.mins[chunk_bins] = np.minimum(self.mins[chunk_bins], np.minimum.reduceat(load, starts))
+        self.maxs[chunk_bins] = np.maximum(self.maxs[chunk_bins], np.maximum.reduceat(load, starts))
+        changes = np.abs(np.diff(load, prepend=self.previous)) * (60 / self.step_seconds)
+        self.ramps[chunk_bins] = np.fmax(self.ramps[chunk_bins], np.fmax.reduceat(changes, starts))
+        self.previous = load[-1]
+
+    def frame(self):
+        """The aggregates of every half-hour ending within the range, as a DataFrame of COLUMNS."""
+        half_hours = len(self.sums) - 1
+        complete = self.counts[:half_hours] == self.window
+        return pd.DataFrame({
+            'Half Hourly Date': self.range_start + pd.to_timedelta(np.arange(half_hours) * 30, unit='min'),
+            'LPM (30 Min Sum)': np.where(complete, np.round(self.sums[:half_hours] / self.window, 5), np.nan),
+            'Min Load': self.mins[:half_hours],
+            'Max Load': self.maxs[:half_hours],
+            'Max Ramp Rate (MW/min)': np.round(self.ramps[:half_hours], 3),
+        }, columns=self.COLUMNS)
+
+
+class ColumnarStreamWriter:
+    """Append frames with the same columns to one Parquet, Feather (Arrow IPC) or CSV file, chunk by chunk."""
+
+    def __init__(self, path, output_format):
+        self.path = path
+        self.output_format = output_format
+        self.rows = 0
+        self._writer = None
+
+    def write(self, frame):
+        if self.output_format == "CSV":
+            frame.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                if self.output_format == "Parquet":
+                    import pyarrow.parquet
+                    self._writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+                else:
+                    self._writer = pa.ipc.new_file(self.path, table.schema)
+            self._writer.write_table(table)
+        self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AvailabilityGapError(ValueError):
+    """Raised by AvailabilityIndex under the 'error' gap policy for an hour without availability."""
+
+
+class AvailabilityIndex:
+    """
+    Hourly Final Availability (Col D) held in a float64 array indexed by hour offset from the
+    start of the first month in the Availability sheet, with a mask of hours that have no value.
+    gap_policy decides what lookups return for those hours (and for hours outside the sheet):
+      'fallback' - no value (None / NaN), the engine falls back to the dispatch target
+      'ffill'    - the value of the last available hour before the gap, also for the hours
+                   after the end of the sheet (hours before its start have none)
+      'error'    - raise AvailabilityGapError
+    """
+    GAP_POLICIES = ("fallback", "ffill", "error")
+
+    def __init__(self, timestamps, values, gap_policy="fallback"):
+        stamps = np.asarray(timestamps, dtype='datetime64[ns]')
+        order = np.argsort(stamps, kind='stable')
+        hours = stamps[order].astype('datetime64[h]')
+        values = np.asarray(values, dtype=np.float64)[order]
+        self.base = np.datetime64(pd.Timestamp(hours[0]).replace(day=1, hour=0), 'h')
+        self._base_ns = pd.Timestamp(self.base).value
+        offsets = (hours - self.base).astype(np.int64)
+        # First value in each hour, as resample('h').first() did
+        offsets, first_in_hour = np.unique(offsets, return_index=True)
+        self.values = np.full(offsets[-1] + 1, np.nan)
+        self.values[offsets] = values[first_in_hour]
+        self.missing = np.isnan(self.values)
+        last_valid = np.maximum.accumulate(np.where(self.missing, -1, np.arange(len(self.values))))
+        self.filled_values = np.where(last_valid >= 0, self.values[np.maximum(last_valid, 0)], np.nan)
+        self.gap_policy = gap_policy
+
+    @property
+    def gap_policy(self):
+        return self._gap_policy
+
+    @gap_policy.setter
+    def gap_policy(self, policy):
+        if policy not in self.GAP_POLICIES:
+            raise ValueError(f"Unknown availability gap policy '{policy}'. Expected one of {self.GAP_POLICIES}.")
+        self._gap_policy = policy
+
+    def __len__(self):
+        return len(self.values)
+
+    def lookup(self, timestamp):
+        """Availability for the hour containing timestamp, or None."""
+        offset = (pd.Timestamp(timestamp).value - self._base_ns) // 3_600_000_000_000
+        value = np.nan
+        if 0 <= offset < len(self.values):
+            value = self.filled_values[offset] if self._gap_policy == "ffill" else self.values[offset]
+        elif offset >= len(self.values) and self._gap_policy == "ffill":
+            value = self.filled_values[-1]
+        if np.isnan(value):
+            if self._gap_policy == "error":
+                raise AvailabilityGapError(f"No availability for hour {pd.Timestamp(timestamp).floor('h')}.")
+            return None
+        return float(value)
+
+    def lookup_array(self, timestamps):
+        """Availability for the hour of every timestamp, NaN where there is none."""
+        offsets = (np.asarray(timestamps, dtype='datetime64[h]') - self.base).astype(np.int64)
+        inside = (offsets >= 0) & (offsets < len(self.values))
+        source = self.filled_values if self._gap_policy == "ffill" else self.values
+        result = np.full(len(offsets), np.nan)
+        result[inside] = source[offsets[inside]]
+        if self._gap_policy == "ffill":
+            result[offsets >= len(self.values)] = self.filled_values[-1]
+        if self._gap_policy == "error" and np.isnan(result).any():
+            first_gap = pd.Timestamp(np.asarray(timestamps, dtype='datetime64[ns]')[np.isnan(result)][0])
+            raise AvailabilityGapError(f"No availability for hour {first_gap.floor('h')}.")
+        return result
+
+
+LOG_FILE_PATH = os.path.join(os.path.expanduser("~"), "FADL Logs", "FADL Load Processor.log")
+
+
+def timed_stage(name):
+    """Time every call of a LoadProcessor method as stage name of its run_stats."""
+    def decorate(method):
+        @functools.wraps(method)
+        def timed(self, *args, **kwargs):
+            with self.run_stats.stage(name):
+                return method(self, *args, **kwargs)
+        return timed
+    return decorate
+
+
+class TkLogSink(logging.Handler):
+    """
+    Logging handler that can be fed from any thread and shows records in a Tk Text widget.
+    Formatted lines wait in a bounded ring buffer; flush_to_widget (run periodically on the
+    Tk thread by start) inserts them with a single insert call, shows at most
+    max_lines_per_flush lines per flush and trims the widget to max_widget_lines.
+    """
+    def __init__(self, root, text_widget, level=logging.INFO, flush_interval_ms=250,
+                 max_lines_per_flush=200, buffer_size=5000, max_widget_lines=2000):
+        super().__init__(level)
+        self.root = root
+        self.text_widget = text_widget
+        self.flush_interval_ms = flush_interval_ms
+        self.max_lines_per_flush = max_lines_per_flush
+        self.max_widget_lines = max_widget_lines
+        self.pending = collections.deque(maxlen=buffer_size)
+        self.dropped = 0
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(line)
+
+    def start(self):
+        self.flush_to_widget()
+        self.root.after(self.flush_interval_ms, self.start)
+
+    def flush_to_widget(self):
+        with self.lock:
+            lines, dropped = list(self.pending), self.dropped
+            self.pending.clear()
+            self.dropped = 0
+        if not lines:
+            return
+        skipped = dropped + max(0, len(lines) - self.max_lines_per_flush)
+        if skipped:
+            lines = [f"... {skipped} log lines not shown here (see {LOG_FILE_PATH}) ..."] + lines[-self.max_lines_per_flush:]
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.insert(tk.END, "\n".join(lines) + "\n")
+        excess_lines = int(self.text_widget.index('end-1c').split('.')[0]) - 1 - self.max_widget_lines
+        if excess_lines > 0:
+            self.text_widget.delete('1.0', f'{excess_lines + 1}.0')
+        self.text_widget.see(tk.END)
+        self.text_widget.config(state=tk.DISABLED)
+
+
+DISPATCH_SHEET = "Dispatch Instructions"
+AVAILABILITY_SHEET = "Availability"
+# Columns (by sheet position) the input readers keep, and the dtype each is coerced to.
+# Dispatch A-F: Notification Time, Target Time Stamp, Minutes, Availability, Target Load, Target Demand (MW)
+DISPATCH_SCHEMA = {0: 'datetime', 1: 'datetime', 2: 'float', 3: 'float', 4: 'string', 5: 'float'}
+# Availability A and D: Availability Time Stamp, Final Availability
+AVAILABILITY_SCHEMA = {0: 'datetime', 3: 'float'}
+EXCEL_READERS = {"Standard": None, "Calamine": "calamine"} # Reader name -> pandas Excel engine (None = pandas default)
+TABLE_INPUT_EXTENSIONS = ('.csv', '.parquet')
+
+
+class InputTableError(ValueError):
+    """Raised when the 'Dispatch Instructions' or 'Availability' table cannot be found in the input."""
+
+
+def coerce_input_columns(df, kinds):
+    """
+    Coerce the columns of df, in order, to the dtypes named in kinds ('datetime', 'float' or
+    'string'). Values that cannot be converted become NaT/NaN. Returns the coerced frame and
+    {column name: number of non-empty values that could not be converted}.
+    """
+    df = df.copy()
+    failures = {}
+    for column, kind in zip(df.columns, kinds):
+        values = df[column]
+        if kind == 'datetime':
+            converted = values if pd.api.types.is_datetime64_any_dtype(values) else pd.to_datetime(values, errors='coerce')
+        elif kind == 'float':
+            converted = pd.to_numeric(values, errors='coerce').astype(np.float64)
+        else:
+            converted = values.astype(object).where(values.isna(), values.astype(str))
+        failed = int((converted.isna() & values.notna()).sum())
+        if failed:
+            failures[column] = failed
+        df[column] = converted
+    return df, failures
+
+
+def input_table_paths(file_path):
+    """
+    The 'Dispatch Instructions' and 'Availability' table files of a CSV/Parquet input. The two
+    files share a folder, extension and name prefix, e.g. 'May-25 Dispatch Instructions.csv' and
+    'May-25 Availability.csv'; file_path may be either of them.
+    """
+    folder, file_name = os.path.split(file_path)
+    stem, extension = os.path.splitext(file_name)
+    for table_name in (DISPATCH_SHEET, AVAILABILITY_SHEET):
+        if stem.endswith(table_name):
+            prefix = stem[:-len(table_name)]
+            return {name: os.path.join(folder, prefix + name + extension) for name in (DISPATCH_SHEET, AVAILABILITY_SHEET)}
+    raise InputTableError(f"Table file names must end with '{DISPATCH_SHEET}' or '{AVAILABILITY_SHEET}' (got '{file_name}').")
+
+
+def input_source_paths(file_path):
+    """Every file read_input_tables reads for file_path."""
+    if os.path.splitext(file_path)[1].lower() in TABLE_INPUT_EXTENSIONS:
+        return list(input_table_paths(file_path).values())
+    return [file_path]
+
+
+def _read_sheet_columns(xls, sheet_name, schema):
+    width = len(pd.read_excel(xls, sheet_name=sheet_name, nrows=0).columns)
+    positions = [position for position in sorted(schema) if position < width]
+    if not positions:
+        return pd.DataFrame(), {}
+    df = pd.read_excel(xls, sheet_name=sheet_name, usecols=positions)
+    return coerce_input_columns(df, [schema[position] for position in positions])
+
+
+def _read_table_columns(path, schema):
+    if os.path.splitext(path)[1].lower() == '.parquet':
+        import pyarrow.parquet as pq
+        names = pq.read_schema(path).names
+        positions = [position for position in sorted(schema) if position < len(names)]
+        df = pd.read_parquet(path, columns=[names[position] for position in positions])
+    else:
+        width = len(pd.read_csv(path, nrows=0).columns)
+        positions = [position for position in sorted(schema) if position < width]
+        if not positions:
+            return pd.DataFrame(), {}
+        df = pd.read_csv(path, usecols=positions, dtype={position: str for position in positions if schema[position] == 'string'})
+    return coerce_input_columns(df, [schema[position] for position in positions])
+
+
+def read_input_tables(file_path, excel_reader="Standard"):
+    """
+    Read the 'Dispatch Instructions' (columns A-F) and 'Availability' (columns A and D) tables
+    from an Excel workbook, using the pandas engine of excel_reader, or from a CSV/Parquet table
+    pair (see input_table_paths). Columns are coerced to DISPATCH_SCHEMA / AVAILABILITY_SCHEMA.
+    Returns (df_dispatch, df_availability, conversion_failures) where conversion_failures maps
+    each table name to the failure counts of coerce_input_columns.
+    """
+    schemas = {DISPATCH_SHEET: DISPATCH_SCHEMA, AVAILABILITY_SHEET: AVAILABILITY_SCHEMA}
+    tables, failures = {}, {}
+    if os.path.splitext(file_path)[1].lower() in TABLE_INPUT_EXTENSIONS:
+        table_paths = input_table_paths(file_path)
+        missing_files = [path for path in table_paths.values() if not os.path.exists(path)]
+        if missing_files:
+            raise InputTableError(f"Missing required table file(s): {', '.join(missing_files)}.")
+        for table_name, path in table_paths.items():
+            tables[table_name], failures[table_name] = _read_table_columns(path, schemas[table_name])
+    else:
+        with pd.ExcelFile(file_path, engine=EXCEL_READERS[excel_reader]) as xls:
+            missing_sheets = [name for name in schemas if name not in xls.sheet_names]
+            if missing_sheets:
+                raise InputTableError(f"Missing required sheet(s): {', '.join(missing_sheets)}.\nFound sheets: {xls.sheet_names}")
+            for table_name, schema in schemas.items():
+                tables[table_name], failures[table_name] = _read_sheet_columns(xls, table_name, schema)
+    return tables[DISPATCH_SHEET], tables[AVAILABILITY_SHEET], failures
+
+
+INPUT_CACHE_DIR = os.path.join(os.path.expanduser("~"), "FADL Cache", "Step 1 Inputs")
+INPUT_CACHE_VERSION = 3 # Bump when read_excel_data changes what it produces
+
+
+class PickleEntryStore:
+    """
+    Folder of pickled entries named by key. Reading an entry marks it as recently used, and the
+    least recently used entries are evicted once the folder grows beyond max_bytes. An entry
+    that cannot be read is deleted and counts as a miss.
+    """
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _read_entry(self, key):
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(entry_path) # Mark as recently used for eviction
+            return entry
+        except Exception:
+            os.remove(entry_path)
+            return None
+
+    def _write_entry(self, key, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(key)
+        temp_path = entry_path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, entry_path)
+        self._evict()
+
+    def _evict(self):
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.pkl')]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        total_bytes = 0
+        for entry_path in entries:
+            total_bytes += os.path.getsize(entry_path)
+            if total_bytes > self.max_bytes:
+                os.remove(entry_path)
+
+
+class ParsedInputCache(PickleEntryStore):
+    """
+    On-disk cache of parsed Step 1 input workbooks. An entry holds the typed 'Dispatch
+    Instructions' and 'Availability' frames, the month list and the conversion failures of
+    read_input_tables (so a hit repeats their warnings) as one pickle, keyed by the
+    path, size, mtime and SHA-256 of every file read (see input_source_paths).
+    """
+    def __init__(self, cache_dir=INPUT_CACHE_DIR, max_bytes=512 * 1024 * 1024):
+        super().__init__(cache_dir, max_bytes)
+
+    def key_for(self, file_path):
+        key_parts = [str(INPUT_CACHE_VERSION)]
+        for source_path in input_source_paths(file_path):
+            file_stat = os.stat(source_path)
+            content_hash = hashlib.sha256()
+            with open(source_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    content_hash.update(chunk)
+            key_parts.append(f"{os.path.abspath(source_path)}|{file_stat.st_size}|{file_stat.st_mtime_ns}|{content_hash.hexdigest()}")
+        return hashlib.sha256("|".join(key_parts).encode('utf-8')).hexdigest()
+
+    def load(self, file_path):
+        """(df_dispatch, df_availability, available_months, conversion_failures) for file_path, or None on a miss."""
+        entry = self._read_entry(self.key_for(file_path))
+        if entry is None: # A miss or an unreadable entry, parse the workbook again
+            return None
+        return entry['dispatch'], entry['availability'], entry['months'], entry['conversion_failures']
+
+    def store(self, file_path, df_dispatch, df_availability, available_months, conversion_failures):
+        self._write_entry(self.key_for(file_path), {'source': os.path.abspath(file_path), 'dispatch': df_dispatch,
+                                                    'availability': df_availability, 'months': available_months,
+                                                    'conversion_failures': conversion_failures})
+
+
+RUN_CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), "FADL Cache", "Step 1 Checkpoints")
 
-    def toggle_custom_load_entry(self):
-        self.custom_load_entry.config(state=tk.NORMAL if self.start_load_type_var.get() == "Custom" else tk.DISABLED)
-        if self.start_load_type_var.get() != "Custom": self.custom_load_var.set(0.0)
-        self.status_log(f"Start load type set to: {self.start_load_type_var.get()}")
 
+class RunCheckpointStore(PickleEntryStore):
+    """
+    On-disk segment engine checkpoints, one per input file path and month, so a rerun after
+    editing a few instructions can resume from the earliest change (see find_resume_point).
+    Unlike ParsedInputCache entries, these are keyed by path and month only: the point is to
+    find the previous run of a workbook that has since changed.
+    """
+    def __init__(self, cache_dir=RUN_CHECKPOINT_DIR, max_bytes=256 * 1024 * 1024):
+        super().__init__(cache_dir, max_bytes)
+
+    def checkpoint_key(self, file_path, month_label):
+        return hashlib.sha256(f"{os.path.abspath(file_path)}|{month_label}".encode('utf-8')).hexdigest()
+
+    def load(self, file_path, month_label):
+        """The checkpoint of the last run of month_label from file_path, or None."""
+        return self._read_entry(self.checkpoint_key(file_path, month_label))
+
+    def store(self, file_path, month_label, checkpoint):
+        self._write_entry(self.checkpoint_key(file_path, month_label), checkpoint)
+
+
+# Settings of LoadProcessor (LoadProcessorApp's Tk variables are named '<setting>_var')
+PROCESSING_DEFAULTS = {
+    'file_path': "", 'month': "", 'start_load_type': "FinalAvailabilityHourly", 'custom_load': 0.0,
+    'export_dir': "", 'engine': "Segments", 'gap_policy': "fallback", 'writer': "Fast",
+    'write_excel': True, 'columnar_format': "None", 'use_input_cache': True,
+    'input_reader': "Calamine" if python_calamine is not None else "Standard", 'incremental': True,
+    'run_report': True, 'run_stats_sheet': False, 'trace_memory': False, 'step_seconds': 60,
+}
+DEFAULT_OUTPUT_FILE_NAME = "FADL Calculation.xlsx"
+
+
+class LoadProcessor:
+    """
+    Step 1 processing without a window: reads the input, computes the minute-wise load and writes
+    the outputs. Settings are plain values named as in PROCESSING_DEFAULTS. Message boxes become
+    log lines (kept in notices) and progress updates are ignored; LoadProcessorApp shows them.
+    """
+    def __init__(self, logger=None, **settings):
+        unknown_settings = set(settings) - set(PROCESSING_DEFAULTS)
+        if unknown_settings:
+            raise ValueError(f"Unknown processing setting(s): {', '.join(sorted(unknown_settings))}")
+        self.settings = dict(PROCESSING_DEFAULTS, **settings)
+        self.logger = logger or logging.getLogger("fadl.step1")
+        self.notices = [] # (type, title, message) of the message boxes a window would have shown
+        self._init_processing_state()
+
+    def _init_processing_state(self):
+        self.input_cache = ParsedInputCache()
+        self.checkpoint_store = RunCheckpointStore()
+        self.output_file_name = DEFAULT_OUTPUT_FILE_NAME
+        self.metrics_file = METRICS_FILE_PATH # Cumulative metrics of every run, None to skip
+        self.output_paths = [] # Files written by the last run
+        self.run_stats = RunStats()
+        self.input_stats = None # Stages of reading the current input
+        self.run_report_path = None
+        self.df_dispatch = None
+        self.df_availability = None
+        self.availability_index = None 
+        self.instruction_table = None # Structured array of all parsed Dispatch Instructions
+        self.instruction_issues = None
+        self.run_instruction_issues = None # Issues of the instructions in the range of the last run
+
+    def load_input(self, file_path=None):
+        """Read the input workbook (or CSV/Parquet tables) and prepare the hourly availability lookup. Returns the available months."""
+        if file_path is not None:
+            self.settings['file_path'] = file_path
+        self.run_stats = self.input_stats = RunStats(trace_memory=self.settings['trace_memory'])
+        _, _, available_months = self.read_excel_data(self.settings['file_path'])
+        if self.df_dispatch is None:
+            return []
+        self._prepare_instruction_table()
+        if self.df_availability is not None:
+            self._prepare_hourly_availability_lookup()
+        return sorted(available_months, key=lambda label: datetime.datetime.strptime(label, '%b-%y'))
+
+    def process_month(self, month, output_file_name=DEFAULT_OUTPUT_FILE_NAME):
+        """Process a month such as 'May-25' (or ALL_MONTHS_LABEL) and write the outputs. Returns the written paths, none if the run failed."""
+        self.settings['month'] = month
+        self.output_file_name = output_file_name
+        return list(self.output_paths) if self._processing_logic() else []
+
+    @timed_stage('lookup prep')
     def _prepare_hourly_availability_lookup(self):
-        self.availability_series_hourly_lookup = None 
+        self.availability_index = None 
         if self.df_availability is None or self.df_availability.empty:
-            self.root.after(0, self.status_log_safe,"Availability data empty, cannot prepare hourly lookup.") # Use root.after for thread safety
+            self.status_log_safe("Availability data empty, cannot prepare hourly lookup.")
             return
         try:
-            if len(self.df_availability.columns) < 4:
-                self.root.after(0, self.status_log_safe,"Availability sheet < 4 columns. Cannot prepare hourly lookup from Col D.")
+            if len(self.df_availability.columns) < 2:
+                self.status_log_safe("Availability data lacks the timestamp (A) and Final Availability (D) columns. Cannot prepare hourly lookup.")
                 return
-            avail_df = self.df_availability.copy()
-            if not pd.api.types.is_datetime64_any_dtype(avail_df.iloc[:, 0]):
-                avail_df.iloc[:, 0] = pd.to_datetime(avail_df.iloc[:, 0], errors='coerce')
-            if not pd.api.types.is_numeric_dtype(avail_df.iloc[:, 3]): 
-                avail_df.iloc[:, 3] = pd.to_numeric(avail_df.iloc[:, 3], errors='coerce')
-            avail_df.dropna(subset=[avail_df.columns[0], avail_df.columns[3]], inplace=True)
-            if avail_df.empty:
-                self.root.after(0, self.status_log_safe,"No valid data in Availability sheet (Cols A & D) for hourly lookup.")
+            avail_timestamps = pd.to_datetime(self.df_availability.iloc[:, 0], errors='coerce')
+            avail_values = pd.to_numeric(self.df_availability.iloc[:, 1], errors='coerce') # Col D of the sheet
+            valid = avail_timestamps.notna() & avail_values.notna()
+            if not valid.any():
+                self.status_log_safe("No valid data in Availability sheet (Cols A & D) for hourly lookup.")
                 return
-            avail_df = avail_df.set_index(avail_df.columns[0])
-            load_series = avail_df.iloc[:, 2] 
-            self.availability_series_hourly_lookup = load_series.resample('h').first()
-            self.root.after(0, self.status_log_safe,"Hourly availability lookup table prepared.")
+            self.availability_index = AvailabilityIndex(avail_timestamps[valid], avail_values[valid], gap_policy=self.settings['gap_policy'])
+            self.status_log_safe(f"Hourly availability index prepared: {len(self.availability_index)} hours, {int(self.availability_index.missing.sum())} without data.")
         except Exception as e:
-            self.root.after(0, self.status_log_safe,f"Error preparing hourly availability lookup: {e}")
-            self.availability_series_hourly_lookup = None
+            self.status_log_safe(f"Error preparing hourly availability lookup: {e}")
+            self.availability_index = None
 
     def get_hourly_final_availability(self, timestamp_obj): # Removed unused availability_df_month
-        if self.availability_series_hourly_lookup is None:
-            # self.root.after(0, self.status_log_safe, f"Warning: Hourly availability lookup series not prepared. Cannot get value for {timestamp_obj}.") # Potentially too verbose
+        if self.availability_index is None:
+            # self.status_log_safe(f"Warning: Hourly availability lookup series not prepared. Cannot get value for {timestamp_obj}.") # Potentially too verbose
             return None
         try:
-            lookup_hour = timestamp_obj.replace(minute=0, second=0, microsecond=0)
-            available_load = self.availability_series_hourly_lookup.get(lookup_hour)
-            return float(available_load) if pd.notna(available_load) else None
+            return self.availability_index.lookup(timestamp_obj)
+        except AvailabilityGapError:
+            raise
         except Exception as e:
-            self.root.after(0, self.status_log_safe, f"Error during hourly availability lookup for {timestamp_obj}: {e}")
+            self.status_log_safe(f"Error during hourly availability lookup for {timestamp_obj}: {e}")
             return None
 
+    @timed_stage('load')
     def read_excel_data(self, file_path):
         # ... (read_excel_data content remains largely the same, ensure it uses self.status_log directly)
         self.status_log(f"Reading Excel file: {file_path}")
@@ -172,133 +1216,430 @@ class LoadProcessorApp:
         self.df_availability = None
         available_months = []
         if not file_path:
-            messagebox.showerror("Error", "No file selected to read.")
+            self._show_messagebox_safe("error", "Error", "No file selected to read.")
             self.status_log("File reading skipped: No file path provided.")
             return None, None, []
         try:
-            xls = pd.ExcelFile(file_path)
-            sheet_names = xls.sheet_names
-            required_sheets = {"Dispatch Instructions", "Availability"}
-            if not required_sheets.issubset(sheet_names):
-                missing_sheets = required_sheets - set(sheet_names)
-                err_msg = f"Missing required sheet(s): {', '.join(missing_sheets)}."
-                messagebox.showerror("Sheet Error", err_msg + f"\nFound sheets: {sheet_names}")
-                self.status_log(f"Error: {err_msg} Excel file only contains: {sheet_names}")
+            if self.settings['use_input_cache']:
+                try:
+                    cached = self.input_cache.load(file_path)
+                except (OSError, InputTableError) as e_cache:
+                    cached = None
+                    self.status_log(f"Input cache unavailable: {e_cache}")
+                if cached is not None:
+                    self.df_dispatch, self.df_availability, available_months, conversion_failures = cached
+                    self.status_log(f"Loaded parsed 'Dispatch Instructions' ({len(self.df_dispatch) if self.df_dispatch is not None else 0} rows) and 'Availability' ({len(self.df_availability) if self.df_availability is not None else 0} rows) from the input cache.")
+                    self._report_conversion_failures(conversion_failures)
+                    return self.df_dispatch, self.df_availability, available_months
+            excel_reader = self.settings['input_reader']
+            if EXCEL_READERS.get(excel_reader) == "calamine" and python_calamine is None:
+                self.status_log("python-calamine is not installed. Using the Standard Excel reader.")
+                excel_reader = "Standard"
+            self.status_log(f"Reading '{DISPATCH_SHEET}' (Cols A-F) and '{AVAILABILITY_SHEET}' (Cols A & D) with the {excel_reader} reader.")
+            try:
+                self.df_dispatch, self.df_availability, conversion_failures = read_input_tables(file_path, excel_reader)
+            except InputTableError as e_table:
+                self._show_messagebox_safe("error", "Sheet Error", str(e_table))
+                self.status_log(f"Error: {e_table}")
                 return None, None, []
-            self.status_log(f"Found sheets: {sheet_names}. Reading 'Dispatch Instructions' and 'Availability'.")
-            self.df_dispatch = pd.read_excel(xls, sheet_name="Dispatch Instructions")
-            self.status_log(f"'Dispatch Instructions' sheet read. Rows: {len(self.df_dispatch)}, Columns: {len(self.df_dispatch.columns) if self.df_dispatch is not None else 0}")
-            if self.df_dispatch is None or self.df_dispatch.empty: 
+            self.status_log(f"'Dispatch Instructions' sheet read. Rows: {len(self.df_dispatch)}, Columns: {len(self.df_dispatch.columns)}")
+            if self.df_dispatch.empty: 
                 self.status_log("Warning: 'Dispatch Instructions' sheet is empty or failed to load. No months to process.")
                 self.df_dispatch = None 
             elif self.df_dispatch.columns.empty:
                  self.status_log("Warning: 'Dispatch Instructions' sheet has no columns.")
-                 messagebox.showwarning("Data Warning", "'Dispatch Instructions' sheet has no columns.")
+                 self._show_messagebox_safe("warning", "Data Warning", "'Dispatch Instructions' sheet has no columns.")
                  self.df_dispatch = None 
-            elif not pd.api.types.is_datetime64_any_dtype(self.df_dispatch.iloc[:, 0]): 
-                self.status_log("First column of 'Dispatch Instructions' is not datetime. Attempting conversion...")
-                try:
-                    self.df_dispatch.iloc[:, 0] = pd.to_datetime(self.df_dispatch.iloc[:, 0], errors='coerce')
-                    if self.df_dispatch.iloc[:, 0].isnull().all() and not self.df_dispatch.empty:
-                         messagebox.showerror("Data Error", "First column of 'Dispatch Instructions' (expected dates) could not be converted to dates/timestamps. All values are invalid.")
-                         self.status_log("Error: All values in first column of 'Dispatch Instructions' failed datetime conversion.")
-                         self.df_dispatch = None 
-                    elif self.df_dispatch.iloc[:, 0].isnull().any():
-                        num_failed = self.df_dispatch.iloc[:,0].isnull().sum()
-                        self.status_log(f"Warning: {num_failed} values in the first column of 'Dispatch Instructions' failed datetime conversion and were set to NaT.")
-                        messagebox.showwarning("Data Conversion Warning", f"{num_failed} date entries in 'Dispatch Instructions' are invalid and were ignored.")
-                except Exception as e_conv:
-                    messagebox.showerror("Data Error", f"Could not convert first column of 'Dispatch Instructions' to dates/timestamps.\nError: {e_conv}")
-                    self.status_log(f"Error converting first column of 'Dispatch Instructions': {e_conv}")
-                    self.df_dispatch = None 
-            if self.df_dispatch is not None and not self.df_dispatch.empty and pd.api.types.is_datetime64_any_dtype(self.df_dispatch.iloc[:, 0]):
+            elif self.df_dispatch.iloc[:, 0].isnull().all():
+                self._show_messagebox_safe("error", "Data Error", "First column of 'Dispatch Instructions' (expected dates) could not be converted to dates/timestamps. All values are invalid.")
+                self.status_log("Error: All values in first column of 'Dispatch Instructions' failed datetime conversion.")
+                self.df_dispatch = None 
+            self._report_conversion_failures(conversion_failures)
+            if self.df_dispatch is not None:
                 valid_dates = self.df_dispatch.iloc[:, 0].dropna()
                 if not valid_dates.empty:
                     available_months = sorted(valid_dates.dt.strftime('%b-%y').unique().tolist())
                 if not available_months: 
                     self.status_log("No valid months found in 'Dispatch Instructions' (Column A after processing).")
-            self.df_availability = pd.read_excel(xls, sheet_name="Availability")
-            self.status_log(f"'Availability' sheet read. Rows: {len(self.df_availability)}, Columns: {len(self.df_availability.columns) if self.df_availability is not None else 0}")
-            if self.df_availability is None or self.df_availability.empty: 
+            self.status_log(f"'Availability' sheet read. Rows: {len(self.df_availability)}, Columns: {len(self.df_availability.columns)}")
+            if self.df_availability.empty: 
                  self.status_log("Warning: 'Availability' sheet is empty or failed to load.")
                  self.df_availability = None 
-            elif self.df_availability.columns.empty:
-                self.status_log("Warning: 'Availability' sheet has no columns.")
-                messagebox.showwarning("Data Warning", "'Availability' sheet has no columns.")
-                self.df_availability = None
-            elif len(self.df_availability.columns) < 4: 
-                 self.status_log("Warning: 'Availability' sheet has fewer than 4 columns. Required for Final Availability lookup from Column D.")
-                 messagebox.showwarning("Data Warning", "'Availability' sheet has fewer than 4 columns. Final Availability features might not work correctly.")
+            elif len(self.df_availability.columns) < 2: 
+                 self.status_log("Warning: Availability data lacks the timestamp (A) and Final Availability (D) columns. Required for Final Availability lookup.")
+                 self._show_messagebox_safe("warning", "Data Warning", "Availability data lacks the timestamp (A) and Final Availability (D) columns. Final Availability features might not work correctly.")
+            if self.settings['use_input_cache'] and self.df_dispatch is not None and self.df_availability is not None:
+                try:
+                    self.input_cache.store(file_path, self.df_dispatch, self.df_availability, available_months, conversion_failures)
+                except Exception as e_cache:
+                    self.status_log(f"Could not save parsed input to cache: {e_cache}")
             return self.df_dispatch, self.df_availability, available_months
         except FileNotFoundError:
-            messagebox.showerror("File Error", f"File not found: {file_path}")
+            self._show_messagebox_safe("error", "File Error", f"File not found: {file_path}")
             self.status_log(f"Error: File not found at {file_path}")
             return None, None, [] 
         except ValueError as ve: 
-            messagebox.showerror("File Error", f"Error reading Excel file. It might be corrupted or not a valid Excel file.\nDetails: {ve}")
+            self._show_messagebox_safe("error", "File Error", f"Error reading Excel file. It might be corrupted or not a valid Excel file.\nDetails: {ve}")
             self.status_log(f"Error: Could not read Excel file '{file_path}'. Details: {ve}")
             return None, None, []
         except Exception as e:
             import traceback
-            messagebox.showerror("Read Error", f"An unexpected error occurred while reading the Excel file: {e}\n\n{traceback.format_exc()}")
+            self._show_messagebox_safe("error", "Read Error", f"An unexpected error occurred while reading the Excel file: {e}\n\n{traceback.format_exc()}")
             self.status_log(f"Critical Error reading Excel: {e}\n{traceback.format_exc()}")
             return None, None, []
 
+    def _report_conversion_failures(self, conversion_failures):
+        """
+        Warn about the values read_input_tables could not convert, with a message box for invalid
+        Notification Times (Col A) of usable Dispatch Instructions. Repeated for a cache hit.
+        """
+        for table_name, failed_columns in conversion_failures.items():
+            for column, num_failed in failed_columns.items():
+                self.status_log(f"Warning: {num_failed} values in '{table_name}' column '{column}' could not be converted and were set to empty.")
+        if self.df_dispatch is not None:
+            num_failed = conversion_failures.get(DISPATCH_SHEET, {}).get(self.df_dispatch.columns[0], 0)
+            if num_failed:
+                self._show_messagebox_safe("warning", "Data Conversion Warning", f"{num_failed} date entries in 'Dispatch Instructions' are invalid and were ignored.")
+
     def get_initial_availability_load(self, selected_month_dt): 
-        self.root.after(0, self.status_log_safe, f"Attempting to fetch Initial Hourly Availability for {selected_month_dt.strftime('%b-%y')}.")
+        self.status_log_safe(f"Attempting to fetch Initial Hourly Availability for {selected_month_dt.strftime('%b-%y')}.")
         timestamp_first_minute_of_month = selected_month_dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         initial_load = self.get_hourly_final_availability(timestamp_first_minute_of_month)
         if initial_load is not None:
-            self.root.after(0, self.status_log_safe, f"Initial Hourly Availability load determined: {initial_load} (from Col D of Availability sheet for hour 00)")
+            self.status_log_safe(f"Initial Hourly Availability load determined: {initial_load} (from Col D of Availability sheet for hour 00)")
             return initial_load
         else:
-            self.root.after(0, self.status_log_safe, f"No availability data found for the first hour (00:00-00:59) of {selected_month_dt.strftime('%b-%y')} in Col D for Initial Load.")
-            self.root.after(0, self._show_messagebox_safe, "warning", "Data Warning", f"No availability data for the first hour of {selected_month_dt.strftime('%b-%y')} (Col D). Cannot determine Initial Hourly Availability.")
+            self.status_log_safe(f"No availability data found for the first hour (00:00-00:59) of {selected_month_dt.strftime('%b-%y')} in Col D for Initial Load.")
+            self._schedule(self._show_messagebox_safe, "warning", "Data Warning", f"No availability data for the first hour of {selected_month_dt.strftime('%b-%y')} (Col D). Cannot determine Initial Hourly Availability.")
             return None
 
     def perform_minute_wise_processing(self, dispatch_df_month, availability_df_month_full, selected_month_dt, start_load):
-        self.root.after(0, self.status_log_safe, f"Starting minute-wise processing for {selected_month_dt.strftime('%b-%y')} with initial load: {start_load:.2f} MW.")
+        self.status_log_safe(f"Starting minute-wise processing for {selected_month_dt.strftime('%b-%y')} with initial load: {start_load:.2f} MW.")
         month_start_dt = selected_month_dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         next_month_start_dt = (month_start_dt + relativedelta(months=1))
         total_minutes_in_month = int((next_month_start_dt - month_start_dt).total_seconds() / 60)
-        self.root.after(0, self.status_log_safe, f"Month: {selected_month_dt.strftime('%b-%y')}, Total minutes: {total_minutes_in_month}")
+        self.status_log_safe(f"Month: {selected_month_dt.strftime('%b-%y')}, Total minutes: {total_minutes_in_month}")
         timestamps = pd.date_range(start=month_start_dt, periods=total_minutes_in_month, freq='min')
-        results_list = []
-        
-        current_load = float(start_load) # Load at the END of the previous minute / START of current minute ts
         
-        parsed_instructions = []
-        # ... (Instruction parsing logic as before - confirmed to be okay) ...
-        if dispatch_df_month is not None and not dispatch_df_month.empty:
-            if len(dispatch_df_month.columns) < 6:
-                self.root.after(0, self.status_log_safe, "Dispatch Instructions sheet has insufficient columns (expected at least 6 for A-F). Processing without dispatch instructions.")
+        with self.run_stats.stage('minute engine'):
+            if dispatch_df_month is None: # The month of the prepared instruction table
+                parsed_instructions = self._month_instructions(month_start_dt, next_month_start_dt)
+            else:
+                parsed_instructions = self._parse_dispatch_instructions(dispatch_df_month)
+            self.run_stats.counts['instructions'] = self.run_stats.counts.get('instructions', 0) + len(parsed_instructions)
+
+            is_following_fcbl_directive = self.settings['start_load_type'] == "FinalAvailabilityHourly"
+            month_label = month_start_dt.strftime('%b-%y')
+            previous_checkpoint, checkpoint = None, None
+            if self.settings['engine'] == "Minute Loop":
+                results_df = self._run_minute_loop(timestamps, parsed_instructions, start_load, is_following_fcbl_directive)
             else:
-                temp_df = dispatch_df_month.copy()
+                if self.settings['incremental']:
+                    try:
+                        previous_checkpoint = self.checkpoint_store.load(self.settings['file_path'], month_label)
+                    except OSError as e_checkpoint:
+                        self.status_log_safe(f"Could not read the previous run checkpoint: {e_checkpoint}")
+                results_df, checkpoint = self._run_segment_engine(timestamps, parsed_instructions, month_start_dt, start_load, is_following_fcbl_directive, previous_checkpoint)
+
+        # Final progress update and logging
+        self._schedule(self.update_progress_safe, 100)
+        self.status_log_safe("Core minute-wise load calculation finished.")
+        if results_df.empty: # Should not happen if timestamps list is generated
+            self.status_log_safe("Warning: No results generated from processing loop.")
+            return pd.DataFrame(columns=['Date Time Stamp', 'Availability', 'Load', 'LPM (30 Min Sum)'])
+        
+        # Add Target Load column E from dispatch instructions and highlight periods
+        self.status_log_safe("Adding Target Load column from dispatch instructions...")
+        with self.run_stats.stage('Target Load'):
+            target_load, highlight_rows = mark_instruction_windows(results_df['Date Time Stamp'], parsed_instructions)
+            results_df['Target Load'] = target_load
+            results_df['Highlight_Row'] = highlight_rows  # Tracks which rows to highlight
+        
+        self.status_log_safe("Calculating specific LPM (30 Min Sum)...")
+        with self.run_stats.stage('LPM'):
+            reuse_lpm = checkpoint is not None and checkpoint['reused_minutes'] > 0
+            lpm_half_hourly = compute_lpm_half_hourly(results_df['Date Time Stamp'], results_df['Load'].to_numpy(dtype=np.float64),
+                                                      previous=previous_checkpoint['lpm'] if reuse_lpm else None,
+                                                      from_minute=checkpoint['reused_minutes'] if reuse_lpm else 0)
+            results_df['LPM (30 Min Sum)'] = lpm_column(results_df['Date Time Stamp'], lpm_half_hourly)
+            results_df.attrs['lpm_half_hourly'] = lpm_half_hourly
+            if checkpoint is not None and self.settings['incremental']:
+                checkpoint['lpm'] = lpm_half_hourly
                 try:
-                    temp_df.iloc[:, 0] = pd.to_datetime(temp_df.iloc[:, 0], errors='coerce') 
-                    temp_df.iloc[:, 1] = pd.to_datetime(temp_df.iloc[:, 1], errors='coerce') 
-                    temp_df.iloc[:, 2] = pd.to_numeric(temp_df.iloc[:, 2], errors='coerce') 
-                    temp_df.iloc[:, 4] = temp_df.iloc[:, 4].astype(str).str.upper().str.strip() 
-                    temp_df.iloc[:, 5] = pd.to_numeric(temp_df.iloc[:, 5], errors='coerce') 
-                    temp_df.dropna(subset=[temp_df.columns[0], temp_df.columns[5]], inplace=True) 
-                    for _, row in temp_df.sort_values(by=temp_df.columns[0]).iterrows():
-                        duration = row.iloc[2]
-                        if not pd.notna(duration) or duration <= 0:
-                            self.root.after(0, self.status_log_safe, f"Warning: Invalid/Missing Ramp Duration (Col C) for instruction at {row.iloc[0]}. Defaulting to 1 minute.")
-                            duration = 1.0 
-                        parsed_instructions.append({
-                            'instr_time': row.iloc[0],
-                            'target_time_stamp': row.iloc[1] if pd.notna(row.iloc[1]) else None,
-                            'ramp_duration_minutes': duration,
-                            'post_ramp_target_type': row.iloc[4],
-                            'target_demand_mw': row.iloc[5]
-                        })
-                except IndexError:
-                     self.root.after(0, self.status_log_safe, "Error accessing expected columns (A-F) in Dispatch Instructions. Check sheet structure.")
-                except Exception as e_parse:
-                     self.root.after(0, self.status_log_safe, f"Error parsing Dispatch Instructions: {e_parse}")
-            if not parsed_instructions and not dispatch_df_month.empty : 
-                 self.root.after(0, self.status_log_safe, "Warning: Dispatch Instructions found but could not be parsed. Processing as if no instructions.")
+                    self.checkpoint_store.store(self.settings['file_path'], month_label, checkpoint)
+                except Exception as e_checkpoint:
+                    self.status_log_safe(f"Could not save the run checkpoint: {e_checkpoint}")
+        self.status_log_safe("LPM (30 Min Sum) calculation complete.")
+        return results_df
+
+    def _parse_dispatch_instructions(self, dispatch_df_month):
+        """Sorted instruction dicts from the Dispatch Instructions rows (Cols A-F) of a month."""
+        if dispatch_df_month is None or dispatch_df_month.empty:
+            return []
+        if len(dispatch_df_month.columns) < 6:
+            self.status_log_safe("Dispatch Instructions sheet has insufficient columns (expected at least 6 for A-F). Processing without dispatch instructions.")
+            return []
+        table, issues = parse_dispatch_table(dispatch_df_month)
+        for instr_time in issues.loc[issues['Issue'] == 'invalid duration', 'Notification Time']:
+            self.status_log_safe(f"Warning: Invalid/Missing Ramp Duration (Col C) for instruction at {instr_time}. Defaulting to 1 minute.")
+        if not len(table):
+            self.status_log_safe("Warning: Dispatch Instructions found but could not be parsed. Processing as if no instructions.")
+        return instruction_dicts(table)
+
+    @timed_stage('instruction check')
+    def _prepare_instruction_table(self):
+        """
+        Parse and check all Dispatch Instructions once after reading the input. Keeps the sorted
+        table the months are sliced from and the issues found, and logs a summary of them.
+        """
+        try:
+            self.instruction_table, self.instruction_issues = parse_dispatch_table(self.df_dispatch)
+        except Exception as e_parse:
+            self.status_log_safe(f"Error parsing Dispatch Instructions: {e_parse}. Processing as if no instructions.")
+            self.instruction_table, self.instruction_issues = parse_dispatch_table(None)
+            return
+        if self.df_dispatch is not None and len(self.df_dispatch.columns) < 6:
+            self.status_log_safe("Dispatch Instructions sheet has insufficient columns (expected at least 6 for A-F). Processing without dispatch instructions.")
+        if self.instruction_issues.empty:
+            self.status_log_safe(f"Dispatch Instructions checked: {len(self.instruction_table)} instructions, no issues.")
+            return
+        counts = self.instruction_issues['Issue'].value_counts()
+        self.status_log_safe(f"Dispatch Instructions checked: {len(self.instruction_table)} instructions, "
+                             + ", ".join(f"{count} {issue}" for issue, count in counts.items()) + ".")
+        for issue in self.instruction_issues.head(INSTRUCTION_ISSUES_LOGGED).itertuples(index=False):
+            self.status_log_safe(f"Warning: Dispatch Instructions row {issue.Row}: {issue.Detail}")
+        if len(self.instruction_issues) > INSTRUCTION_ISSUES_LOGGED:
+            self.status_log_safe(f"... {len(self.instruction_issues) - INSTRUCTION_ISSUES_LOGGED} more, see the Instruction Check file written with the output.")
+
+    def _instruction_slice(self, month_start, month_end):
+        """Rows of the prepared instruction table with a Notification Time in [month_start, month_end)."""
+        if self.instruction_table is None:
+            self._prepare_instruction_table()
+        times = self.instruction_table['instr_time']
+        start, end = np.searchsorted(times, [np.datetime64(pd.Timestamp(month_start)), np.datetime64(pd.Timestamp(month_end))])
+        return self.instruction_table[start:end]
+
+    def _month_instructions(self, month_start, month_end):
+        """Instruction dicts of [month_start, month_end), sliced from the prepared instruction table."""
+        return instruction_dicts(self._instruction_slice(month_start, month_end))
+
+    def save_instruction_check(self, range_start, range_end, output_path):
+        """
+        Write the instruction issues of [range_start, range_end), and the rows that could not be
+        read at all, as '<output name> - Instruction Check.csv' next to output_path. Nothing is
+        written when there are none. Keeps them as run_instruction_issues for the run report.
+        """
+        issues = self.instruction_issues
+        if issues is None:
+            self.run_instruction_issues = None
+            return
+        notification_times = issues['Notification Time']
+        in_range = notification_times.isna() | ((notification_times >= range_start) & (notification_times < range_end))
+        self.run_instruction_issues = issues[in_range]
+        if self.run_instruction_issues.empty:
+            return
+        check_path = os.path.splitext(output_path)[0] + " - Instruction Check.csv"
+        try:
+            self.run_instruction_issues.to_csv(check_path, index=False, date_format='%Y-%m-%d %H:%M:%S')
+            self.output_paths.append(check_path)
+            self.status_log_safe(f"Warning: {len(self.run_instruction_issues)} Dispatch Instructions issue(s) in the processed range, listed in {check_path}")
+        except OSError as e:
+            self.status_log_safe(f"Could not write the instruction check file: {e}")
+
+    def _dispatch_month_range(self):
+        """Starts of every month from the first to the last month in Col A of Dispatch Instructions."""
+        valid_dates = self.df_dispatch.iloc[:, 0].dropna()
+        first_month = valid_dates.min().replace(day=1, hour=0, minute=0, second=0, microsecond=0, nanosecond=0)
+        return [month_start.to_pydatetime() for month_start in pd.date_range(first_month, valid_dates.max(), freq='MS')]
+
+    def _initial_engine_state(self, start_load):
+        """Segment engine state at the start of the first month: following FCBL from the start load, or holding it."""
+        if self.settings['start_load_type'] == "FinalAvailabilityHourly":
+            return {'kind': 'fcbl', 'start': 0, 'fallback': np.nan, 'seed': float(start_load)}
+        return {'kind': 'hold', 'start': 0, 'value': float(start_load)}
+
+    def save_sub_minute_outputs(self, month_starts, start_load, export_path):
+        """
+        Sub-minute mode: compute the load every step_seconds over consecutive months and stream
+        it, SUB_MINUTE_CHUNK_ROWS samples at a time, to '<name> - <step>s.<ext>' next to
+        export_path, in the Columnar Copy format (Parquet, or CSV without pyarrow, when none is
+        chosen). The half-hourly aggregates go to '<name> - <step>s Summary.<ext>', and to an
+        .xlsx of that name when the Excel workbook is on. Each month runs through the segment
+        engine as in 'All Months'; ramps are then interpolated at every sample.
+        Returns the number of samples.
+        """
+        step_seconds = self.settings['step_seconds']
+        samples_per_minute = 60 // step_seconds
+        output_format = self.settings['columnar_format']
+        if output_format == "None":
+            output_format = "Parquet" if importlib.util.find_spec('pyarrow') is not None else "CSV"
+        if self.settings['engine'] != "Segments" or self.settings['incremental']:
+            self.status_log_safe("Sub-minute steps always compute every month in full with the Segments engine.")
+        if self.df_availability is not None and not self.df_availability.empty and self.availability_index is None:
+            self.status_log_safe("Warning: Hourly availability lookup was not prepared. Attempting now.")
+            self._prepare_hourly_availability_lookup()
+        month_minutes = [int((month_start + relativedelta(months=1) - month_start).total_seconds() / 60) for month_start in month_starts]
+        total_samples = sum(month_minutes) * samples_per_minute
+        base_path = f"{os.path.splitext(export_path)[0]} - {step_seconds}s"
+        samples_path = base_path + COLUMNAR_FORMATS[output_format]
+        self.status_log_safe(f"Sub-minute run: {total_samples:,} samples every {step_seconds} s from {month_starts[0].strftime('%b-%y')} to "
+                             f"{month_starts[-1].strftime('%b-%y')}, streamed to {samples_path}")
+
+        aggregator = HalfHourlyAggregator(month_starts[0], total_samples, step_seconds)
+        state = self._initial_engine_state(start_load)
+        window_instructions = []
+        first_sample = 0
+        with ColumnarStreamWriter(samples_path, output_format) as writer:
+            for month_start, total_minutes in zip(month_starts, month_minutes):
+                with self.run_stats.stage('minute engine'):
+                    parsed_instructions = self._month_instructions(month_start, month_start + relativedelta(months=1))
+                    self.run_stats.counts['instructions'] = self.run_stats.counts.get('instructions', 0) + len(parsed_instructions)
+                    minute_availability = self._month_minute_availability(month_start, total_minutes)
+                    segments = build_load_segments(parsed_instructions, month_start, total_minutes, minute_availability, 0.0, False,
+                                                   log=lambda message: self.status_log_safe(message, logging.DEBUG), resume=(0, state, []))
+                    minute_load = render_load_segments(segments, total_minutes, minute_availability)
+                    state = carry_over_state(segments, total_minutes, minute_availability)
+                    availability = availability_column(minute_availability)
+                    window_instructions = carry_instruction_windows(window_instructions, month_start, parsed_instructions)
+                month_samples = total_minutes * samples_per_minute
+                for chunk_start in range(0, month_samples, SUB_MINUTE_CHUNK_ROWS):
+                    sample_numbers = np.arange(chunk_start, min(chunk_start + SUB_MINUTE_CHUNK_ROWS, month_samples))
+                    minutes = sample_numbers // samples_per_minute
+                    with self.run_stats.stage('minute engine'):
+                        load = round_like_python(render_load_at(segments, sample_numbers / samples_per_minute, minute_load), 3)
+                        timestamps = pd.DatetimeIndex(np.datetime64(month_start, 'ns') + sample_numbers * np.timedelta64(step_seconds, 's'))
+                    with self.run_stats.stage('Target Load'):
+                        target_load, highlight_rows = mark_instruction_windows(timestamps, window_instructions)
+                    with self.run_stats.stage('LPM'):
+                        aggregator.add(first_sample + chunk_start, load)
+                    with self.run_stats.stage('write'):
+                        writer.write(pd.DataFrame({
+                            'Date Time Stamp': timestamps,
+                            'Availability': availability[minutes],
+                            'Load': load,
+                            'Target Load': pd.Series(target_load.astype(object)).astype('string'), # The same column type in every chunk
+                            'Highlight_Row': highlight_rows,
+                        }))
+                    self._schedule(self.update_progress_safe, 100 * (first_sample + sample_numbers[-1] + 1) / total_samples)
+                first_sample += month_samples
+                self.status_log_safe(f"{month_start.strftime('%b-%y')}: {month_samples:,} samples written, {len(segments)} load segments.")
+        self.output_paths.append(samples_path)
+        self.status_log_safe(f"{output_format} output saved: {samples_path}")
+
+        with self.run_stats.stage('write'):
+            summary_df = aggregator.frame()
+            summary_paths = [base_path + " Summary" + COLUMNAR_FORMATS[output_format]]
+            with ColumnarStreamWriter(summary_paths[0], output_format) as writer:
+                writer.write(summary_df)
+            if self.settings['write_excel']:
+                summary_paths.append(base_path + " Summary.xlsx")
+                summary_df.to_excel(summary_paths[-1], sheet_name="Half Hourly", index=False)
+        for path in summary_paths:
+            self.output_paths.append(path)
+            self.status_log_safe(f"Half-hourly summary saved: {path}")
+        self.run_stats.counts['samples'] = total_samples
+        return total_samples
+
+    @timed_stage('minute engine') # Target Load and LPM are computed with each month
+    def process_all_months(self, month_starts, start_load):
+        """
+        Run consecutive months as one continuous calculation. The load segments of each month
+        are built in order, each month starting from the state (load, active ramp, FCBL mode) the
+        previous one handed over. Each month is then rendered from its segments and the months
+        are combined into one result. Building the segments is most of the work and has to run
+        in order, so worker processes would only take over the rendering, which costs less than
+        starting them.
+        """
+        if self.df_availability is not None and not self.df_availability.empty and self.availability_index is None:
+            self.status_log_safe("Warning: Hourly availability lookup was not prepared. Attempting now.")
+            self._prepare_hourly_availability_lookup()
+        self.status_log_safe(f"Multi-month run: {len(month_starts)} months, {month_starts[0].strftime('%b-%y')} to {month_starts[-1].strftime('%b-%y')}, initial load: {start_load:.2f} MW.")
+        state = self._initial_engine_state(start_load)
+        window_instructions = []
+        tasks = []
+        for month_start in month_starts:
+            month_end = month_start + relativedelta(months=1)
+            total_minutes = int((month_end - month_start).total_seconds() / 60)
+            parsed_instructions = self._month_instructions(month_start, month_end)
+            minute_availability = self._month_minute_availability(month_start, total_minutes)
+            self.run_stats.counts['instructions'] = self.run_stats.counts.get('instructions', 0) + len(parsed_instructions)
+            self.status_log_safe(f"{month_start.strftime('%b-%y')}: {len(parsed_instructions)} instructions, starting in {state['kind']} mode.")
+            segments = build_load_segments(parsed_instructions, month_start, total_minutes, minute_availability, 0.0, False,
+                                           log=lambda message: self.status_log_safe(message, logging.DEBUG), resume=(0, state, []))
+            window_instructions = carry_instruction_windows(window_instructions, month_start, parsed_instructions)
+            tasks.append((month_start, window_instructions, minute_availability, segments))
+            state = carry_over_state(segments, total_minutes, minute_availability)
+
+        month_results = []
+        for done, task in enumerate(tasks, start=1):
+            month_results.append(compute_month_load(*task))
+            self._schedule(self.update_progress_safe, 100 * done / len(tasks))
+        results_df = combine_month_results(month_results)
+        self.status_log_safe(f"Multi-month calculation finished: {len(results_df)} minutes.")
+        return results_df
+
+    def _month_minute_availability(self, month_start_dt, total_minutes):
+        """Hourly Final Availability repeated for every minute of the month, NaN where there is none."""
+        hours = pd.date_range(start=month_start_dt, periods=-(-total_minutes // 60), freq='h')
+        if self.availability_index is not None:
+            hourly_availability = self.availability_index.lookup_array(hours)
+        else:
+            hourly_availability = np.full(len(hours), np.nan)
+        return np.repeat(hourly_availability, 60)[:total_minutes]
+
+    def _run_segment_engine(self, timestamps, parsed_instructions, month_start_dt, start_load, is_following_fcbl_directive, previous_checkpoint=None):
+        """
+        Vectorized engine: builds load segments from the instructions and fills the month with NumPy.
+        Returns the results frame and a checkpoint of the run. Given the checkpoint of an earlier
+        run of the month, only instructions from the earliest changed one onward are rebuilt and
+        only the minutes from there on are rendered again.
+        """
+        total_minutes = len(timestamps)
+        minute_availability = self._month_minute_availability(month_start_dt, total_minutes)
+
+        log = self.status_log_safe
+        inputs_key = engine_inputs_key(month_start_dt, start_load, is_following_fcbl_directive, minute_availability)
+        resume_point = find_resume_point(previous_checkpoint, inputs_key, parsed_instructions, month_start_dt)
+        states = []
+        if resume_point is None:
+            if previous_checkpoint is not None:
+                log("Previous run used different availability or start load. Recomputing the whole month.")
+            first_minute = 0
+            segments = build_load_segments(parsed_instructions, month_start_dt, total_minutes, minute_availability,
+                                           start_load, is_following_fcbl_directive, log=log, checkpoints=states)
+            load = render_load_segments(segments, total_minutes, minute_availability)
+        else:
+            resume_index, first_minute = resume_point
+            resume_state = previous_checkpoint['states'][resume_index]
+            states.extend(previous_checkpoint['states'][:resume_index])
+            log(f"Incremental recompute: {resume_index} unchanged instruction(s), reusing results before "
+                f"{timestamps[first_minute].strftime('%d-%m-%Y %H:%M') if first_minute < total_minutes else 'the end of the month'}.")
+            segments = build_load_segments(parsed_instructions, month_start_dt, total_minutes, minute_availability,
+                                           start_load, is_following_fcbl_directive, log=log, checkpoints=states,
+                                           resume=(resume_index, resume_state['state'], previous_checkpoint['segments'][:resume_state['segment_count']]))
+            load = render_load_segments(segments, total_minutes, minute_availability, base_load=previous_checkpoint['load'], from_minute=first_minute)
+        for seg in segments:
+            if seg['kind'] == 'fcbl' and seg['end'] > first_minute:
+                missing = int(np.isnan(minute_availability[seg['start']:seg['end']]).sum())
+                if missing:
+                    log(f"    FCBL mode from {timestamps[seg['start']].strftime('%d-%m %H:%M')}: no availability for {missing} minute(s). Used fallback load.")
+        self.status_log_safe(f"Segment engine built {len(segments)} load segments.")
+
+        results_df = pd.DataFrame({
+            'Date Time Stamp': timestamps,
+            'Availability': availability_column(minute_availability),
+            'Load': round_like_python(load, 3),
+            'LPM (30 Min Sum)': lpm_column(timestamps)  # Will be calculated later
+        })
+        checkpoint = {'inputs': inputs_key, 'instructions': [instruction_key(instr) for instr in parsed_instructions],
+                      'states': states, 'segments': segments, 'load': load, 'reused_minutes': first_minute, 'lpm': None}
+        return results_df, checkpoint
+
+    def _run_minute_loop(self, timestamps, parsed_instructions, start_load, is_following_fcbl_directive):
+        """Reference engine: walks every minute of the month in Python, filling preallocated result arrays."""
+        minute_availability = np.empty(len(timestamps))
+        minute_load = np.empty(len(timestamps))
+        current_load = float(start_load) # Load at the END of the previous minute / START of current minute ts
 
         instr_idx = 0
         active_ramp_rate = 0.0
@@ -308,12 +1649,10 @@ class LoadProcessorApp:
         current_post_ramp_type = None 
         
         active_hourly_availability = np.nan 
-        is_following_fcbl_directive = self.start_load_type_var.get() == "FinalAvailabilityHourly"
         # Store the target that led to FCBL mode, for fallback
         fallback_fcbl_target_load = start_load if not is_following_fcbl_directive else np.nan
 
 
-        log_update_interval = max(1, total_minutes_in_month // 100)
 
         for i, ts in enumerate(timestamps):
             load_for_this_minute = current_load # Load at the start of minute 'ts'
@@ -331,12 +1670,12 @@ class LoadProcessorApp:
                 else: # Fallback if FCBL lookup fails for this hour
                     load_for_this_minute = fallback_fcbl_target_load if pd.notna(fallback_fcbl_target_load) else load_for_this_minute # Use fallback or last known load
                     # active_dispatch_demand remains fallback_fcbl_target_load
-                    self.root.after(0, self.status_log_safe, f"    Minute {ts.strftime('%H:%M')}: FCBL mode, but no availability for this hour. Using fallback load: {load_for_this_minute:.2f}")
+                    self.status_log_safe(f"    Minute {ts.strftime('%H:%M')}: FCBL mode, but no availability for this hour. Using fallback load: {load_for_this_minute:.2f}", logging.DEBUG)
             
             # 2. Process new instruction (can override FCBL mode or ongoing ramp)
             if instr_idx < len(parsed_instructions) and ts == parsed_instructions[instr_idx]['instr_time']:
                 instr = parsed_instructions[instr_idx]
-                self.root.after(0, self.status_log_safe, f"  Minute {ts.strftime('%H:%M')}: Instruction at {instr['instr_time']}. Target: {instr['target_demand_mw']:.2f}, Duration: {instr['ramp_duration_minutes']}, TargetTime: {instr['target_time_stamp']}, PostRamp: {instr['post_ramp_target_type']}")
+                self.status_log_safe(f"  Minute {ts.strftime('%H:%M')}: Instruction at {instr['instr_time']}. Target: {instr['target_demand_mw']:.2f}, Duration: {instr['ramp_duration_minutes']}, TargetTime: {instr['target_time_stamp']}, PostRamp: {instr['post_ramp_target_type']}")
                 
                 is_following_fcbl_directive = False # New instruction overrides previous FCBL state initially
                 is_ramping = False # Assume new instruction might stop previous ramp
@@ -353,39 +1692,39 @@ class LoadProcessorApp:
                 if is_instantaneous:
                     load_for_this_minute = current_ramp_target_mw
                     ramp_end_time = ts 
-                    self.root.after(0, self.status_log_safe, f"    Instantaneous change to target: {load_for_this_minute:.2f} MW.")
+                    self.status_log_safe(f"    Instantaneous change to target: {load_for_this_minute:.2f} MW.")
                     # Post-ramp logic applies immediately for instantaneous
                     if current_post_ramp_type == "FCBL":
                         hourly_avail = self.get_hourly_final_availability(ts)
                         if hourly_avail is not None:
                             load_for_this_minute = hourly_avail
                             is_following_fcbl_directive = True
-                            self.root.after(0, self.status_log_safe, f"    Instantaneous FCBL. Load set to: {load_for_this_minute:.2f} MW.")
+                            self.status_log_safe(f"    Instantaneous FCBL. Load set to: {load_for_this_minute:.2f} MW.")
                         else: # FCBL lookup failed, load_for_this_minute is already target
-                            self.root.after(0, self.status_log_safe, f"    Instantaneous FCBL, but no availability. Load remains target: {load_for_this_minute:.2f} MW.")
+                            self.status_log_safe(f"    Instantaneous FCBL, but no availability. Load remains target: {load_for_this_minute:.2f} MW.")
                 elif load_for_this_minute == current_ramp_target_mw: # Already at target
-                    self.root.after(0, self.status_log_safe, f"    Load {load_for_this_minute:.2f} already at new target. No ramp. Checking post-ramp.")
+                    self.status_log_safe(f"    Load {load_for_this_minute:.2f} already at new target. No ramp. Checking post-ramp.")
                     ramp_end_time = ts # Ends now
                     if current_post_ramp_type == "FCBL": # Check post-ramp FCBL
                         hourly_avail = self.get_hourly_final_availability(ts)
                         if hourly_avail is not None: 
                             load_for_this_minute = hourly_avail; is_following_fcbl_directive = True
-                            self.root.after(0, self.status_log_safe, f"    FCBL (no ramp). Load set to: {load_for_this_minute:.2f} MW.")
-                        else: self.root.after(0, self.status_log_safe, f"    FCBL (no ramp), no availability. Load remains target: {load_for_this_minute:.2f} MW.")
+                            self.status_log_safe(f"    FCBL (no ramp). Load set to: {load_for_this_minute:.2f} MW.")
+                        else: self.status_log_safe(f"    FCBL (no ramp), no availability. Load remains target: {load_for_this_minute:.2f} MW.")
                 else: # Start a ramp
                     is_ramping = True
                     if pd.notna(instr['target_time_stamp']) and instr['target_time_stamp'] > ts:
                         ramp_end_time = instr['target_time_stamp']
                         effective_duration_minutes = max(1.0, (ramp_end_time - ts).total_seconds() / 60)
                         if abs(effective_duration_minutes - duration) > 1 and duration > 0:
-                             self.root.after(0, self.status_log_safe, f"    Note: Ramp Duration (Col C: {duration} min) differs from time to Target Time Stamp (Col B). Using duration to Target Time Stamp ({effective_duration_minutes:.1f} min).")
+                             self.status_log_safe(f"    Note: Ramp Duration (Col C: {duration} min) differs from time to Target Time Stamp (Col B). Using duration to Target Time Stamp ({effective_duration_minutes:.1f} min).")
                         duration = effective_duration_minutes
                     else:
                         ramp_end_time = ts + datetime.timedelta(minutes=duration)
                         if pd.notna(instr['target_time_stamp']): # Log if target_time_stamp was not usable
-                             self.root.after(0, self.status_log_safe, f"    Warning: Target Time Stamp {instr['target_time_stamp']} is not in future or invalid. Using Ramp Duration {duration} min. Calculated Ramp End: {ramp_end_time.strftime('%Y-%m-%d %H:%M')}")
+                             self.status_log_safe(f"    Warning: Target Time Stamp {instr['target_time_stamp']} is not in future or invalid. Using Ramp Duration {duration} min. Calculated Ramp End: {ramp_end_time.strftime('%Y-%m-%d %H:%M')}")
                     active_ramp_rate = (current_ramp_target_mw - load_for_this_minute) / duration
-                    self.root.after(0, self.status_log_safe, f"    New ramp started. Rate: {active_ramp_rate:.2f} MW/min towards {current_ramp_target_mw:.2f} by {ramp_end_time.strftime('%Y-%m-%d %H:%M')}.")
+                    self.status_log_safe(f"    New ramp started. Rate: {active_ramp_rate:.2f} MW/min towards {current_ramp_target_mw:.2f} by {ramp_end_time.strftime('%Y-%m-%d %H:%M')}.")
                 instr_idx += 1
             
             # 3. If not following FCBL and a ramp is active (and wasn't just completed by a new instruction)
@@ -397,119 +1736,43 @@ class LoadProcessorApp:
                 elif ts == ramp_end_time: # Ramp ends now
                     load_for_this_minute = current_ramp_target_mw # Snap to target for this minute
                     is_ramping = False
-                    self.root.after(0, self.status_log_safe, f"  Minute {ts.strftime('%H:%M')}: Ongoing ramp ended. Load at target: {load_for_this_minute:.2f} MW.")
+                    self.status_log_safe(f"  Minute {ts.strftime('%H:%M')}: Ongoing ramp ended. Load at target: {load_for_this_minute:.2f} MW.")
                     if current_post_ramp_type == "FCBL":
                         hourly_avail = self.get_hourly_final_availability(ts)
                         if hourly_avail is not None:
                             load_for_this_minute = hourly_avail
                             is_following_fcbl_directive = True
                             fallback_fcbl_target_load = current_ramp_target_mw # Store this
-                            self.root.after(0, self.status_log_safe, f"    Post-ramp FCBL. Load set to: {load_for_this_minute:.2f} MW.")
+                            self.status_log_safe(f"    Post-ramp FCBL. Load set to: {load_for_this_minute:.2f} MW.")
                         else: # FCBL lookup failed
                             is_following_fcbl_directive = False # Not following if lookup fails
-                            self.root.after(0, self.status_log_safe, f"    Post-ramp FCBL, no availability. Load remains target: {load_for_this_minute:.2f} MW.")
+                            self.status_log_safe(f"    Post-ramp FCBL, no availability. Load remains target: {load_for_this_minute:.2f} MW.")
                     else: # Not FCBL
                         is_following_fcbl_directive = False
             
             # Record results for minute ts
-            
-            results_list.append({
-                'Date Time Stamp': ts, 
-                'Availability': round(active_hourly_availability, 2) if pd.notna(active_hourly_availability) else pd.NA,
-                'Load': round(load_for_this_minute, 3), 
-                'LPM (30 Min Sum)': pd.NA  # Will be calculated later
-            })
+            minute_availability[i] = round(active_hourly_availability, 2) if pd.notna(active_hourly_availability) else np.nan
+            minute_load[i] = round(load_for_this_minute, 3)
 
             # Prepare current_load for the START of the next minute
             if is_ramping and ramp_end_time is not None and ts < ramp_end_time :
                 current_load = load_for_this_minute + active_ramp_rate
             else: # Not ramping, or ramp just ended
                 current_load = load_for_this_minute 
-        
-        # Final progress update and logging
-        self.root.after(0, self.update_progress_safe, 100)
-        self.root.after(0, self.status_log_safe, "Core minute-wise load calculation loop finished.")
-        if not results_list: # Should not happen if timestamps list is generated
-            self.root.after(0, self.status_log_safe, "Warning: No results generated from processing loop.")
-            return pd.DataFrame(columns=['Date Time Stamp', 'Availability', 'Load', 'LPM (30 Min Sum)'])
 
-        results_df = pd.DataFrame(results_list)
-        
-        # Add Target Load column E from dispatch instructions and highlight periods
-        self.root.after(0, self.status_log_safe, "Adding Target Load column from dispatch instructions...")
-        results_df['Target Load'] = ''
-        results_df['Highlight_Row'] = False  # Add column to track which rows to highlight
-        
-        # Process dispatch instructions to create Target Load entries and mark highlighting periods
-        for i, instr in enumerate(parsed_instructions):
-            instr_time = instr['instr_time']
-            target_time = instr['target_time_stamp']
-            post_ramp_type = instr['post_ramp_target_type']
-            ramp_duration = instr['ramp_duration_minutes']
-            
-            # Create the target load string
-            if post_ramp_type == 'FCBL':
-                target_load_text = 'FCBL'
-            else:
-                target_load_text = f"{instr['target_demand_mw']:.0f} MW"
-            
-            # Add timestamp if available
-            if pd.notna(target_time):
-                timestamp_str = target_time.strftime('%d.%b.%y %H:%M')
-                target_load_display = f"{target_load_text} @ {timestamp_str}"
-                ramp_end_time = target_time
-            else:
-                target_load_display = target_load_text
-                ramp_end_time = instr_time + datetime.timedelta(minutes=ramp_duration)
-            
-            # Set the target load for the instruction time
-            mask = results_df['Date Time Stamp'] == instr_time
-            results_df.loc[mask, 'Target Load'] = target_load_display
-            
-            # Mark all rows from instruction time until target is met for highlighting
-            highlight_mask = (results_df['Date Time Stamp'] >= instr_time) & (results_df['Date Time Stamp'] <= ramp_end_time)
-            results_df.loc[highlight_mask, 'Highlight_Row'] = True
-        
-        self.root.after(0, self.status_log_safe, "Calculating specific LPM (30 Min Sum)...")
-        if not results_df.empty:
-            # Calculate Load Per Minute for LPM calculation only (not stored in final output)
-            load_per_minute = results_df['Load'] / 30.0
-            lpm_series = pd.Series(load_per_minute.values, index=results_df['Date Time Stamp'])
-            
-            for idx, row_ts in results_df['Date Time Stamp'].items(): 
-                if row_ts.minute == 30:
-                    # Sum from minute 1 to 30 of current hour
-                    window_start = row_ts.replace(minute=1)
-                    window_end = row_ts  # minute 30
-                    if window_start >= lpm_series.index.min():
-                        sum_val = lpm_series.loc[window_start:window_end].sum()
-                        results_df.loc[idx, 'LPM (30 Min Sum)'] = round(sum_val, 5)
-                elif row_ts.minute == 0:
-                    # Sum from minute 31 to 0 of next hour (i.e., 31-59 of previous hour + 0 of current hour)
-                    window_start = row_ts - pd.Timedelta(minutes=29)  # 29 minutes back from 0 = minute 31 of previous hour
-                    window_end = row_ts  # minute 0 of current hour
-                    if window_start >= lpm_series.index.min():
-                        sum_val = lpm_series.loc[window_start:window_end].sum()
-                        results_df.loc[idx, 'LPM (30 Min Sum)'] = round(sum_val, 5)
-        self.root.after(0, self.status_log_safe, "LPM (30 Min Sum) calculation complete.")
-        return results_df
+        return pd.DataFrame({
+            'Date Time Stamp': timestamps,
+            'Availability': minute_availability,
+            'Load': minute_load,
+            'LPM (30 Min Sum)': lpm_column(timestamps)  # Will be calculated later
+        })
 
     def create_summary_sheet(self, writer, result_df):
         """Create a summary sheet with half-hourly LPM data"""
         try:
-            # Get the first date to determine sheet name
-            first_date = result_df['Date Time Stamp'].iloc[0]
-            sheet_name = first_date.strftime('%b-%y')
-            
-            # Filter for half-hourly data (minutes 0 and 30)
-            half_hourly_mask = result_df['Date Time Stamp'].dt.minute.isin([0, 30])
-            summary_data = result_df[half_hourly_mask].copy()
-            
-            # Select only Date Time Stamp and LPM (30 Min Sum) columns
-            summary_df = summary_data[['Date Time Stamp', 'LPM (30 Min Sum)']].copy()
+            sheet_name = summary_sheet_name(result_df)
             
-            # Rename columns for summary sheet
-            summary_df.columns = ['Half Hourly Date', 'LPM (30 Min Sum)']
+            summary_df = half_hourly_summary(result_df)
             
             # Write to summary sheet
             summary_df.to_excel(writer, index=False, sheet_name=sheet_name)
@@ -541,178 +1804,483 @@ class LoadProcessorApp:
             # Freeze panes
             summary_worksheet.freeze_panes = 'A2'
             
-            self.root.after(0, self.status_log_safe, f"Summary sheet '{sheet_name}' created with {len(summary_df)} half-hourly records")
+            self.status_log_safe(f"Summary sheet '{sheet_name}' created with {len(summary_df)} half-hourly records")
             
         except Exception as e:
-            self.root.after(0, self.status_log_safe, f"Error creating summary sheet: {e}")
+            self.status_log_safe(f"Error creating summary sheet: {e}")
 
+    @timed_stage('write')
     def save_output_excel(self, result_df, export_path):
-        self.root.after(0, self.status_log_safe, f"Attempting to save output to: {export_path}")
+        """Write the FADL Calculation workbook. Returns True when it was saved, False after reporting the error."""
+        self.status_log_safe(f"Attempting to save output to: {export_path}")
+        # The sheet shows the stages before the write, the JSON run report has them all
+        run_stats_rows = self.run_stats.rows() if self.settings['run_stats_sheet'] else None
         try:
-            with pd.ExcelWriter(export_path, engine='openpyxl', datetime_format='YYYY-MM-DD HH:MM:SS') as writer:
-                cols = ['Date Time Stamp', 'Availability', 'Load', 
-                        'Target Load', 'LPM (30 Min Sum)']
-                # Only include columns that should be in the final output (exclude Highlight_Row)
-                result_df_ordered = result_df[[col for col in cols if col in result_df.columns]]
+            if self.settings['writer'] == "Fast" and xlsxwriter is not None:
+                summary_rows = write_fadl_workbook_fast(result_df, export_path, run_stats_rows)
+                self.status_log_safe(f"Fast writer: FADL_Calculation and summary sheet ({summary_rows} half-hourly records) written")
+            else:
+                if self.settings['writer'] == "Fast":
+                    self.status_log_safe("XlsxWriter is not installed, so the Fast writer is unavailable. Using the Standard writer.")
+                with pd.ExcelWriter(export_path, engine='openpyxl', datetime_format='YYYY-MM-DD HH:MM:SS') as writer:
+                    cols = ['Date Time Stamp', 'Availability', 'Load', 
+                            'Target Load', 'LPM (30 Min Sum)']
+                    # Only include columns that should be in the final output (exclude Highlight_Row)
+                    result_df_ordered = result_df[[col for col in cols if col in result_df.columns]]
                 
-                result_df_ordered.to_excel(writer, index=False, sheet_name="FADL_Calculation")
+                    result_df_ordered.to_excel(writer, index=False, sheet_name="FADL_Calculation")
                 
-                # Create summary sheet with half-hourly data
-                self.create_summary_sheet(writer, result_df)
+                    # Create summary sheet with half-hourly data
+                    self.create_summary_sheet(writer, result_df)
+                    if run_stats_rows is not None:
+                        pd.DataFrame(run_stats_rows, columns=RUN_STATS_COLUMNS).to_excel(writer, index=False, sheet_name="Run Stats")
                 
-                workbook = writer.book
-                worksheet = writer.sheets["FADL_Calculation"]
-                worksheet.freeze_panes = 'A2'
-                header_font = Font(bold=True, color="FFFFFFFF", name='Calibri') 
-                header_fill = PatternFill(start_color="FF0070C0", end_color="FF0070C0", fill_type="solid") 
-                center_alignment = Alignment(horizontal="center", vertical="center")
-
-                for col_num, column_title in enumerate(result_df_ordered.columns, 1):
-                    cell = worksheet.cell(row=1, column=col_num)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = center_alignment
-                    column_letter = get_column_letter(col_num)
-                    header_len = len(str(column_title))
-                    if not result_df_ordered[column_title].empty:
-                        if result_df_ordered[column_title].isna().all():
-                            max_data_len = 0
-                        else:
-                            max_data_len = result_df_ordered[column_title].astype(str).map(len).max()
-                    else: max_data_len = 0
-                    max_len = max(header_len, int(max_data_len)) 
-                    if column_title == 'Date Time Stamp': 
-                        adjusted_width = 22 
-                    elif column_title == 'Target Load':
-                        adjusted_width = 25  # Wider for target load with timestamp
-                    else: 
-                        adjusted_width = (max_len + 2) * 1.1 
-                    worksheet.column_dimensions[column_letter].width = min(max(adjusted_width, 10), 50)
-
-                # Apply formatting to all columns
-                for col_idx, col_name in enumerate(result_df_ordered.columns):
-                    col_letter = get_column_letter(col_idx + 1)
+                    workbook = writer.book
+                    worksheet = writer.sheets["FADL_Calculation"]
+                    worksheet.freeze_panes = 'A2'
+                    header_font = Font(bold=True, color="FFFFFFFF", name='Calibri') 
+                    header_fill = PatternFill(start_color="FF0070C0", end_color="FF0070C0", fill_type="solid") 
+                    center_alignment = Alignment(horizontal="center", vertical="center")
+
+                    for col_num, column_title in enumerate(result_df_ordered.columns, 1):
+                        cell = worksheet.cell(row=1, column=col_num)
+                        cell.font = header_font
+                        cell.fill = header_fill
+                        cell.alignment = center_alignment
+                        column_letter = get_column_letter(col_num)
+                        header_len = len(str(column_title))
+                        if not result_df_ordered[column_title].empty:
+                            if result_df_ordered[column_title].isna().all():
+                                max_data_len = 0
+                            else:
+                                max_data_len = result_df_ordered[column_title].dropna().astype(str).str.len().max()
+                        else: max_data_len = 0
+                        max_len = max(header_len, int(max_data_len)) 
+                        if column_title == 'Date Time Stamp': 
+                            adjusted_width = 22 
+                        elif column_title == 'Target Load':
+                            adjusted_width = 25  # Wider for target load with timestamp
+                        else: 
+                            adjusted_width = (max_len + 2) * 1.1 
+                        worksheet.column_dimensions[column_letter].width = min(max(adjusted_width, 10), 50)
+
+                    # Apply formatting to all columns
+                    for col_idx, col_name in enumerate(result_df_ordered.columns):
+                        col_letter = get_column_letter(col_idx + 1)
                     
-                    if col_name == 'Date Time Stamp':
-                        # Format Date Time Stamp column as dd.mmm.yy hh:mm
-                        for row_idx in range(2, worksheet.max_row + 1):
-                            worksheet[f'{col_letter}{row_idx}'].number_format = 'dd.mmm.yy hh:mm'
-                    elif col_name != 'Target Load' and pd.api.types.is_numeric_dtype(result_df_ordered[col_name]):
-                        # Apply number formatting to numeric columns
-                        num_format = '#,##0.000' 
-                        if "Sum" in col_name : num_format = '#,##0.000'
-                        elif "Load" == col_name or "Availability" == col_name:
-                            num_format = '#,##0.00'
-                        for row_idx in range(2, worksheet.max_row + 1):
-                            worksheet[f'{col_letter}{row_idx}'].number_format = num_format
+                        if col_name == 'Date Time Stamp':
+                            # Format Date Time Stamp column as dd.mmm.yy hh:mm
+                            for row_idx in range(2, worksheet.max_row + 1):
+                                worksheet[f'{col_letter}{row_idx}'].number_format = 'dd.mmm.yy hh:mm'
+                        elif col_name != 'Target Load' and pd.api.types.is_numeric_dtype(result_df_ordered[col_name]):
+                            # Apply number formatting to numeric columns
+                            num_format = '#,##0.000' 
+                            if "Sum" in col_name : num_format = '#,##0.000'
+                            elif "Load" == col_name or "Availability" == col_name:
+                                num_format = '#,##0.00'
+                            for row_idx in range(2, worksheet.max_row + 1):
+                                worksheet[f'{col_letter}{row_idx}'].number_format = num_format
                 
-                # Highlight rows during dispatch instruction periods (from instruction until target met)
-                target_load_fill = PatternFill(start_color="FFFFCD", end_color="FFFFCD", fill_type="solid")  # RGB 255,255,205
+                    # Highlight rows during dispatch instruction periods (from instruction until target met)
+                    target_load_fill = PatternFill(start_color="FFFFCD", end_color="FFFFCD", fill_type="solid")  # RGB 255,255,205
                 
-                # Check if we have the Highlight_Row column in the original dataframe
-                if 'Highlight_Row' in result_df.columns:
-                    highlight_data = result_df['Highlight_Row'].values
-                    for row_idx in range(2, worksheet.max_row + 1):  # Start from row 2 (skip header)
-                        df_row_idx = row_idx - 2  # Convert Excel row to DataFrame index (Excel row 2 = df index 0)
-                        if df_row_idx < len(highlight_data) and highlight_data[df_row_idx]:
-                            # Highlight columns A through E (Date Time Stamp, Availability, Load, Target Load, LPM)
-                            for col_to_highlight in range(1, 6):  # Columns A=1, B=2, C=3, D=4, E=5
-                                cell_to_highlight = worksheet.cell(row=row_idx, column=col_to_highlight)
-                                cell_to_highlight.fill = target_load_fill
+                    # Check if we have the Highlight_Row column in the original dataframe
+                    if 'Highlight_Row' in result_df.columns:
+                        highlight_data = result_df['Highlight_Row'].values
+                        for row_idx in range(2, worksheet.max_row + 1):  # Start from row 2 (skip header)
+                            df_row_idx = row_idx - 2  # Convert Excel row to DataFrame index (Excel row 2 = df index 0)
+                            if df_row_idx < len(highlight_data) and highlight_data[df_row_idx]:
+                                # Highlight columns A through E (Date Time Stamp, Availability, Load, Target Load, LPM)
+                                for col_to_highlight in range(1, 6):  # Columns A=1, B=2, C=3, D=4, E=5
+                                    cell_to_highlight = worksheet.cell(row=row_idx, column=col_to_highlight)
+                                    cell_to_highlight.fill = target_load_fill
                 
-            self.root.after(0, self.status_log_safe, f"Output successfully saved and formatted: {export_path}")
-            self.root.after(0, lambda: messagebox.showinfo("Success", f"Processing complete. Output saved to:\n{export_path}"))
+            self.output_paths.append(export_path)
+            self.status_log_safe(f"Output successfully saved and formatted: {export_path}")
+            self._schedule(self._show_messagebox_safe, "info", "Success", f"Processing complete. Output saved to:\n{export_path}")
             # Open the file automatically
-            self.root.after(0, lambda: self.open_file(export_path))
+            self._schedule(self.open_file, export_path)
+            return True
         except PermissionError:
             err_msg = f"Permission denied to save to {export_path}. Check permissions/if file is open."
-            self.root.after(0, self.status_log_safe, err_msg)
-            self.root.after(0, lambda: messagebox.showerror("Save Error", err_msg))
+            self.status_log_safe(err_msg)
+            self._schedule(self._show_messagebox_safe, "error", "Save Error", err_msg)
         except Exception as e:
             import traceback
             err_msg = f"Failed to save output file.\nError: {e}" 
-            self.root.after(0, self.status_log_safe, f"Error saving output Excel: {e}\n{traceback.format_exc()}") 
-            self.root.after(0, lambda: messagebox.showerror("Save Error", err_msg))
+            self.status_log_safe(f"Error saving output Excel: {e}\n{traceback.format_exc()}") 
+            self._schedule(self._show_messagebox_safe, "error", "Save Error", err_msg)
+        return False
+
+    @timed_stage('write')
+    def save_columnar_outputs(self, result_df, export_path, output_format):
+        """Write the columnar copies. Returns True when they were saved, False after reporting the error."""
+        self.status_log_safe(f"Writing {output_format} copies of the minute-level result and half-hourly summary...")
+        try:
+            written_paths = write_columnar_outputs(result_df, export_path, output_format)
+            self.output_paths.extend(written_paths)
+            for path in written_paths:
+                self.status_log_safe(f"{output_format} output saved: {path}")
+            if not self.settings['write_excel']:
+                self._schedule(self._show_messagebox_safe, "info", "Success", "Processing complete. Output saved to:\n" + "\n".join(written_paths))
+            return True
+        except ImportError as e:
+            err_msg = f"{output_format} output needs an optional package that is not installed (pyarrow): {e}"
+            self.status_log_safe(err_msg)
+            self._schedule(self._show_messagebox_safe, "error", "Save Error", err_msg)
+        except Exception as e:
+            import traceback
+            err_msg = f"Failed to save {output_format} output.\nError: {e}"
+            self.status_log_safe(f"Error saving {output_format} output: {e}\n{traceback.format_exc()}")
+            self._schedule(self._show_messagebox_safe, "error", "Save Error", err_msg)
+        return False
 
     def update_progress_safe(self, value):
-        self.progress_bar['value'] = value
+        pass
 
-    def status_log_safe(self, message):
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
+    def status_log_safe(self, message, level=logging.INFO):
+        # Safe from any thread: the log sink pushes queued lines to the widget in batches
+        self.logger.log(level, message)
+
+    def _processing_finished_safe(self):
+        pass
 
     def _show_messagebox_safe(self, msg_type, title, message):
-        if msg_type == "info": messagebox.showinfo(title, message)
-        elif msg_type == "warning": messagebox.showwarning(title, message)
-        elif msg_type == "error": messagebox.showerror(title, message)
+        self.notices.append((msg_type, title, message))
+        level = {"error": logging.ERROR, "warning": logging.WARNING}.get(msg_type, logging.INFO)
+        self.logger.log(level, f"{title}: {message}")
+
+    def _schedule(self, func, *args):
+        """Run a progress/message/finish callback. The window runs them on the Tk thread instead."""
+        func(*args)
 
     def _processing_logic(self):
+        """Process the selected month(s) and write the outputs. Returns True when the run completed."""
         import traceback 
+        self.output_paths = []
+        self.run_stats = RunStats(self.input_stats, self.settings['trace_memory'])
+        self.run_instruction_issues = None
+        completed = False
         try:
-            self.root.after(0, self.status_log_safe, "Background processing thread started.")
-            selected_month_str = self.month_var.get()
-            custom_load_val = self.custom_load_var.get() 
-            export_dir = self.export_dir_var.get()
-            start_load_type = self.start_load_type_var.get()
+            self.status_log_safe("Processing started.")
+            selected_month_str = self.settings['month']
+            custom_load_val = self.settings['custom_load'] 
+            export_dir = self.settings['export_dir']
+            start_load_type = self.settings['start_load_type']
+            if self.availability_index is not None:
+                self.availability_index.gap_policy = self.settings['gap_policy']
 
-            try:
-                selected_month_dt = datetime.datetime.strptime(selected_month_str, '%b-%y')
-            except ValueError:
-                self.root.after(0, self._show_messagebox_safe, "error", "Date Error", f"Invalid month format: {selected_month_str}.")
-                self.root.after(0, self.status_log_safe, f"Processing aborted: Invalid month format '{selected_month_str}'.")
-                return 
+            if selected_month_str == ALL_MONTHS_LABEL:
+                month_starts = self._dispatch_month_range()
+                selected_month_dt = month_starts[0]
+            else:
+                try:
+                    selected_month_dt = datetime.datetime.strptime(selected_month_str, '%b-%y')
+                except ValueError:
+                    self._schedule(self._show_messagebox_safe, "error", "Date Error", f"Invalid month format: {selected_month_str}.")
+                    self.status_log_safe(f"Processing aborted: Invalid month format '{selected_month_str}'.")
+                    return False
 
             start_load = 0.0
             if start_load_type == "FinalAvailabilityHourly": 
                 start_load = self.get_initial_availability_load(selected_month_dt) 
                 if start_load is None:
-                    self.root.after(0, self.status_log_safe, "Processing aborted: Could not determine Initial Hourly Availability for starting load.")
-                    return 
+                    self.status_log_safe("Processing aborted: Could not determine Initial Hourly Availability for starting load.")
+                    return False
             else: # Custom
                 start_load = custom_load_val 
             
-            self.root.after(0, self.status_log_safe, f"Determined start load: {start_load:.2f} MW")
+            self.status_log_safe(f"Determined start load: {start_load:.2f} MW")
 
-            month_start_filter = selected_month_dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            month_end_filter = (month_start_filter + relativedelta(months=1))
-            
-            dispatch_df_month = pd.DataFrame() 
-            if self.df_dispatch is not None and not self.df_dispatch.empty:
-                if not pd.api.types.is_datetime64_any_dtype(self.df_dispatch.iloc[:, 0]):
-                    self.root.after(0, self.status_log_safe, "Warning: Re-converting Dispatch timestamp column in thread before filtering.")
-                    try: self.df_dispatch.iloc[:, 0] = pd.to_datetime(self.df_dispatch.iloc[:, 0], errors='coerce')
-                    except: self.root.after(0, self.status_log_safe, "Error during defensive conversion of Dispatch timestamp.")
-                
-                if pd.api.types.is_datetime64_any_dtype(self.df_dispatch.iloc[:, 0]): 
-                    dispatch_df_month = self.df_dispatch[(self.df_dispatch.iloc[:, 0] >= month_start_filter) & (self.df_dispatch.iloc[:, 0] < month_end_filter)].copy()
+            import os 
+            full_export_path = os.path.join(export_dir, self.output_file_name)
+            if self.settings['step_seconds'] < 60:
+                if selected_month_str != ALL_MONTHS_LABEL:
+                    month_starts = [selected_month_dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)]
+                self.save_instruction_check(month_starts[0], month_starts[-1] + relativedelta(months=1), full_export_path)
+                samples = self.save_sub_minute_outputs(month_starts, start_load, full_export_path)
+                self.run_stats.counts['minutes'] = samples * self.settings['step_seconds'] // 60
+                self._schedule(self._show_messagebox_safe, "info", "Success", "Processing complete. Output saved to:\n" + "\n".join(self.output_paths))
+                self.status_log_safe("Processing finished successfully.")
+                completed = True
+                return True
+
+            if selected_month_str == ALL_MONTHS_LABEL:
+                result_df = self.process_all_months(month_starts, start_load)
+            else:
+                month_start_filter = selected_month_dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+                month_end_filter = (month_start_filter + relativedelta(months=1))
+                month_instructions = len(self._instruction_slice(month_start_filter, month_end_filter))
             
-            if self.df_availability is not None and not self.df_availability.empty and self.availability_series_hourly_lookup is None:
-                 self.root.after(0, self.status_log_safe, "Warning: Hourly availability lookup was not prepared. Attempting now.")
-                 self._prepare_hourly_availability_lookup() 
+                if self.df_availability is not None and not self.df_availability.empty and self.availability_index is None:
+                     self.status_log_safe("Warning: Hourly availability lookup was not prepared. Attempting now.")
+                     self._prepare_hourly_availability_lookup() 
 
-            self.root.after(0, self.status_log_safe, f"Filtered Dispatch Data for {selected_month_str}: {len(dispatch_df_month)} rows.")
+                self.status_log_safe(f"Filtered Dispatch Data for {selected_month_str}: {month_instructions} instructions.")
             
-            if dispatch_df_month.empty and start_load_type != "Custom" and (start_load == 0 or start_load is None) : 
-                 self.root.after(0, self.status_log_safe, f"Warning: No dispatch instructions for {selected_month_str} and starting load is 0 or could not be determined from availability.")
+                if not month_instructions and start_load_type != "Custom" and (start_load == 0 or start_load is None) : 
+                     self.status_log_safe(f"Warning: No dispatch instructions for {selected_month_str} and starting load is 0 or could not be determined from availability.")
         
-            result_df = self.perform_minute_wise_processing(dispatch_df_month, self.df_availability, selected_month_dt, start_load) 
+                result_df = self.perform_minute_wise_processing(None, self.df_availability, selected_month_dt, start_load) 
             
-            output_file_name = "FADL Calculation.xlsx"
-            import os 
-            full_export_path = os.path.join(export_dir, output_file_name)
-            self.save_output_excel(result_df, full_export_path) 
-            self.root.after(0, self.status_log_safe, "Processing thread finished successfully.")
+            if selected_month_str == ALL_MONTHS_LABEL:
+                self.save_instruction_check(month_starts[0], month_starts[-1] + relativedelta(months=1), full_export_path)
+            else:
+                self.save_instruction_check(month_start_filter, month_end_filter, full_export_path)
+            saved = True
+            if self.settings['write_excel'] and len(result_df) > EXCEL_MAX_DATA_ROWS:
+                self.status_log_safe(f"Warning: {len(result_df)} minutes do not fit on one Excel sheet ({EXCEL_MAX_DATA_ROWS} rows). Skipping the Excel workbook, choose a Columnar Copy format for this range.")
+            elif self.settings['write_excel']:
+                saved = self.save_output_excel(result_df, full_export_path) 
+            if self.settings['columnar_format'] != "None":
+                saved = self.save_columnar_outputs(result_df, full_export_path, self.settings['columnar_format']) and saved
+            self.run_stats.counts['minutes'] = len(result_df)
+            if not saved:
+                self.status_log_safe("Processing failed: an output could not be saved.")
+                return False
+            self.status_log_safe("Processing finished successfully.")
+            completed = True
+            return True
 
+        except AvailabilityGapError as e:
+            self.status_log_safe(f"Processing aborted: {e} (gap policy 'error').")
+            self._schedule(self._show_messagebox_safe, "error", "Availability Gap", f"{e}\nChoose the 'fallback' or 'ffill' gap policy to process this month.")
+            return False
         except Exception as e:
-            error_message = f"Critical error in processing thread: {e}\n{traceback.format_exc()}"
-            self.root.after(0, self.status_log_safe, error_message)
-            self.root.after(0, self._show_messagebox_safe, "error", "Processing Error", f"An critical unexpected error occurred: {e}")
+            error_message = f"Critical error during processing: {e}\n{traceback.format_exc()}"
+            self.status_log_safe(error_message)
+            self._schedule(self._show_messagebox_safe, "error", "Processing Error", f"An critical unexpected error occurred: {e}")
+            return False
         finally:
-            self.root.after(0, lambda: self.process_button.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.progress_bar.config(value=0)) 
-            self.root.after(0, self.status_log_safe, "Background processing thread has ended.")
+            self._write_run_report(completed)
+            self._schedule(self._processing_finished_safe)
+
+    def _write_run_report(self, completed):
+        """Log where the run spent its time, write the JSON run report next to the output and add the run to the metrics file."""
+        self.status_log_safe(f"Run stats: {self.run_stats.summary()}")
+        report = self.run_stats.report(step="step1", status="ok" if completed else "failed", input=self.settings['file_path'],
+                                       month=self.settings['month'], outputs=list(self.output_paths),
+                                       instruction_issues=self.run_instruction_issues['Issue'].value_counts().to_dict() if self.run_instruction_issues is not None else {},
+                                       settings={name: self.settings[name] for name in ('start_load_type', 'custom_load', 'engine', 'gap_policy', 'writer',
+                                                                                        'input_reader', 'columnar_format', 'incremental', 'use_input_cache',
+                                                                                        'step_seconds')})
+        self.run_report_path = None
+        if self.settings['run_report'] and os.path.isdir(self.settings['export_dir']):
+            try:
+                self.run_report_path = write_run_report(report, os.path.join(self.settings['export_dir'], self.output_file_name))
+                self.status_log_safe(f"Run report saved: {self.run_report_path}")
+            except OSError as e:
+                self.status_log_safe(f"Could not write the run report: {e}")
+        if self.metrics_file:
+            try:
+                update_metrics_file(self.metrics_file, report)
+            except (OSError, ValueError) as e:
+                self.status_log_safe(f"Could not update the metrics file {self.metrics_file}: {e}")
+
+    def open_file(self, file_path):
+        pass
+
+    def status_log(self, message):
+        self.logger.info(message)
+
+
+class LoadProcessorApp(LoadProcessor):
+    def __init__(self, root):
+        self.root = root
+        super().__init__()
+        self.root.title("FADL Load Processor - New Logic") 
+        self.root.geometry("875x540") 
+        self.root.minsize(600, 540)
+
+        self.file_path_var = tk.StringVar(value=self.settings['file_path'])
+        self.month_var = tk.StringVar(value=self.settings['month'])
+        self.start_load_type_var = tk.StringVar(value=self.settings['start_load_type']) 
+        self.custom_load_var = tk.DoubleVar(value=self.settings['custom_load'])
+        self.export_dir_var = tk.StringVar(value=self.settings['export_dir'])
+        self.engine_var = tk.StringVar(value=self.settings['engine'])
+        self.gap_policy_var = tk.StringVar(value=self.settings['gap_policy'])
+        self.writer_var = tk.StringVar(value=self.settings['writer'])
+        self.write_excel_var = tk.BooleanVar(value=self.settings['write_excel'])
+        self.columnar_format_var = tk.StringVar(value=self.settings['columnar_format'])
+        self.use_input_cache_var = tk.BooleanVar(value=self.settings['use_input_cache'])
+        self.input_reader_var = tk.StringVar(value=self.settings['input_reader'])
+        self.incremental_var = tk.BooleanVar(value=self.settings['incremental'])
+        self.run_report_var = tk.BooleanVar(value=self.settings['run_report'])
+        self.run_stats_sheet_var = tk.BooleanVar(value=self.settings['run_stats_sheet'])
+        self.trace_memory_var = tk.BooleanVar(value=self.settings['trace_memory'])
+        self.step_seconds_var = tk.IntVar(value=self.settings['step_seconds'])
+
+        main_frame = ttk.Frame(root, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        root.columnconfigure(0, weight=1)
+        root.rowconfigure(0, weight=1)
+
+        file_frame = ttk.LabelFrame(main_frame, text="Input File", padding="10")
+        file_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), padx=5, pady=5)
+        file_frame.columnconfigure(1, weight=1)
+        ttk.Label(file_frame, text="Excel File:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(file_frame, textvariable=self.file_path_var, width=60).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        ttk.Button(file_frame, text="Browse...", command=self.browse_file).grid(row=0, column=2, sticky=tk.E, padx=5, pady=5)
+        ttk.Checkbutton(file_frame, text="Reuse parsed data for unchanged files (input cache)", variable=self.use_input_cache_var).grid(row=1, column=1, sticky=tk.W, padx=5)
+        ttk.Label(file_frame, text="Excel Reader:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        input_reader_combo = ttk.Combobox(file_frame, textvariable=self.input_reader_var, state="readonly", width=15)
+        input_reader_combo['values'] = list(EXCEL_READERS)
+        input_reader_combo.grid(row=2, column=1, sticky=tk.W, padx=5, pady=5)
+
+        config_frame = ttk.LabelFrame(main_frame, text="Processing Configuration", padding="10")
+        config_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        config_frame.columnconfigure(1, weight=1)
+        ttk.Label(config_frame, text="Month to Process:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.month_combo = ttk.Combobox(config_frame, textvariable=self.month_var, state="readonly", width=15)
+        self.month_combo.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        self.month_combo['values'] = ["Select a file first"]
+        ttk.Label(config_frame, text="Starting Load Type:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        final_avail_radio = ttk.Radiobutton(config_frame, 
+                                            text="Use Final Availability (hourly from Col D)", 
+                                            variable=self.start_load_type_var, 
+                                            value="FinalAvailabilityHourly", 
+                                            command=self.toggle_custom_load_entry)
+        final_avail_radio.grid(row=1, column=1, sticky=tk.W, padx=5, pady=2)
+        custom_load_frame = ttk.Frame(config_frame) 
+        custom_load_frame.grid(row=2, column=1, sticky=(tk.W, tk.E), padx=0, pady=0) 
+        custom_radio = ttk.Radiobutton(custom_load_frame, 
+                                       text="Custom Load:", 
+                                       variable=self.start_load_type_var, 
+                                       value="Custom", 
+                                       command=self.toggle_custom_load_entry)
+        custom_radio.grid(row=0, column=0, sticky=tk.W, pady=2)
+        self.custom_load_entry = ttk.Entry(custom_load_frame, 
+                                           textvariable=self.custom_load_var, 
+                                           width=10, 
+                                           state=tk.DISABLED) 
+        self.custom_load_entry.grid(row=0, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(config_frame, text="Calculation Engine:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
+        engine_combo = ttk.Combobox(config_frame, textvariable=self.engine_var, state="readonly", width=15)
+        engine_combo['values'] = ["Segments", "Minute Loop"]
+        engine_combo.grid(row=3, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        ttk.Label(config_frame, text="Availability Gaps:").grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        gap_policy_combo = ttk.Combobox(config_frame, textvariable=self.gap_policy_var, state="readonly", width=15)
+        gap_policy_combo['values'] = list(AvailabilityIndex.GAP_POLICIES)
+        gap_policy_combo.grid(row=4, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        ttk.Checkbutton(config_frame, text="Recompute only from the first changed instruction", variable=self.incremental_var).grid(row=5, column=1, sticky=tk.W, padx=5)
+        ttk.Label(config_frame, text="Time Step (s):").grid(row=6, column=0, sticky=tk.W, padx=5, pady=5)
+        step_seconds_combo = ttk.Combobox(config_frame, textvariable=self.step_seconds_var, state="readonly", width=15)
+        step_seconds_combo['values'] = list(STEP_SECONDS_CHOICES)
+        step_seconds_combo.grid(row=6, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        
+        export_frame = ttk.LabelFrame(main_frame, text="Output", padding="10")
+        export_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5) 
+        export_frame.columnconfigure(1, weight=1)
+        ttk.Label(export_frame, text="Export Folder:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(export_frame, textvariable=self.export_dir_var, width=40).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        ttk.Button(export_frame, text="Browse...", command=self.browse_export_dir).grid(row=0, column=2, sticky=tk.E, padx=5, pady=5)
+        ttk.Label(export_frame, text="Excel Writer:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        writer_combo = ttk.Combobox(export_frame, textvariable=self.writer_var, state="readonly", width=15)
+        writer_combo['values'] = ["Fast", "Standard"]
+        writer_combo.grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Checkbutton(export_frame, text="Write Excel workbook", variable=self.write_excel_var).grid(row=1, column=2, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(export_frame, text="Columnar Copy:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        columnar_combo = ttk.Combobox(export_frame, textvariable=self.columnar_format_var, state="readonly", width=15)
+        columnar_combo['values'] = ["None"] + list(COLUMNAR_FORMATS)
+        columnar_combo.grid(row=2, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Checkbutton(export_frame, text="Write a run report (JSON)", variable=self.run_report_var).grid(row=3, column=1, sticky=tk.W, padx=5)
+        ttk.Checkbutton(export_frame, text="Add a Run Stats sheet", variable=self.run_stats_sheet_var).grid(row=3, column=2, sticky=tk.W, padx=5)
+        ttk.Checkbutton(export_frame, text="Trace memory per stage (slower)", variable=self.trace_memory_var).grid(row=4, column=1, sticky=tk.W, padx=5)
+
+        run_frame = ttk.Frame(main_frame, padding="10")
+        run_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), padx=5, pady=5)
+        run_frame.columnconfigure(0, weight=1) 
+        self.process_button = ttk.Button(run_frame, text="Start Processing", command=self.start_processing_thread, width=20)
+        self.process_button.grid(row=0, column=1, sticky=tk.E, padx=5, pady=5)
+        self.progress_bar = ttk.Progressbar(run_frame, orient=tk.HORIZONTAL, mode='determinate')
+        self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=5, pady=5)
+        
+        log_frame = ttk.LabelFrame(main_frame, text="Status Log", padding="10")
+        log_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        log_frame.columnconfigure(0, weight=1)
+        log_frame.rowconfigure(0, weight=1) 
+        self.log_text = tk.Text(log_frame, height=10, wrap=tk.WORD, state=tk.DISABLED)
+        log_scroll = ttk.Scrollbar(log_frame, orient=tk.VERTICAL, command=self.log_text.yview)
+        self.log_text['yscrollcommand'] = log_scroll.set
+        self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        log_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self._setup_logging()
+        
+        self.status_log("Application started. Please select an Excel file.")
+        self.toggle_custom_load_entry() 
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger("fadl.step1")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.logger.handlers.clear()
+        self.log_sink = TkLogSink(self.root, self.log_text)
+        self.log_sink.setFormatter(logging.Formatter('%(asctime)s - %(message)s', '%Y-%m-%d %H:%M:%S'))
+        self.logger.addHandler(self.log_sink)
+        try:
+            os.makedirs(os.path.dirname(LOG_FILE_PATH), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(LOG_FILE_PATH, maxBytes=5 * 1024 * 1024, backupCount=3, encoding='utf-8')
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s [%(threadName)s] %(message)s'))
+            self.logger.addHandler(file_handler)
+        except OSError as e:
+            self.logger.warning(f"Could not open log file {LOG_FILE_PATH}: {e}")
+        self.log_sink.start()
+
+    def browse_file(self):
+        file_path = filedialog.askopenfilename(title="Select Excel File", filetypes=(("Excel files", "*.xlsx *.xls"), ("CSV/Parquet tables", "*.csv *.parquet"), ("All files", "*.*")))
+        if file_path:
+            self.file_path_var.set(file_path)
+            self.status_log(f"Selected input file: {file_path}")
+            self.df_dispatch, self.df_availability, self.availability_index = None, None, None
+            self.instruction_table, self.instruction_issues = None, None
+            self.process_button.config(state=tk.DISABLED) 
+            self._sync_settings(('file_path', 'use_input_cache', 'input_reader', 'gap_policy', 'trace_memory'))
+            self.run_stats = self.input_stats = RunStats(trace_memory=self.settings['trace_memory'])
+            _, _, available_months = self.read_excel_data(file_path) 
+            if self.df_dispatch is not None and available_months: 
+                self._prepare_instruction_table()
+                self.month_combo['values'] = available_months + ([ALL_MONTHS_LABEL] if len(available_months) > 1 else [])
+                self.month_var.set(available_months[0] if available_months else "")
+                self.status_log(f"Available months populated: {available_months if available_months else 'None'}")
+                if self.df_availability is not None : 
+                    self.process_button.config(state=tk.NORMAL) 
+                    self._prepare_hourly_availability_lookup()
+            else:
+                self.month_combo['values'] = ["Error reading/parsing file"]
+                self.month_var.set("")
+                self.status_log("Could not populate months. Check file/sheet integrity and Dispatch Col A for dates.")
+        else: self.status_log("File selection cancelled.")
+
+    def browse_export_dir(self):
+        dir_path = filedialog.askdirectory(title="Select Export Directory")
+        if dir_path: self.export_dir_var.set(dir_path); self.status_log(f"Selected export directory: {dir_path}")
+        else: self.status_log("Export directory selection cancelled.")
+
+    def toggle_custom_load_entry(self):
+        self.custom_load_entry.config(state=tk.NORMAL if self.start_load_type_var.get() == "Custom" else tk.DISABLED)
+        if self.start_load_type_var.get() != "Custom": self.custom_load_var.set(0.0)
+        self.status_log(f"Start load type set to: {self.start_load_type_var.get()}")
+
+    def update_progress_safe(self, value):
+        self.progress_bar['value'] = value
+
+    def _processing_finished_safe(self):
+        self.process_button.config(state=tk.NORMAL)
+        self.progress_bar.config(value=0)
+
+    def _show_messagebox_safe(self, msg_type, title, message):
+        if msg_type == "info": messagebox.showinfo(title, message)
+        elif msg_type == "warning": messagebox.showwarning(title, message)
+        elif msg_type == "error": messagebox.showerror(title, message)
+
+    def _schedule(self, func, *args):
+        self.root.after(0, func, *args)
+
+    def _sync_settings(self, names=PROCESSING_DEFAULTS):
+        """Copy the Tk variables into settings. Called on the Tk thread, the processing thread only reads settings."""
+        for name in names:
+            self.settings[name] = getattr(self, f"{name}_var").get()
 
     def start_processing_thread(self):
         self.status_log("Start processing button clicked. Validating inputs...")
@@ -755,14 +2323,27 @@ class LoadProcessorApp:
             self.status_log(f"Processing aborted: Export path '{export_dir_path}' is not a directory.")
             return
 
+        if not self.write_excel_var.get() and self.columnar_format_var.get() == "None" and self.step_seconds_var.get() == 60:
+            messagebox.showerror("Input Error", "Select at least one output: the Excel workbook or a columnar copy.")
+            self.status_log("Processing aborted: No output selected.")
+            return
+
+        self._sync_settings()
         self.status_log("Inputs validated. Starting background processing task...")
         self.process_button.config(state=tk.DISABLED)
         self.progress_bar['value'] = 0
         self.root.update_idletasks() 
 
-        processing_thread = threading.Thread(target=self._processing_logic, daemon=True)
+        processing_thread = threading.Thread(target=self._processing_thread, daemon=True)
         processing_thread.start()
 
+    def _processing_thread(self):
+        self.status_log_safe("Background processing thread started.")
+        try:
+            self._processing_logic()
+        finally:
+            self.status_log_safe("Background processing thread has ended.")
+
     def open_file(self, file_path):
         """Open the Excel file with the default application"""
         try:
@@ -780,13 +2361,253 @@ class LoadProcessorApp:
             self.status_log_safe(f"File location: {file_path}")
 
     def status_log(self, message):
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, f"{datetime.datetime.now().strftime('%d.%b.%y %H:%M')} - {message}\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
+        self.logger.info(message)
+        self.log_sink.flush_to_widget()
         print(message)
 
+
+BATCH_INPUT_EXTENSIONS = ('.xlsx', '.xls')
+BATCH_REPORT_COLUMNS = ['Workbook', 'Month', 'Start Load', 'Status', 'Outputs', 'Seconds', 'Warnings', 'Message']
+
+
+def batch_jobs_from_folder(folder, month=None, start_load_type="FinalAvailabilityHourly", custom_load=0.0):
+    """
+    One batch job per input workbook in folder. month is a label such as 'May-25', ALL_MONTHS_LABEL,
+    or None for every month of each workbook, each to its own output.
+    """
+    jobs = []
+    for file_name in sorted(os.listdir(folder)):
+        if (os.path.splitext(file_name)[1].lower() in BATCH_INPUT_EXTENSIONS
+                and not file_name.startswith(("~$", os.path.splitext(DEFAULT_OUTPUT_FILE_NAME)[0]))):
+            jobs.append({'file_path': os.path.join(folder, file_name), 'month': month,
+                         'start_load_type': start_load_type, 'custom_load': custom_load})
+    return jobs
+
+
+def batch_jobs_from_manifest(manifest_path):
+    """
+    Batch jobs from a CSV manifest with the columns Workbook, Month and Start Load. Workbook paths
+    are relative to the manifest; a blank Month means every month of the workbook and a blank
+    (or 'Availability') Start Load uses the Final Availability of the first hour.
+    """
+    manifest = pd.read_csv(manifest_path, dtype=str).fillna("")
+    missing_columns = {'Workbook', 'Month', 'Start Load'} - set(manifest.columns)
+    if missing_columns:
+        raise ValueError(f"Batch manifest is missing column(s): {', '.join(sorted(missing_columns))}.")
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    for line_number, row in enumerate(manifest.to_dict('records'), start=2): # Line 1 is the header
+        start_load = row['Start Load'].strip()
+        custom = start_load != "" and start_load.lower() != "availability"
+        custom_load = 0.0
+        if custom:
+            try:
+                custom_load = float(start_load)
+            except ValueError:
+                raise ValueError(f"Batch manifest row {line_number} ({row['Workbook'].strip()}): Start Load '{start_load}' "
+                                 f"is not a number, blank or 'Availability'.") from None
+        jobs.append({'file_path': os.path.join(manifest_dir, row['Workbook'].strip()), 'month': row['Month'].strip() or None,
+                     'start_load_type': "Custom" if custom else "FinalAvailabilityHourly", 'custom_load': custom_load})
+    return jobs
+
+
+class _BatchJobLog(logging.Handler):
+    """Counts the warnings of a batch job and remembers its last error for the run report."""
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.warnings = 0
+        self.last_error = ""
+
+    def emit(self, record):
+        message = record.getMessage()
+        if record.levelno >= logging.ERROR or message.startswith(("Error", "Critical", "Processing aborted")):
+            self.last_error = message.splitlines()[0]
+        elif record.levelno >= logging.WARNING or message.startswith("Warning"):
+            self.warnings += 1
+
+
+def run_batch_job(job):
+    """
+    Process one batch job (see run_batch) in this process and return its report rows.
+    Module level so it can run in a worker process.
+    """
+    logger = logging.getLogger(f"fadl.step1.batch.{job['output_stem']}")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.handlers.clear()
+    file_handler = logging.FileHandler(os.path.join(job['export_dir'], job['output_stem'] + ".log"), mode='w', encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(message)s'))
+    job_log = _BatchJobLog()
+    logger.addHandler(file_handler)
+    logger.addHandler(job_log)
+    start_load_text = f"{job['custom_load']:.2f} MW" if job['start_load_type'] == "Custom" else "Availability"
+    rows = []
+
+    def report(month, ok, outputs, seconds, message=""):
+        rows.append({'Workbook': job['file_path'], 'Month': month, 'Start Load': start_load_text,
+                     'Status': "OK" if ok else "Failed", 'Outputs': "; ".join(outputs), 'Seconds': round(seconds, 2),
+                     'Warnings': job_log.warnings, 'Message': message or ("" if ok else job_log.last_error)})
+
+    started = time.perf_counter()
+    try:
+        processor = LoadProcessor(logger, file_path=job['file_path'], export_dir=job['export_dir'],
+                                  start_load_type=job['start_load_type'], custom_load=job['custom_load'],
+                                  **job.get('settings', {}))
+        processor.metrics_file = job.get('metrics_file', METRICS_FILE_PATH)
+        available_months = processor.load_input()
+        if not available_months:
+            report(job['month'] or "", False, [], time.perf_counter() - started, job_log.last_error or "No months found in 'Dispatch Instructions'.")
+            return rows
+        if job['start_load_type'] == "FinalAvailabilityHourly" and processor.df_availability is None:
+            report(job['month'] or "", False, [], time.perf_counter() - started, "Availability data is required for the Availability start load but was not loaded.")
+            return rows
+        months = [job['month']] if job['month'] else available_months
+        for month in months:
+            month_started = time.perf_counter()
+            if month != ALL_MONTHS_LABEL and month not in available_months:
+                report(month, False, [], 0.0, f"No dispatch instructions for {month} in this workbook (found {', '.join(available_months)}).")
+                continue
+            outputs = processor.process_month(month, f"{job['output_stem']} - {month}.xlsx")
+            report(month, bool(outputs), outputs, time.perf_counter() - month_started)
+    except Exception as e:
+        logger.exception("Batch job failed")
+        report(job['month'] or "", False, [], time.perf_counter() - started, f"{type(e).__name__}: {e}")
+    finally:
+        file_handler.close()
+        logger.handlers.clear()
+    return rows
+
+
+def run_batch(jobs, export_dir, max_workers=None, settings=None, metrics_file=METRICS_FILE_PATH):
+    """
+    Run batch jobs ({'file_path', 'month', 'start_load_type', 'custom_load'}, see
+    batch_jobs_from_folder) in a process pool and write a run report. Every output gets a unique
+    name, 'FADL Calculation - <workbook> - <month>.xlsx', with a log file next to it.
+    Returns the report as a DataFrame and the report path.
+    """
+    batch_logger = logging.getLogger("fadl.step1.batch")
+    os.makedirs(export_dir, exist_ok=True)
+    used_stems = set()
+    for job in jobs:
+        base_stem = f"{os.path.splitext(DEFAULT_OUTPUT_FILE_NAME)[0]} - {os.path.splitext(os.path.basename(job['file_path']))[0]}"
+        output_stem, copy_number = base_stem, 1
+        while output_stem.lower() in used_stems:
+            copy_number += 1
+            output_stem = f"{base_stem} ({copy_number})"
+        used_stems.add(output_stem.lower())
+        job.update(output_stem=output_stem, export_dir=export_dir, settings=dict(settings or {}), metrics_file=metrics_file)
+
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    batch_logger.info(f"Batch of {len(jobs)} workbook(s) with {workers} worker process(es), outputs in {export_dir}")
+    batch_started = time.perf_counter()
+    rows = []
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_batch_job, job): job for job in jobs}
+            for future in concurrent.futures.as_completed(futures):
+                job_rows = future.result()
+                rows.extend(job_rows)
+                batch_logger.info(f"Finished {os.path.basename(futures[future]['file_path'])}: " + ", ".join(f"{row['Month']} {row['Status']}" for row in job_rows))
+    else:
+        for job in jobs:
+            job_rows = run_batch_job(job)
+            rows.extend(job_rows)
+            batch_logger.info(f"Finished {os.path.basename(job['file_path'])}: " + ", ".join(f"{row['Month']} {row['Status']}" for row in job_rows))
+
+    report_df = pd.DataFrame(rows, columns=BATCH_REPORT_COLUMNS).sort_values(['Workbook', 'Month'], kind='stable', ignore_index=True)
+    report_path = os.path.join(export_dir, f"FADL Batch Report {datetime.datetime.now():%Y-%m-%d %H%M%S}.csv")
+    report_df.to_csv(report_path, index=False)
+    failed = int((report_df['Status'] != "OK").sum())
+    batch_logger.info(f"Batch finished in {time.perf_counter() - batch_started:.1f}s: {len(report_df) - failed} OK, {failed} failed. Report: {report_path}")
+    return report_df, report_path
+
+
+def main(argv=None):
+    """
+    Command-line runs, e.g. from cron. Processes one input (--input) or a folder or manifest of
+    inputs (--batch) and returns the exit code: 0 when every run wrote its outputs, 1 otherwise.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="FADL Load Processor. Without arguments the window opens.")
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument("--input", metavar="WORKBOOK",
+                        help="Input workbook with 'Dispatch Instructions' and 'Availability' sheets, or its CSV/Parquet 'Dispatch Instructions' table.")
+    inputs.add_argument("--batch", metavar="FOLDER_OR_MANIFEST",
+                        help="Folder of input workbooks, or a CSV manifest with Workbook, Month and Start Load columns.")
+    parser.add_argument("--export-dir", required=True, help="Folder for the outputs (and the batch report). Created if missing.")
+    parser.add_argument("--month", help=f"Month to process, e.g. May-25, or '{ALL_MONTHS_LABEL}'. Default: the latest month for --input, "
+                                         "every month (one output each) for a --batch folder. Not used with a manifest.")
+    parser.add_argument("--custom-load", type=float, help="Start from this load (MW) instead of the Final Availability of the first hour. Not used with a manifest.")
+    parser.add_argument("--output-name", default=DEFAULT_OUTPUT_FILE_NAME, help=f"Workbook name for --input. Default: {DEFAULT_OUTPUT_FILE_NAME}")
+    parser.add_argument("--workers", type=int, help="Worker processes for --batch. Default: one per CPU.")
+    parser.add_argument("--engine", choices=["Segments", "Minute Loop"], default=PROCESSING_DEFAULTS['engine'])
+    parser.add_argument("--gap-policy", choices=list(AvailabilityIndex.GAP_POLICIES), default=PROCESSING_DEFAULTS['gap_policy'])
+    parser.add_argument("--reader", choices=list(EXCEL_READERS), default=PROCESSING_DEFAULTS['input_reader'], help="Excel reader for the input workbook.")
+    parser.add_argument("--writer", choices=["Fast", "Standard"], default=PROCESSING_DEFAULTS['writer'], help="Excel writer for the output workbook.")
+    parser.add_argument("--columnar-format", choices=["None"] + list(COLUMNAR_FORMATS), default=PROCESSING_DEFAULTS['columnar_format'],
+                        help="Also write the result in this format.")
+    parser.add_argument("--step-seconds", type=int, choices=STEP_SECONDS_CHOICES, default=PROCESSING_DEFAULTS['step_seconds'],
+                        help="Time step. Below 60 the samples are streamed to a columnar file (--columnar-format, default Parquet) "
+                             "and the Excel output holds only the half-hourly summary.")
+    parser.add_argument("--no-excel", action="store_true", help="Skip the Excel workbook (needs --columnar-format, or --step-seconds below 60).")
+    parser.add_argument("--no-input-cache", action="store_true", help="Always read the input again instead of reusing parsed data.")
+    parser.add_argument("--no-incremental", action="store_true", help="Always recompute the whole month.")
+    parser.add_argument("--no-run-report", action="store_true", help="Skip the '<output> - Run Stats.json' report of stage times and memory.")
+    parser.add_argument("--run-stats-sheet", action="store_true", help="Add a 'Run Stats' sheet to the workbook.")
+    parser.add_argument("--trace-memory", action="store_true", help="Report the memory each stage allocates (tracemalloc, several times slower).")
+    parser.add_argument("--metrics-file", default=METRICS_FILE_PATH, help=f"Cumulative metrics file (Prometheus text format), '' to skip. Default: {METRICS_FILE_PATH}")
+    args = parser.parse_args(argv)
+    if args.no_excel and args.columnar_format == "None" and args.step_seconds == 60:
+        parser.error("--no-excel needs a --columnar-format, otherwise nothing is written.")
+    if args.custom_load is not None and args.custom_load < 0:
+        parser.error("--custom-load cannot be negative.")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1.")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    settings = {'engine': args.engine, 'gap_policy': args.gap_policy, 'input_reader': args.reader, 'writer': args.writer,
+                'columnar_format': args.columnar_format, 'write_excel': not args.no_excel,
+                'use_input_cache': not args.no_input_cache, 'incremental': not args.no_incremental,
+                'run_report': not args.no_run_report, 'run_stats_sheet': args.run_stats_sheet, 'trace_memory': args.trace_memory,
+                'step_seconds': args.step_seconds}
+    start_load_type = "Custom" if args.custom_load is not None else "FinalAvailabilityHourly"
+    os.makedirs(args.export_dir, exist_ok=True)
+
+    if args.batch:
+        if os.path.isdir(args.batch):
+            batch_jobs = batch_jobs_from_folder(args.batch, args.month, start_load_type, args.custom_load or 0.0)
+        else:
+            try:
+                batch_jobs = batch_jobs_from_manifest(args.batch)
+            except (OSError, ValueError) as e:
+                logging.error(f"Cannot read batch manifest {args.batch}: {e}")
+                return 1
+        batch_report, _ = run_batch(batch_jobs, args.export_dir, args.workers, settings, args.metrics_file or None)
+        return 0 if (batch_report['Status'] == "OK").all() else 1
+
+    logger = logging.getLogger("fadl.step1")
+    processor = LoadProcessor(logger, file_path=args.input, export_dir=args.export_dir, start_load_type=start_load_type,
+                              custom_load=args.custom_load or 0.0, **settings)
+    processor.metrics_file = args.metrics_file or None
+    available_months = processor.load_input()
+    if not available_months:
+        logger.error("No months to process in the input.")
+        return 1
+    month = args.month or available_months[-1]
+    if month != ALL_MONTHS_LABEL and month not in available_months:
+        logger.error(f"No dispatch instructions for {month} in the input (found {', '.join(available_months)}).")
+        return 1
+    if start_load_type == "FinalAvailabilityHourly" and processor.df_availability is None:
+        logger.error("Availability data is required for the Availability start load but was not loaded.")
+        return 1
+    outputs = processor.process_month(month, args.output_name)
+    for path in outputs:
+        logger.info(f"Output: {path}")
+    return 0 if outputs else 1
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
     root = tk.Tk()
     app = LoadProcessorApp(root)
     root.mainloop()
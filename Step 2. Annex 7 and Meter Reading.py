@@ -1,455 +1,609 @@
 import os
+import sys
 import glob
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk # Added ttk for progress bar
+import shutil
+try:
+    import tkinter as tk # Only the window needs Tk, command-line runs work without it
+    from tkinter import filedialog, messagebox, ttk # Added ttk for progress bar
+except ImportError:
+    tk = filedialog = messagebox = ttk = None
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import re
+import json
+import hashlib
+import concurrent.futures
+import queue
+import threading
+import logging
+import contextlib
 from pathlib import Path
 import PyPDF2
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
+try:
+    import python_calamine # Optional, Rust-backed xlsx reader for Step 1's workbook
+except ImportError:
+    python_calamine = None
+from fadl_metrics import (METRICS_FILE_PATH, RUN_STATS_COLUMNS, RunStats, write_run_report,
+                          update_metrics_file) # Shared with Step 1, next to this script
+
+# Columnar copies of FADL_Calculation that Step 1 can write next to "FADL Calculation.xlsx"
+COLUMNAR_EXTENSIONS = ('.parquet', '.feather', '.csv')
+
+# Part of the window's progress bar each conversion stage fills, (from %, to %)
+PROGRESS_STAGES = {'LP parse': (0, 40), 'lookup prep': (40, 50), 'PDF extract': (50, 70), 'PDF parse': (70, 80), 'write': (80, 100)}
+
+
+PDF_TEXT_CACHE_DIR = os.path.join(os.path.expanduser("~"), "FADL Cache", "Step 2 PDF Text")
+PDF_TEXT_CACHE_VERSION = 2 # Bump when extract_pdf_pages changes what it produces
+PDF_PAGES_PER_TASK = 8 # Fewest pages a worker process extracts per task (each task opens the PDF again)
+PDF_TASKS_PER_WORKER = 4 # Larger PDFs get bigger tasks, enough of them to keep the workers busy and progress moving
+PDF_PARALLEL_MIN_PAGES = 24 # Shorter PDFs are extracted in this process, starting workers would cost more
+
+
+def iter_pdf_pages(pdf_path, page_numbers):
+    """Yield (page number, text) of the given 0-based pages of pdf_path, reading the file once."""
+    with open(pdf_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        for number in page_numbers:
+            yield number, pdf_reader.pages[number].extract_text()
+
+
+def extract_pdf_pages(pdf_path, page_numbers):
+    """[(page number, text)] of the given pages, see iter_pdf_pages. Module level so worker processes can run it."""
+    return list(iter_pdf_pages(pdf_path, page_numbers))
+
+
+class PdfTextCache:
+    """
+    On-disk cache of extracted PDF page text: one folder per PDF, named by the SHA-256 of its
+    content (a renamed or copied invoice still hits), with the page count and a text file for
+    every page extracted so far. Pages are stored and read one at a time, so neither needs the
+    whole PDF's text in memory. Least recently used folders are evicted once the cache grows
+    beyond max_bytes.
+    """
+    def __init__(self, cache_dir=PDF_TEXT_CACHE_DIR, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key_for(self, pdf_path):
+        content_hash = hashlib.sha256(f"{PDF_TEXT_CACHE_VERSION}|{PyPDF2.__version__}|".encode('utf-8'))
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _write(self, path, text):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8', errors='surrogatepass', newline='') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+    def load(self, key):
+        """(page count, set of cached page numbers) of the PDF with this key, (None, set()) on a miss."""
+        meta_path = os.path.join(self._entry_dir(key), "meta.json")
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                page_count = json.load(f)['page_count']
+            os.utime(meta_path) # Mark as recently used for eviction
+            return page_count, {int(name[:-4]) for name in os.listdir(self._entry_dir(key)) if name.endswith('.txt')}
+        except FileNotFoundError:
+            return None, set()
+        except Exception:
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True) # Unreadable entry, extract the pages again
+            return None, set()
+
+    def load_page(self, key, number):
+        """Text of a cached page, None when it is no longer there."""
+        try:
+            with open(os.path.join(self._entry_dir(key), f"{number}.txt"), encoding='utf-8', errors='surrogatepass', newline='') as f:
+                return f.read()
+        except OSError:
+            return None
 
-class FADLToExcelApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Convert and Match FADL with Meter Reading")
-        self.root.geometry("850x750") # Increased height for status/progress
-        self.root.resizable(False, False)
-        self.root.configure(bg='#f0f0f0')
-
-        # File/folder path variables
-        self.pdf_path = tk.StringVar()
-        self.lp_folder_path = tk.StringVar()
-        self.uch_excel_path = tk.StringVar()
-        self.save_path = tk.StringVar()
-
-        self.setup_gui()
-
-    def setup_gui(self):
-        main_frame = tk.Frame(self.root, bg='#f0f0f0', padx=20, pady=20)
-        main_frame.pack(fill='both', expand=True)
-
-        # Title
-        title_label = tk.Label(main_frame, text="FADL to Excel Enhanced Tool", 
-                              font=('Arial', 16, 'bold'), bg='#f0f0f0', fg='#333')
-        title_label.pack(pady=(0, 20))
-
-        # PDF Selection Frame
-        pdf_frame = tk.Frame(main_frame, bg='#f0f0f0')
-        pdf_frame.pack(fill='x', pady=(0, 10))
-        tk.Label(pdf_frame, text="Select PDF File (for Annex 7):", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(anchor='w')
-        pdf_path_frame = tk.Frame(pdf_frame, bg='#f0f0f0')
-        pdf_path_frame.pack(fill='x', pady=(5,0))
-        tk.Entry(pdf_path_frame, textvariable=self.pdf_path, font=('Arial', 10), width=50).pack(side='left', fill='x', expand=True, padx=(0,10))
-        tk.Button(pdf_path_frame, text="Browse", command=self.browse_pdf, bg='#4CAF50', fg='white', font=('Arial', 10), padx=10, pady=2).pack(side='right')
-
-        # LP folder selection
-        lp_frame = tk.Frame(main_frame, bg='#f0f0f0')
-        lp_frame.pack(fill='x', pady=(0, 10))
-        tk.Label(lp_frame, text="Select Folder with *.lp Files (for Meter Readings):", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(anchor='w')
-        lp_path_frame = tk.Frame(lp_frame, bg='#f0f0f0')
-        lp_path_frame.pack(fill='x', pady=(5,0))
-        tk.Entry(lp_path_frame, textvariable=self.lp_folder_path, font=('Arial', 10), width=50).pack(side='left', fill='x', expand=True, padx=(0,10))
-        tk.Button(lp_path_frame, text="Browse", command=self.browse_lp_folder, bg='#4CAF50', fg='white', font=('Arial', 10), padx=10, pady=2).pack(side='right')
-
-        # UCH Excel file selection
-        uch_frame = tk.Frame(main_frame, bg='#f0f0f0')
-        uch_frame.pack(fill='x', pady=(0, 10))
-        tk.Label(uch_frame, text="Select Excel File with FADL_Calculation (for UCH Demand):", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(anchor='w')
-        uch_path_frame = tk.Frame(uch_frame, bg='#f0f0f0')
-        uch_path_frame.pack(fill='x', pady=(5,0))
-        tk.Entry(uch_path_frame, textvariable=self.uch_excel_path, font=('Arial', 10), width=50).pack(side='left', fill='x', expand=True, padx=(0,10))
-        tk.Button(uch_path_frame, text="Browse", command=self.browse_uch_excel, bg='#4CAF50', fg='white', font=('Arial', 10), padx=10, pady=2).pack(side='right')
-
-        # Excel save location
-        excel_frame = tk.Frame(main_frame, bg='#f0f0f0')
-        excel_frame.pack(fill='x', pady=(0, 15))
-        tk.Label(excel_frame, text="Save Excel File As:", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(anchor='w')
-        excel_path_frame = tk.Frame(excel_frame, bg='#f0f0f0')
-        excel_path_frame.pack(fill='x', pady=(5,0))
-        tk.Entry(excel_path_frame, textvariable=self.save_path, font=('Arial', 10), width=50).pack(side='left', fill='x', expand=True, padx=(0,10))
-        tk.Button(excel_path_frame, text="Browse", command=self.browse_save, bg='#2196F3', fg='white', font=('Arial', 10), padx=10, pady=2).pack(side='right')
-        
-        # Convert button
-        tk.Button(main_frame, text="Convert to Excel", command=self.convert, width=20, bg='#FF9800', fg='white', font=('Arial', 12, 'bold'), padx=20, pady=10).pack(pady=20)
+    def store_page_count(self, key, page_count):
+        """Start the entry of a PDF and evict older entries to make room for its pages."""
+        os.makedirs(self._entry_dir(key), exist_ok=True)
+        self._write(os.path.join(self._entry_dir(key), "meta.json"), json.dumps({'page_count': page_count}))
+        self._evict(keep=self._entry_dir(key))
+
+    def store_page(self, key, number, text):
+        self._write(os.path.join(self._entry_dir(key), f"{number}.txt"), text)
+
+    def _evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path):
+                files = [os.path.join(path, file_name) for file_name in os.listdir(path)]
+                meta_path = os.path.join(path, "meta.json")
+                used = os.path.getmtime(meta_path) if os.path.exists(meta_path) else os.path.getmtime(path)
+                entries.append((used, sum(os.path.getsize(file_path) for file_path in files), path))
+            else: # A file left by an earlier cache version
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+        entries.sort(reverse=True)
+        total_bytes = 0
+        for _, size, path in entries:
+            total_bytes += size
+            if total_bytes > self.max_bytes and path != keep:
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+
+
+UCH_EXCEL_ENGINE = "calamine" if python_calamine is not None else None # pandas Excel engine for Step 1's workbook
+UCH_SUMMARY_COLUMNS = ['Half Hourly Date', 'LPM (30 Min Sum)'] # Header of Step 1's half-hourly summary sheet
+
+
+def half_hour_demand(timestamps, demand):
+    """
+    The UCH demand lookup: demand as float64 indexed by timestamp (to the minute), keeping the :00
+    and :30 rows only, the last one of a repeated timestamp.
+    """
+    timestamps = pd.DatetimeIndex(pd.to_datetime(timestamps, errors='coerce')).floor('min')
+    values = pd.to_numeric(demand, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    half_hours = timestamps.notna() & (timestamps.minute % 30 == 0)
+    uch_demand = pd.Series(values[half_hours], index=timestamps[half_hours], name='Demand Calculated by UCH')
+    return uch_demand[~uch_demand.index.duplicated(keep='last')]
+
+
+def uch_demand_at(interval_ends, uch_demand):
+    """The UCH demand at each of interval_ends, in one reindex; NA where the lookup has no such half-hour."""
+    found = interval_ends.isin(uch_demand.index).to_numpy()
+    values = uch_demand.reindex(interval_ends).to_numpy().astype(object)
+    values[~found] = pd.NA
+    return pd.Series(values, index=interval_ends.index).infer_objects() # Typed like a column built from the rows
+
+
+ANNEX7_COLUMNS = ['Date', 'Time From', 'Time To', 'WAPDA Demand MW', 'Level Achieved MW', 'Meter Reading Sum',
+                  'Demand Calculated by UCH', 'Tolerance MW', 'Non-Compliance MWh', 'Rate Rs./kWh', 'Amount Rs.']
+ANNEX7_DEFAULT_RATE = 6.0534 # Rs./kWh, for rows printed without their rate
+ANNEX7_DATE_PATTERN = re.compile(r'(\d{2}-\d{2}-\d{4})')
+# Time From, optional Time To, WAPDA Demand, Level Achieved, Tolerance, Non-Compliance, Amount (may have commas), Rate
+ANNEX7_ROW_PATTERN = re.compile(r'(\d{1,2}:\d{2})\s+(?:(\d{1,2}:\d{2})\s+)?(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+([0-9,]+\.\d+)\s*(\d+\.\d+)')
+ANNEX7_TIME_PATTERN = re.compile(r'\d{1,2}:\d{2}')
+ANNEX7_TEXT_LINE_PATTERN = re.compile(r'[A-Za-z]') # Matched at the start of a line: headings and notes, never split rows
+
+
+class Annex7Tokenizer:
+    """
+    Reads Annex 7 text lines into rows in one pass. A date (dd-mm-yyyy) anywhere in a line
+    applies to the rest of it and the lines after it. With a date, a line is
+    - a 'row' when ANNEX7_ROW_PATTERN matches ('row without Time To' when it has no Time To),
+    - else a 'split' row when its first whitespace-separated column is a time, the second
+      optionally one, followed by WAPDA Demand, Level Achieved, Tolerance, Non-Compliance and
+      Rate and Amount (or Amount alone, with the default rate).
+    Any line with a time and 5 numbers is also kept as a 'loose' row until a row or split row
+    turns up; loose_rows gives them when none ever does, all with the last date read (or none).
+
+    rows yields (date, time from, time to or "", (WAPDA demand, level achieved, tolerance,
+    non-compliance, rate, amount)). matches counts the lines of each kind.
+    """
+    def __init__(self):
+        self.current_date = None
+        self.matches = {'lines': 0, 'date': 0, 'row': 0, 'row without Time To': 0, 'split': 0, 'loose': 0, 'unmatched': 0}
+        self.loose = [] # (time from, time to, numbers) of the loose rows, None once another row was found
+
+    def rows(self, lines):
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            self.matches['lines'] += 1
+            if self.loose is not None:
+                self._collect_loose(line)
+            date_match = ANNEX7_DATE_PATTERN.search(line)
+            if date_match:
+                self.current_date = date_match.group(1)
+                line = line[date_match.end():].strip()
+                self.matches['date'] += 1
+            row = self._row(line) if self.current_date else None
+            if row is None:
+                if not date_match:
+                    self.matches['unmatched'] += 1
+                continue
+            self.loose = None
+            yield row
+
+    def _row(self, line):
+        match = ANNEX7_ROW_PATTERN.search(line)
+        if match:
+            time_from, time_to, wapda_demand, level_achieved, tolerance, non_compliance, amount, rate = match.groups()
+            self.matches['row' if time_to else 'row without Time To'] += 1
+            return (self.current_date, time_from, time_to or "",
+                    (float(wapda_demand), float(level_achieved), float(tolerance), float(non_compliance), float(rate), float(amount.replace(',', ''))))
+        parts = line.split()
+        if len(parts) <= 5 or ANNEX7_TEXT_LINE_PATTERN.match(line) or ':' not in parts[0]:
+            return None
+        first_number = 2 if ':' in parts[1] else 1
+        numbers = parts[first_number:first_number + 6]
+        try:
+            if len(numbers) == 6:
+                values = tuple(float(part) for part in numbers[:5]) + (float(numbers[5].replace(',', '')),)
+            elif len(numbers) == 5:
+                values = tuple(float(part) for part in numbers[:4]) + (ANNEX7_DEFAULT_RATE, float(numbers[4].replace(',', '')))
+            else:
+                return None
+        except ValueError:
+            return None
+        self.matches['split'] += 1
+        return self.current_date, parts[0], parts[1] if first_number == 2 else "", values
 
-        # Progress Bar
-        self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
-        self.progress.pack(fill='x', pady=(0, 5))
-        
-        # Status label / Text Area
-        self.status_text = tk.Text(main_frame, height=5, width=70, font=('Consolas', 9), bg='#f8f8f8', relief=tk.SOLID, borderwidth=1)
-        self.status_text.pack(fill='both', expand=True, pady=(0,0))
-        scrollbar = tk.Scrollbar(main_frame, command=self.status_text.yview)
-        # scrollbar.pack(side='right', fill='y') # This can cause layout issues, let's see if text area scroll is enough
-        self.status_text.config(yscrollcommand=scrollbar.set)
-        self.update_status("Ready.")
+    def _collect_loose(self, line):
+        if not ANNEX7_TIME_PATTERN.search(line):
+            return
+        parts = line.split()
+        if len(parts) < 6:
+            return
+        numbers, time_parts = [], []
+        for part in parts:
+            if ':' in part and len(part) <= 5:
+                time_parts.append(part)
+            else:
+                try:
+                    numbers.append(float(part.replace(',', '')))
+                except ValueError:
+                    continue
+        if len(numbers) >= 5 and time_parts:
+            self.loose.append((time_parts[0], time_parts[1] if len(time_parts) > 1 else "", numbers))
+
+    def loose_rows(self):
+        for time_from, time_to, numbers in self.loose or []:
+            self.matches['loose'] += 1
+            yield self.current_date, time_from, time_to, (numbers[0], numbers[1], numbers[2], numbers[3], ANNEX7_DEFAULT_RATE, numbers[4])
+
+
+def annex7_interval_ends(df_annex7):
+    """
+    Interval end (Date and Time To) of each Annex 7 row as datetime64, NaT where the row has no
+    date or Time To or they are not a valid time.
+    """
+    has_end = (df_annex7['Date'] != "Unknown") & (df_annex7['Time To'] != "")
+    return pd.to_datetime((df_annex7['Date'] + " " + df_annex7['Time To']).where(has_end), format="%d-%m-%Y %H:%M", errors='coerce')
+
+
+def meter_reading_formulas(interval_ends, meter_data, meter_columns):
+    """
+    The '=(a+b+...)*2' formula of the meter_columns readings at each of interval_ends (meter_data
+    is indexed by Timestamp), NA where there is no reading at that time or several. Built a
+    column at a time from one indexed join; a reading that is NA or not a number (float64
+    column or Python int/float) is written as 0.
+    """
+    formulas = pd.Series(pd.NA, index=interval_ends.index, dtype=object)
+    if not meter_columns:
+        return formulas
+    unique_rows = ~meter_data.index.duplicated(keep=False)
+    positions = meter_data.index[unique_rows].get_indexer(interval_ends)
+    found = (positions >= 0) & interval_ends.notna().to_numpy()
+    formula = None
+    for col_name in meter_columns:
+        column = meter_data[col_name][unique_rows]
+        values = column.to_numpy()[positions[found]]
+        if column.dtype == np.float64:
+            terms = np.where(np.isnan(values), "0", values.astype(str))
+        else: # What a scalar .loc gives, e.g. NumPy integers, is not a Python int or float
+            terms = np.array(["0" if pd.isna(val) or not isinstance(val, (int, float)) else str(val) for val in values], dtype=object)
+        formula = terms.astype(object) if formula is None else formula + "+" + terms.astype(object)
+    formulas.iloc[np.flatnonzero(found)] = "=(" + formula + ")*2"
+    return formulas.infer_objects() # Typed like a column built from the rows
+
+
+class ConversionCancelled(Exception):
+    """Raised inside AnnexConverter.convert_files once cancel() was called."""
+
+
+class AnnexConverter:
+    """
+    Step 2 without a window: matches the Annex 7 PDF with the *.lp meter readings and Step 1's
+    FADL_Calculation output and writes the 'Annex 7' and 'Meter Reading' workbook. Status lines
+    go to the logger and message boxes become log lines (kept in notices).
+    """
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("fadl.step2")
+        self.notices = [] # (type, title, message) of the message boxes a window would have shown
+        self.run_report = True # '<workbook> - Run Stats.json' with the stage times of each conversion
+        self.run_stats_sheet = False
+        self.trace_memory = False # See RunStats
+        self.metrics_file = METRICS_FILE_PATH # Cumulative metrics of every conversion, None to skip
+        self.run_stats = RunStats()
+        self.run_report_path = None
+        self.cancel_event = threading.Event() # Set by cancel(), from any thread
+        self.use_pdf_cache = True
+        self.pdf_cache = PdfTextCache()
+        self.pdf_workers = None # Worker processes for PDF extraction, None = one per CPU
 
+    def update_status(self, message):
+        self.logger.info(message)
 
-    def browse_pdf(self):
-        file = filedialog.askopenfilename(
-            title="Select PDF File",
-            filetypes=[("PDF Files", "*.pdf"), ("All files", "*.*")]
-        )
-        if file:
-            self.pdf_path.set(file)
-            # Auto-suggest excel filename if save_path is empty
-            if not self.save_path.get():
-                pdf_p = Path(file)
-                excel_name = pdf_p.parent / f"{pdf_p.stem}_FADL_converted.xlsx"
-                self.save_path.set(str(excel_name))
-            self.update_status(f"PDF selected: {file}")
+    def report_progress(self, stage, done=1, total=1):
+        """done of total units of work of a PROGRESS_STAGES stage are finished. Only the window shows it."""
 
-    def browse_lp_folder(self):
-        folder = filedialog.askdirectory(title="Select Folder with *.lp Files")
-        if folder:
-            self.lp_folder_path.set(folder)
-            self.update_status(f"LP folder selected: {folder}")
+    def cancel(self):
+        """Stop a running convert_files at its next check, without writing the workbook."""
+        self.cancel_event.set()
 
-    def browse_uch_excel(self):
-        file = filedialog.askopenfilename(
-            title="Select Excel File with FADL_Calculation",
-            filetypes=[("Excel Files", "*.xlsx"), ("Excel Files", "*.xls"), ("All files", "*.*")]
-        )
-        if file:
-            self.uch_excel_path.set(file)
-            self.update_status(f"UCH Excel file selected: {file}")
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise ConversionCancelled("Conversion cancelled.")
 
-    def browse_save(self):
-        # Suggest a filename based on PDF if available
-        initial_file = ""
-        if self.pdf_path.get():
-            pdf_p = Path(self.pdf_path.get())
-            initial_file = f"{pdf_p.stem}_FADL_converted.xlsx"
-        
-        file = filedialog.asksaveasfilename(
-            title="Save Excel File As",
-            initialfile=initial_file,
-            defaultextension=".xlsx", 
-            filetypes=[("Excel Files", "*.xlsx"), ("All files", "*.*")]
-        )
-        if file:
-            self.save_path.set(file)
-            self.update_status(f"Excel save location set: {file}")
+    def notify(self, msg_type, title, message):
+        self.notices.append((msg_type, title, message))
+        level = {"error": logging.ERROR, "warning": logging.WARNING}.get(msg_type, logging.INFO)
+        self.logger.log(level, f"{title}: {message}")
 
-    def update_status(self, message):
-        self.status_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')} - {message}\n")
-        self.status_text.see(tk.END)
-        self.root.update_idletasks()
+    def find_columnar_fadl_output(self, excel_path):
+        """
+        Return the Parquet/Feather/CSV copy of FADL_Calculation that Step 1 wrote next to
+        excel_path (or excel_path itself if it is one), or None. A copy older than the
+        workbook is ignored, as it belongs to an earlier run.
+        """
+        path = Path(excel_path)
+        if path.suffix.lower() in COLUMNAR_EXTENSIONS:
+            return path if path.exists() else None
+        excel_mtime = path.stat().st_mtime if path.exists() else None
+        candidates = [path.with_suffix(ext) for ext in COLUMNAR_EXTENSIONS]
+        candidates = [c for c in candidates if c.exists() and (excel_mtime is None or c.stat().st_mtime >= excel_mtime)]
+        return max(candidates, key=lambda c: c.stat().st_mtime) if candidates else None
+
+    def read_columnar_fadl_output(self, path, columns):
+        """Read only the given columns of a Step 1 columnar output, keeping its dtypes"""
+        suffix = Path(path).suffix.lower()
+        if suffix == '.parquet':
+            return pd.read_parquet(path, columns=columns)
+        if suffix == '.feather':
+            return pd.read_feather(path, columns=columns)
+        return pd.read_csv(path, usecols=columns, parse_dates=[columns[0]])
 
     def load_uch_excel_data(self, excel_path):
-        """Load UCH Excel data from FADL_Calculation worksheet"""
+        """
+        Load the UCH demand (Step 1's LPM (30 Min Sum)) as a float Series indexed by half-hour
+        timestamps: from Step 1's columnar copy of FADL_Calculation, else from the workbook's
+        half-hourly summary sheet, else from column E of its FADL_Calculation worksheet.
+        """
         try:
-            self.update_status(f"Loading UCH Excel data from: {excel_path}")
-            # Load the FADL_Calculation worksheet
-            df = pd.read_excel(excel_path, sheet_name='FADL_Calculation')
-
             # Column containing timestamp values
             timestamp_col = 'Date Time Stamp'
-            if timestamp_col not in df.columns:
-                self.update_status(f"Error: '{timestamp_col}' column not found in FADL_Calculation worksheet")
-                return None
-
-            # Column E (index 4) contains the required demand values
-            if len(df.columns) < 5:
-                self.update_status("Error: Column E not found in FADL_Calculation worksheet")
-                return None
-            demand_col = df.columns[4]
-
-            # Build lookup dictionary keyed by formatted timestamp
-            uch_lookup = {}
-            for _, row in df.iterrows():
-                ts_val = row[timestamp_col]
-                demand_val = row[demand_col]
-                if pd.isna(ts_val):
-                    continue
-
-                ts = pd.to_datetime(ts_val, errors='coerce')
-                if pd.isna(ts):
-                    continue
-
-                lookup_key = ts.strftime('%d-%m-%Y_%H:%M')
-                uch_lookup[lookup_key] = demand_val
+            columnar_path = self.find_columnar_fadl_output(excel_path)
+            if columnar_path is not None:
+                self.update_status(f"Loading UCH demand data from columnar output: {columnar_path}")
+                df = self.read_columnar_fadl_output(columnar_path, [timestamp_col, 'LPM (30 Min Sum)'])
+            else:
+                df = self.read_uch_excel_sheet(excel_path, timestamp_col)
+                if df is None:
+                    return None
 
+            uch_lookup = half_hour_demand(df.iloc[:, 0], df.iloc[:, 1])
             self.update_status(f"Successfully loaded {len(uch_lookup)} UCH demand records")
             return uch_lookup
-            
-        except Exception as e:
-            self.update_status(f"Error loading UCH Excel data: {str(e)}")
-            return None
+            
+        except Exception as e:
+            self.update_status(f"Error loading UCH Excel data: {str(e)}")
+            return None
+
+    def read_uch_excel_sheet(self, excel_path, timestamp_col):
+        """
+        The timestamp and demand columns of Step 1's workbook: the two columns of its summary sheet
+        (Half Hourly Date and LPM (30 Min Sum), 30 times fewer rows), or when it has none, the
+        timestamp column and column E of FADL_Calculation. None when FADL_Calculation lacks them.
+        """
+        with pd.ExcelFile(excel_path, engine=UCH_EXCEL_ENGINE) as xls:
+            for sheet_name in xls.sheet_names:
+                if sheet_name in ('FADL_Calculation', 'Run Stats'):
+                    continue
+                if list(pd.read_excel(xls, sheet_name=sheet_name, nrows=0).columns[:2]) == UCH_SUMMARY_COLUMNS:
+                    self.update_status(f"Loading UCH demand data from the '{sheet_name}' sheet of: {excel_path}")
+                    return pd.read_excel(xls, sheet_name=sheet_name, usecols=[0, 1])
+
+            self.update_status(f"Loading UCH Excel data from: {excel_path}")
+            header = list(pd.read_excel(xls, sheet_name='FADL_Calculation', nrows=0).columns)
+            if timestamp_col not in header:
+                self.update_status(f"Error: '{timestamp_col}' column not found in FADL_Calculation worksheet")
+                return None
+            # Column E (index 4) contains the required demand values
+            if len(header) < 5:
+                self.update_status("Error: Column E not found in FADL_Calculation worksheet")
+                return None
+            df = pd.read_excel(xls, sheet_name='FADL_Calculation', usecols=sorted({header.index(timestamp_col), 4}))
+            return df[[timestamp_col, header[4]]]
 
     # --- PDF Processing Methods (to be integrated from PDFToExcelConverter) ---
     def extract_text_from_pdf(self, pdf_path):
-        """Extract text from PDF file"""
+        """Extract text from PDF file: the text of every page followed by a newline, see iter_pdf_text."""
+        return "".join(page + "\n" for page in self.iter_pdf_text(pdf_path))
+
+    def iter_pdf_text(self, pdf_path):
+        """
+        Yield the text of each page of the PDF in order. Pages found in the PDF text cache are read
+        from it one at a time, the others are extracted in worker processes (in this process for
+        short PDFs) and each is added to the cache as it arrives, so a cancelled or stopped
+        extraction keeps what it did. A page's text is let go once it was yielded; only pages
+        that workers finish ahead of an earlier one wait in memory.
+        """
         self.update_status(f"Extracting text from PDF: {pdf_path}")
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for i, page in enumerate(pdf_reader.pages):
-                    self.update_status(f"Reading page {i+1}/{len(pdf_reader.pages)}...")
-                    text += page.extract_text() + "\n"
-                self.update_status("Text extraction complete.")
-                return text
+            cache_key = self.pdf_cache.key_for(pdf_path) if self.use_pdf_cache else None
+            page_count, cached = self.pdf_cache.load(cache_key) if cache_key else (None, set())
+            store_key = cache_key # None once saving to the cache failed
+            if page_count is None:
+                with open(pdf_path, 'rb') as file:
+                    page_count = len(PyPDF2.PdfReader(file).pages)
+                if store_key:
+                    try:
+                        self.pdf_cache.store_page_count(store_key, page_count)
+                    except OSError as e_cache:
+                        self.update_status(f"Could not save the PDF text cache: {e_cache}")
+                        store_key = None
+            self.run_stats.counts['pdf_pages'] = page_count
+            self.run_stats.counts['pdf_pages_cached'] = len(cached)
+            if cached:
+                self.update_status(f"{len(cached)} of {page_count} pages taken from the PDF text cache.")
+            missing = [number for number in range(page_count) if number not in cached]
+            batches = self._extract_page_batches(pdf_path, missing)
+            pages = {} # Extracted pages not yielded yet
+            extracted = 0
+            try:
+                for number in range(page_count):
+                    if number in cached:
+                        text = self.pdf_cache.load_page(cache_key, number)
+                        if text is None: # Evicted by another run since, extract it again
+                            text = extract_pdf_pages(pdf_path, [number])[0][1]
+                    else:
+                        while number not in pages: # Worker processes may finish later pages first
+                            batch = next(batches)
+                            pages.update(batch)
+                            extracted += len(batch)
+                            self.update_status(f"Reading page {max(batch) + 1}/{page_count}... ({extracted} of {len(missing)} extracted)")
+                            if store_key:
+                                try:
+                                    for batch_number, batch_text in batch.items():
+                                        self.pdf_cache.store_page(store_key, batch_number, batch_text)
+                                except OSError as e_cache:
+                                    self.update_status(f"Could not save the PDF text cache: {e_cache}")
+                                    store_key = None
+                        text = pages.pop(number)
+                    self.report_progress('PDF extract', number + 1, page_count)
+                    yield text
+            finally:
+                batches.close()
+            self.update_status("Text extraction complete.")
+        except ConversionCancelled:
+            raise
         except Exception as e:
             self.update_status(f"Error reading PDF: {str(e)}")
             raise Exception(f"Error reading PDF: {str(e)}")
 
+    def _extract_page_batches(self, pdf_path, page_numbers):
+        """Yield {page number: text} for page_numbers in batches, as they are extracted."""
+        workers = min(-(-len(page_numbers) // PDF_PAGES_PER_TASK), self.pdf_workers or os.cpu_count() or 1)
+        if workers <= 1 or len(page_numbers) < PDF_PARALLEL_MIN_PAGES:
+            pages = iter_pdf_pages(pdf_path, page_numbers)
+            try:
+                for number, text in pages:
+                    yield {number: text}
+                    self.check_cancelled()
+            finally:
+                pages.close()
+            return
+        task_pages = max(PDF_PAGES_PER_TASK, -(-len(page_numbers) // (workers * PDF_TASKS_PER_WORKER)))
+        self.update_status(f"Extracting {len(page_numbers)} pages in {workers} worker processes...")
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(extract_pdf_pages, pdf_path, page_numbers[start:start + task_pages])
+                       for start in range(0, len(page_numbers), task_pages)]
+            for future in concurrent.futures.as_completed(futures):
+                self.check_cancelled()
+                yield dict(future.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
     def parse_pdf_data(self, text, meter_data_for_lookup=None, uch_lookup=None):
         """
         Parse the extracted text to extract structured data for Annex 7.
         Includes lookup for meter reading sum from meter_data_for_lookup, multiplied by 2.
         Also includes lookup for UCH demand from uch_lookup based on Date and Time To.
+
+        text is the whole text or an iterable of page texts (see iter_pdf_text). Pages are parsed
+        one at a time as they arrive, in one pass of Annex7Tokenizer, and this method times the
+        'PDF extract' and 'PDF parse' stages itself.
         """
         self.update_status("Parsing PDF data for Annex 7 and looking up Meter Readings...")
-        
-        lines = text.split('\n')
+        streamed = not isinstance(text, str)
+        pages = iter(text if streamed else [text])
+        extract_stage = (lambda: self.run_stats.stage('PDF extract')) if streamed else contextlib.nullcontext
+        parse_stage = (lambda: self.run_stats.stage('PDF parse')) if streamed else contextlib.nullcontext
+        tokenizer = Annex7Tokenizer()
         data = []
-        current_date = None
-        
-        date_pattern = r'(\d{2}-\d{2}-\d{4})'
-        data_pattern = r'(\d{1,2}:\d{2})\s+(?:(\d{1,2}:\d{2})\s+)?(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+([0-9,]+\.\d+)\s*(\d+\.\d+)'
-        simple_data_pattern = r'(\d{1,2}:\d{2})\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+([0-9,]+\.\d+)\s*(\d+\.\d+)'
-
-        for line_idx, line in enumerate(lines):
-            line = line.strip()
-            if not line:
-                continue
-            
-            original_line_for_debug = line
+        try:
+            while True:
+                with extract_stage():
+                    page = next(pages, None)
+                if page is None:
+                    break
+                with parse_stage():
+                    for date, time_from, time_to, values in tokenizer.rows(self._annex7_lines(page, streamed)):
+                        data.append(self._annex7_record(date, time_from, time_to, values))
+        finally:
+            if hasattr(pages, 'close'): # Stops a page generator now, which saves what it extracted to the cache
+                pages.close()
 
-            date_match = re.search(date_pattern, line)
-            if date_match:
-                current_date = date_match.group(1)
-                line = line[date_match.end():].strip()
+        if not data and tokenizer.loose:
+            self.update_status("No structured data found in PDF for Annex 7. Trying a simpler line-by-line scan.")
+            with parse_stage():
+                for date, time_from, time_to, values in tokenizer.loose_rows():
+                    data.append(self._annex7_record(date, time_from, time_to, values))
+            if not tokenizer.current_date:
+                self.update_status("Warning: PDF data parsed without a clear date context for some rows.")
+
+        self.update_status("Annex 7 lines: " + ", ".join(f"{kind} {count}" for kind, count in tokenizer.matches.items()))
+        for kind, count in tokenizer.matches.items():
+            self.run_stats.counts[f"annex7_{kind.lower().replace(' ', '_')}"] = count
+        if not data:
+            self.update_status("Could not parse any data for Annex 7 from the PDF.")
+            return pd.DataFrame()
+        self.update_status(f"Successfully parsed {len(data)} rows for Annex 7.")
+        df_annex7 = pd.DataFrame(data, columns=ANNEX7_COLUMNS)
+        with parse_stage():
+            self._add_lookups(df_annex7, meter_data_for_lookup, uch_lookup)
+        return df_annex7
 
-            match = re.search(data_pattern, line)
-            if not match:
-                match = re.search(simple_data_pattern, line)
-                if match:
-                    groups = match.groups()
-                    match = lambda: None 
-                    match.groups = lambda: (groups[0], None) + groups[1:]
+    def _add_lookups(self, df_annex7, meter_data_for_lookup, uch_lookup):
+        """
+        Fill the Meter Reading Sum formulas and the UCH demand of df_annex7 from the meter readings
+        and the UCH demand (see load_uch_excel_data) at each row's interval end.
+        """
+        has_meter_data = meter_data_for_lookup is not None and not meter_data_for_lookup.empty
+        if not has_meter_data and uch_lookup is None:
+            return
+        has_end = (df_annex7['Date'] != "Unknown") & (df_annex7['Time To'] != "")
+        interval_ends = annex7_interval_ends(df_annex7)
+        invalid = has_end & interval_ends.isna()
+        if invalid.any():
+            examples = ", ".join(df_annex7['Date'][invalid].head(3) + " " + df_annex7['Time To'][invalid].head(3))
+            self.update_status(f"Timestamp format error for lookup: {int(invalid.sum())} row(s) have no valid Date and Time To, e.g. {examples}")
+        if has_meter_data:
+            try:
+                # Every individual meter column ('Sum', if there, is not part of the formula)
+                meter_columns = [col for col in meter_data_for_lookup.columns if col.lower() != 'sum']
+                df_annex7['Meter Reading Sum'] = meter_reading_formulas(interval_ends, meter_data_for_lookup, meter_columns)
+            except Exception as ex_lookup:
+                self.update_status(f"Error during meter reading lookup for formula construction: {ex_lookup}")
+        if uch_lookup is not None:
+            try:
+                df_annex7['Demand Calculated by UCH'] = uch_demand_at(interval_ends, uch_lookup)
+            except Exception as ex_lookup:
+                self.update_status(f"Error during UCH demand lookup: {ex_lookup}")
 
-            if match and current_date:
-                try:
-                    g = match.groups()
-                    time_from_str = g[0]
-                    time_to_str = g[1] if g[1] else ""
-
-                    if not time_to_str and time_from_str:
-                        try:
-                            if current_date:
-                                datetime_from_str = f"{current_date} {time_from_str}"
-                                dt_from_obj = datetime.strptime(datetime_from_str, "%d-%m-%Y %H:%M")
-                                dt_to_obj = dt_from_obj + timedelta(minutes=30)
-                                time_to_str = dt_to_obj.strftime("%H:%M")
-                        except ValueError as ve:
-                            self.update_status(f"Warning: Could not parse Time From '{time_from_str}' with date '{current_date}' to infer Time To (30 min rule): {ve}")
-
-                    wapda_demand = float(g[2])
-                    level_achieved = float(g[3])
-                    tolerance = float(g[4])
-                    non_compliance = float(g[5])
-                    amount_str = g[6]
-                    amount = float(amount_str.replace(',', ''))
-                    rate = float(g[7])
-
-                    excel_formula_string = pd.NA # Default to Not Available
-                    # Ensure time_to_str is valid before attempting lookup
-                    if meter_data_for_lookup is not None and not meter_data_for_lookup.empty and current_date and time_to_str: 
-                        try:
-                            lookup_timestamp_str = f"{current_date} {time_to_str}" # CHANGED to time_to_str
-                            lookup_timestamp = datetime.strptime(lookup_timestamp_str, "%d-%m-%Y %H:%M")
-                            
-                            if lookup_timestamp in meter_data_for_lookup.index:
-                                meter_values = []
-                                # Get all individual meter columns (exclude 'Sum' if it's there, though it shouldn't be used for this formula)
-                                individual_meter_columns = [col for col in meter_data_for_lookup.columns if col.lower() != 'sum']
-                                
-                                for col_name in individual_meter_columns:
-                                    val = meter_data_for_lookup.loc[lookup_timestamp, col_name]
-                                    # Treat NA or non-numeric as 0 for formula construction
-                                    if pd.isna(val) or not isinstance(val, (int, float)):
-                                        meter_values.append("0")
-                                    else:
-                                        meter_values.append(str(val))
-                                
-                                if meter_values:
-                                    formula_core = "+".join(meter_values)
-                                    excel_formula_string = f"=({formula_core})*2"
-                                # else: excel_formula_string remains pd.NA if no meter columns or values found
-                                    
-                        except ValueError as ve_lookup:
-                            self.update_status(f"Timestamp format error for lookup: {lookup_timestamp_str} -> {ve_lookup}")
-                        except Exception as ex_lookup:
-                            self.update_status(f"Error during meter reading lookup for formula construction {lookup_timestamp_str}: {ex_lookup}")
-                    
-                    # UCH Demand lookup
-                    uch_demand_value = pd.NA
-                    if uch_lookup is not None and current_date and time_to_str:
-                        lookup_key = f"{current_date}_{time_to_str}"
-                        if lookup_key in uch_lookup:
-                            uch_demand_value = uch_lookup[lookup_key]
-                    
-                    data.append({
-                        'Date': current_date, 'Time From': time_from_str, 'Time To': time_to_str,
-                        'WAPDA Demand MW': wapda_demand, 'Level Achieved MW': level_achieved,
-                        'Meter Reading Sum': excel_formula_string, # Store formula string
-                        'Demand Calculated by UCH': uch_demand_value,
-                        'Tolerance MW': tolerance, 'Non-Compliance MWh': non_compliance,
-                        'Rate Rs./kWh': rate, 'Amount Rs.': amount
-                    })
-                except Exception as e:
-                    self.update_status(f"Skipping line (parse error): {original_line_for_debug} -> {e}")
-                    continue
-            elif current_date and not re.match(r'^[A-Za-z]', line) and len(line.split()) > 5:
-                parts = line.split()
-                try:
-                    if ':' in parts[0]:
-                        time_from_str_fb = parts[0]
-                        time_to_str_fb = parts[1] if len(parts) > 1 and ':' in parts[1] else ""
-                        
-                        if not time_to_str_fb and time_from_str_fb and current_date:
-                            try:
-                                datetime_from_str_fb = f"{current_date} {time_from_str_fb}"
-                                dt_from_obj_fb = datetime.strptime(datetime_from_str_fb, "%d-%m-%Y %H:%M")
-                                dt_to_obj_fb = dt_from_obj_fb + timedelta(minutes=30)
-                                time_to_str_fb = dt_to_obj_fb.strftime("%H:%M")
-                            except ValueError: pass
-
-                        num_parts_offset = 2 if time_to_str_fb and ':' in parts[1] else 1
-                        
-                        excel_formula_string_fb = pd.NA
-                        # Ensure time_to_str_fb is valid before attempting lookup
-                        if meter_data_for_lookup is not None and not meter_data_for_lookup.empty and current_date and time_to_str_fb: 
-                            try:
-                                lookup_timestamp_str_fb = f"{current_date} {time_to_str_fb}" # CHANGED to time_to_str_fb
-                                lookup_timestamp_fb = datetime.strptime(lookup_timestamp_str_fb, "%d-%m-%Y %H:%M")
-                                if lookup_timestamp_fb in meter_data_for_lookup.index:
-                                    meter_values_fb = []
-                                    individual_meter_columns_fb = [col for col in meter_data_for_lookup.columns if col.lower() != 'sum']
-                                    for col_name_fb in individual_meter_columns_fb:
-                                        val_fb = meter_data_for_lookup.loc[lookup_timestamp_fb, col_name_fb]
-                                        if pd.isna(val_fb) or not isinstance(val_fb, (int, float)):
-                                            meter_values_fb.append("0")
-                                        else:
-                                            meter_values_fb.append(str(val_fb))
-                                    if meter_values_fb:
-                                        formula_core_fb = "+".join(meter_values_fb)
-                                        excel_formula_string_fb = f"=({formula_core_fb})*2"
-                            except (ValueError, KeyError, AttributeError): pass
-                        
-                        # UCH Demand lookup for fallback
-                        uch_demand_value_fb = pd.NA
-                        if uch_lookup is not None and current_date and time_to_str_fb:
-                            lookup_key_fb = f"{current_date}_{time_to_str_fb}"
-                            if lookup_key_fb in uch_lookup:
-                                uch_demand_value_fb = uch_lookup[lookup_key_fb]
-                        
-                        if len(parts) >= num_parts_offset + 6:
-                            wapda_demand = float(parts[num_parts_offset])
-                            level_achieved = float(parts[num_parts_offset+1])
-                            tolerance = float(parts[num_parts_offset+2])
-                            non_compliance = float(parts[num_parts_offset+3])
-                            rate_val = float(parts[num_parts_offset+4])
-                            amount_val = float(parts[num_parts_offset+5].replace(',', ''))
-                            data.append({
-                                'Date': current_date, 'Time From': time_from_str_fb, 'Time To': time_to_str_fb,
-                                'WAPDA Demand MW': wapda_demand, 'Level Achieved MW': level_achieved,
-                                'Meter Reading Sum': excel_formula_string_fb,
-                                'Demand Calculated by UCH': uch_demand_value_fb,
-                                'Tolerance MW': tolerance, 'Non-Compliance MWh': non_compliance,
-                                'Rate Rs./kWh': rate_val, 'Amount Rs.': amount_val
-                            })
-                        elif len(parts) >= num_parts_offset + 5:
-                             wapda_demand = float(parts[num_parts_offset])
-                             level_achieved = float(parts[num_parts_offset+1])
-                             tolerance = float(parts[num_parts_offset+2])
-                             non_compliance = float(parts[num_parts_offset+3])
-                             amount_val = float(parts[num_parts_offset+4].replace(',', ''))
-                             data.append({
-                                'Date': current_date, 'Time From': time_from_str_fb, 'Time To': time_to_str_fb,
-                                'WAPDA Demand MW': wapda_demand, 'Level Achieved MW': level_achieved,
-                                'Meter Reading Sum': excel_formula_string_fb, # Still uses the same looked up value/formula
-                                'Demand Calculated by UCH': uch_demand_value_fb,
-                                'Tolerance MW': tolerance, 'Non-Compliance MWh': non_compliance,
-                                'Rate Rs./kWh': 6.0534, 'Amount Rs.': amount_val
-                            })
-                except (ValueError, IndexError): pass
+    def _annex7_lines(self, page, streamed):
+        """Yield the lines of a page, checking for cancellation every 50 lines."""
+        lines = page.split('\n')
+        for line_idx, line in enumerate(lines):
+            if line_idx % 50 == 0:
+                self.check_cancelled()
+                if not streamed: # Streamed pages report their progress as they are extracted
+                    self.report_progress('PDF parse', line_idx, len(lines))
+            yield line
 
-        if not data:
-            self.update_status("No structured data found in PDF for Annex 7. Trying a simpler line-by-line scan.")
-            for line in lines:
-                if re.search(r'\d{1,2}:\d{2}', line) and len(line.split()) >= 6:
-                    parts = line.split()
-                    numbers = []
-                    time_parts = []
-                    for part in parts:
-                        if ':' in part and len(part) <= 5: time_parts.append(part)
-                        else:
-                            try: numbers.append(float(part.replace(',', '')))
-                            except ValueError: continue
-                    
-                    if len(numbers) >= 5 and len(time_parts) >= 1:
-                        time_from_fb2 = time_parts[0] if time_parts else ""
-                        time_to_fb2 = time_parts[1] if len(time_parts) > 1 else ""
-
-                        if not time_to_fb2 and time_from_fb2 and current_date and current_date != "Unknown":
-                            try:
-                                datetime_from_str_fb2 = f"{current_date} {time_from_fb2}"
-                                dt_from_obj_fb2 = datetime.strptime(datetime_from_str_fb2, "%d-%m-%Y %H:%M")
-                                dt_to_obj_fb2 = dt_from_obj_fb2 + timedelta(minutes=30)
-                                time_to_fb2 = dt_to_obj_fb2.strftime("%H:%M")
-                            except ValueError: pass
-                        
-                        excel_formula_string_fb2 = pd.NA
-                        # Ensure time_to_fb2 is valid for lookup
-                        if meter_data_for_lookup is not None and not meter_data_for_lookup.empty and \
-                           current_date and current_date != "Unknown" and time_to_fb2: 
-                            try:
-                                lookup_timestamp_str_fb2 = f"{current_date} {time_to_fb2}" # CHANGED to time_to_fb2
-                                lookup_timestamp_fb2 = datetime.strptime(lookup_timestamp_str_fb2, "%d-%m-%Y %H:%M")
-                                if lookup_timestamp_fb2 in meter_data_for_lookup.index:
-                                    meter_values_fb2 = []
-                                    individual_meter_columns_fb2 = [col for col in meter_data_for_lookup.columns if col.lower() != 'sum']
-                                    for col_name_fb2 in individual_meter_columns_fb2:
-                                        val_fb2 = meter_data_for_lookup.loc[lookup_timestamp_fb2, col_name_fb2]
-                                        if pd.isna(val_fb2) or not isinstance(val_fb2, (int, float)):
-                                            meter_values_fb2.append("0")
-                                        else:
-                                            meter_values_fb2.append(str(val_fb2))
-                                    if meter_values_fb2:
-                                        formula_core_fb2 = "+".join(meter_values_fb2)
-                                        excel_formula_string_fb2 = f"=({formula_core_fb2})*2"
-                            except (ValueError, KeyError, AttributeError): pass
-
-                        # UCH Demand lookup for final fallback
-                        uch_demand_value_fb2 = pd.NA
-                        if uch_lookup is not None and current_date and current_date != "Unknown" and time_to_fb2:
-                            lookup_key_fb2 = f"{current_date}_{time_to_fb2}"
-                            if lookup_key_fb2 in uch_lookup:
-                                uch_demand_value_fb2 = uch_lookup[lookup_key_fb2]
-
-                        data.append({
-                            'Date': current_date or "Unknown", 'Time From': time_from_fb2, 'Time To': time_to_fb2,
-                            'WAPDA Demand MW': numbers[0] if len(numbers) > 0 else 0,
-                            'Level Achieved MW': numbers[1] if len(numbers) > 1 else 0,
-                            'Meter Reading Sum': excel_formula_string_fb2,
-                            'Demand Calculated by UCH': uch_demand_value_fb2,
-                            'Tolerance MW': numbers[2] if len(numbers) > 2 else 0,
-                            'Non-Compliance MWh': numbers[3] if len(numbers) > 3 else 0,
-                            'Rate Rs./kWh': 6.0534, 
-                            'Amount Rs.': numbers[4] if len(numbers) > 4 else 0
-                        })
-                        if not current_date: self.update_status("Warning: PDF data parsed without a clear date context for some rows.")
+    def _annex7_record(self, date, time_from, time_to, values):
+        """
+        One Annex 7 row (in ANNEX7_COLUMNS order) from a tokenizer row, inferring a missing Time To
+        as Time From + 30 minutes. The Meter Reading Sum and the UCH demand are left NA for
+        _add_lookups.
+        """
+        if not time_to and time_from and date:
+            try:
+                time_to = (datetime.strptime(f"{date} {time_from}", "%d-%m-%Y %H:%M") + timedelta(minutes=30)).strftime("%H:%M")
+            except ValueError as ve:
+                self.update_status(f"Warning: Could not parse Time From '{time_from}' with date '{date}' to infer Time To (30 min rule): {ve}")
 
-        if data:
-             self.update_status(f"Successfully parsed {len(data)} rows for Annex 7.")
-        else:
-            self.update_status("Could not parse any data for Annex 7 from the PDF.")
-        return pd.DataFrame(data)
+        wapda_demand, level_achieved, tolerance, non_compliance, rate, amount = values
+        return (date or "Unknown", time_from, time_to, wapda_demand, level_achieved, pd.NA, pd.NA,
+                tolerance, non_compliance, rate, amount)
 
 
     def write_annex7_sheet(self, writer, df_annex7):
@@ -549,7 +703,9 @@ class FADLToExcelApp:
 
         meter_dfs = []
         meter_names = []
-        for lp_file in lp_files:
+        for file_idx, lp_file in enumerate(lp_files):
+            self.check_cancelled()
+            self.report_progress('LP parse', file_idx, len(lp_files))
             meter_name = os.path.splitext(os.path.basename(lp_file))[0]
             self.update_status(f"Parsing LP file: {meter_name}.lp")
             try:
@@ -571,6 +727,7 @@ class FADLToExcelApp:
         self.update_status("Merging data from all LP files...")
         merged_df = meter_dfs[0]
         for df_idx in range(1, len(meter_dfs)):
+            self.check_cancelled()
             merged_df = pd.merge(merged_df, meter_dfs[df_idx], on='Timestamp', how='outer')
 
         # Convert Timestamp to datetime objects if not already
@@ -648,95 +805,98 @@ class FADLToExcelApp:
             # self.update_status(f"No data parsed from LP file: {os.path.basename(filepath)}")
             return pd.DataFrame(columns=['Timestamp', '2.9']) # Ensure consistent return type
 
-    # --- Convert Method (to be updated) ---
-    def convert(self):
-        # This method will be filled in the next step
+    def convert_files(self, pdf_file, lp_folder, uch_excel_file, excel_file):
+        """
+        Build the workbook excel_file. Each input is optional (empty/None skips it, leaving its
+        sheet with a message). Returns True when the workbook was written, False when it failed
+        or was cancelled (see cancel).
+        """
         self.update_status("Starting conversion process...")
-        self.progress.start()
-
-        pdf_file = self.pdf_path.get()
-        lp_folder = self.lp_folder_path.get()
-        uch_excel_file = self.uch_excel_path.get()
-        excel_file = self.save_path.get()
 
         if not excel_file:
-            messagebox.showerror("Error", "Please specify Excel save location.")
-            self.progress.stop()
+            self.notify("error", "Error", "Please specify Excel save location.")
             self.update_status("Conversion failed: No save location.")
-            return
-
-        # Process PDF for Annex 7
-        df_annex7 = pd.DataFrame() # Initialize as empty
-        if pdf_file:
-            try:
-                pdf_text = self.extract_text_from_pdf(pdf_file)
-                if pdf_text:
-                    df_annex7 = self.parse_pdf_data(pdf_text)
-                else:
-                    self.update_status("PDF text extraction failed or returned empty.")
-                    # df_annex7 remains empty, write_annex7_sheet will handle this
-            except Exception as e:
-                messagebox.showerror("PDF Error", f"Error processing PDF file: {e}")
-                self.update_status(f"PDF processing error: {e}")
-                # Decide if to continue or stop; for now, let's try to process LP if available
-        else:
-            self.update_status("No PDF file selected. 'Annex 7' sheet will be empty or contain a message.")
-
+            return False
+        self.run_stats = RunStats(trace_memory=self.trace_memory)
+        status = "failed"
+        try:
+            if self._convert_files(pdf_file, lp_folder, uch_excel_file, excel_file):
+                status = "ok"
+        except ConversionCancelled:
+            status = "cancelled"
+            self.update_status("Conversion cancelled. The Excel file was not written.")
+        finally:
+            self._write_run_report(status, pdf_file, lp_folder, uch_excel_file, excel_file)
+            self.update_status("Conversion process finished.")
+        return status == "ok"
 
+    def _convert_files(self, pdf_file, lp_folder, uch_excel_file, excel_file):
         # Process LP files for Meter Readings
         meter_df = pd.DataFrame() # Initialize as empty
         meter_df_indexed = None # For meter data lookup
         if lp_folder:
             try:
-                meter_df = self.process_lp_files_folder(lp_folder) # Returns df with Timestamp as datetime
+                with self.run_stats.stage('LP parse'):
+                    meter_df = self.process_lp_files_folder(lp_folder) # Returns df with Timestamp as datetime
+                self.run_stats.counts['meter_readings'] = len(meter_df)
                 if not meter_df.empty:
                     # Prepare for lookup: Set Timestamp as index
                     # Ensure Timestamp is definite datetime before setting as index
-                    meter_df['Timestamp'] = pd.to_datetime(meter_df['Timestamp'])
-                    meter_df_indexed = meter_df.set_index('Timestamp')
+                    with self.run_stats.stage('merge'):
+                        meter_df['Timestamp'] = pd.to_datetime(meter_df['Timestamp'])
+                        meter_df_indexed = meter_df.set_index('Timestamp')
                     self.update_status("Meter Reading data indexed for lookup.")
                 else:
                     self.update_status("No data processed from LP files. Lookup will not be available.")
+            except ConversionCancelled:
+                raise
             except Exception as e:
-                messagebox.showerror("LP File Error", f"Error processing LP files: {e}")
+                self.notify("error", "LP File Error", f"Error processing LP files: {e}")
                 self.update_status(f"LP file processing error: {e}")
         else:
             self.update_status("No LP folder selected. Meter Reading lookup will not be available.")
+        self.report_progress('LP parse')
 
         # Load UCH Excel data
+        self.check_cancelled()
         uch_lookup = None
         if uch_excel_file:
             try:
-                uch_lookup = self.load_uch_excel_data(uch_excel_file)
+                with self.run_stats.stage('lookup prep'):
+                    uch_lookup = self.load_uch_excel_data(uch_excel_file)
                 if uch_lookup is None:
                     self.update_status("UCH Excel data could not be loaded. UCH demand lookup will not be available.")
             except Exception as e:
-                messagebox.showerror("UCH Excel Error", f"Error loading UCH Excel file: {e}")
+                self.notify("error", "UCH Excel Error", f"Error loading UCH Excel file: {e}")
                 self.update_status(f"UCH Excel loading error: {e}")
         else:
             self.update_status("No UCH Excel file selected. UCH demand lookup will not be available.")
+        self.report_progress('lookup prep')
+        self.check_cancelled()
 
         # Process PDF for Annex 7 - now pass meter_df_indexed and uch_lookup for lookup
         df_annex7 = pd.DataFrame() 
         if pdf_file:
             try:
-                pdf_text = self.extract_text_from_pdf(pdf_file)
-                if pdf_text:
-                    # Pass the indexed meter data and UCH lookup to parse_pdf_data
-                    df_annex7 = self.parse_pdf_data(pdf_text, meter_df_indexed, uch_lookup)
-                else:
+                # Pages are parsed as they are extracted, parse_pdf_data times both stages
+                df_annex7 = self.parse_pdf_data(self.iter_pdf_text(pdf_file), meter_df_indexed, uch_lookup)
+                self.run_stats.counts['annex7_rows'] = len(df_annex7)
+                if not self.run_stats.counts.get('pdf_pages'):
                     self.update_status("PDF text extraction failed or returned empty.")
+            except ConversionCancelled:
+                raise
             except Exception as e:
-                messagebox.showerror("PDF Error", f"Error processing PDF file: {e}")
+                self.notify("error", "PDF Error", f"Error processing PDF file: {e}")
                 self.update_status(f"PDF processing error: {e}")
         else:
             self.update_status("No PDF file selected. 'Annex 7' sheet will be empty or contain a message.")
-
+        self.report_progress('PDF parse')
+        self.check_cancelled()
 
         # Write to Excel
         self.update_status(f"Writing data to Excel: {excel_file}")
         try:
-            with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
+            with self.run_stats.stage('write'), pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
                 # Write "Annex 7"
                 self.write_annex7_sheet(writer, df_annex7)
 
@@ -749,7 +909,10 @@ class FADLToExcelApp:
                     datetime_format = 'yyyy-mm-dd hh:mm:ss' 
                     # Adjust column width for Timestamp
                     worksheet_mr.column_dimensions['A'].width = 20 
-                    for row in worksheet_mr.iter_rows(min_row=2, min_col=1, max_col=1): # Iterate over column A, skip header
+                    for row_idx, row in enumerate(worksheet_mr.iter_rows(min_row=2, min_col=1, max_col=1)): # Iterate over column A, skip header
+                        if row_idx % 5000 == 0:
+                            self.check_cancelled()
+                            self.report_progress('write', row_idx, len(meter_df))
                         for cell in row:
                             if cell.value is not None: # Ensure cell is not empty
                                 cell.number_format = datetime_format
@@ -760,17 +923,288 @@ class FADLToExcelApp:
                     empty_meter_df.to_excel(writer, sheet_name="Meter Reading", index=False)
                     self.update_status("'Meter Reading' sheet: No data.")
 
+                if self.run_stats_sheet: # The stages before the write, the JSON run report has them all
+                    pd.DataFrame(self.run_stats.rows(), columns=RUN_STATS_COLUMNS).to_excel(writer, sheet_name="Run Stats", index=False)
+
+            self.report_progress('write')
             self.update_status("Excel file created successfully!")
-            messagebox.showinfo("Success", f"Excel file created:\n{excel_file}")
+            self.notify("info", "Success", f"Excel file created:\n{excel_file}")
+            return True
+        except ConversionCancelled:
+            if os.path.exists(excel_file): # Closing the writer saved what was written so far
+                os.remove(excel_file)
+            raise
         except Exception as e:
             self.update_status(f"Error writing Excel file: {e}")
-            messagebox.showerror("Excel Error", f"Error writing Excel file: {e}")
+            self.notify("error", "Excel Error", f"Error writing Excel file: {e}")
+            return False
+
+    def _write_run_report(self, status, pdf_file, lp_folder, uch_excel_file, excel_file):
+        """Log where the conversion spent its time, write the JSON run report next to the workbook and add it to the metrics file."""
+        self.update_status(f"Run stats: {self.run_stats.summary()}")
+        report = self.run_stats.report(step="step2", status=status, pdf=pdf_file or None, lp_folder=lp_folder or None,
+                                       uch=uch_excel_file or None, outputs=[excel_file] if status == "ok" else [])
+        self.run_report_path = None
+        if self.run_report and os.path.isdir(os.path.dirname(os.path.abspath(excel_file))):
+            try:
+                self.run_report_path = write_run_report(report, excel_file)
+                self.update_status(f"Run report saved: {self.run_report_path}")
+            except OSError as e:
+                self.update_status(f"Could not write the run report: {e}")
+        if self.metrics_file:
+            try:
+                update_metrics_file(self.metrics_file, report)
+            except (OSError, ValueError) as e:
+                self.update_status(f"Could not update the metrics file {self.metrics_file}: {e}")
+
+
+class FADLToExcelApp(AnnexConverter):
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+        self.root.title("Convert and Match FADL with Meter Reading")
+        self.root.geometry("850x750") # Increased height for status/progress
+        self.root.resizable(False, False)
+        self.root.configure(bg='#f0f0f0')
+
+        # File/folder path variables
+        self.pdf_path = tk.StringVar()
+        self.lp_folder_path = tk.StringVar()
+        self.uch_excel_path = tk.StringVar()
+        self.save_path = tk.StringVar()
+        self.progress_text = tk.StringVar(value="")
+
+        self.messages = queue.Queue() # Status lines, progress and message boxes for the Tk thread
+        self.worker = None # Thread running convert_files
+        self.setup_gui()
+        self.root.after(100, self._drain_messages)
+
+    def setup_gui(self):
+        main_frame = tk.Frame(self.root, bg='#f0f0f0', padx=20, pady=20)
+        main_frame.pack(fill='both', expand=True)
+
+        # Title
+        title_label = tk.Label(main_frame, text="FADL to Excel Enhanced Tool", 
+                              font=('Arial', 16, 'bold'), bg='#f0f0f0', fg='#333')
+        title_label.pack(pady=(0, 20))
+
+        # PDF Selection Frame
+        pdf_frame = tk.Frame(main_frame, bg='#f0f0f0')
+        pdf_frame.pack(fill='x', pady=(0, 10))
+        tk.Label(pdf_frame, text="Select PDF File (for Annex 7):", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(anchor='w')
+        pdf_path_frame = tk.Frame(pdf_frame, bg='#f0f0f0')
+        pdf_path_frame.pack(fill='x', pady=(5,0))
+        tk.Entry(pdf_path_frame, textvariable=self.pdf_path, font=('Arial', 10), width=50).pack(side='left', fill='x', expand=True, padx=(0,10))
+        tk.Button(pdf_path_frame, text="Browse", command=self.browse_pdf, bg='#4CAF50', fg='white', font=('Arial', 10), padx=10, pady=2).pack(side='right')
+
+        # LP folder selection
+        lp_frame = tk.Frame(main_frame, bg='#f0f0f0')
+        lp_frame.pack(fill='x', pady=(0, 10))
+        tk.Label(lp_frame, text="Select Folder with *.lp Files (for Meter Readings):", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(anchor='w')
+        lp_path_frame = tk.Frame(lp_frame, bg='#f0f0f0')
+        lp_path_frame.pack(fill='x', pady=(5,0))
+        tk.Entry(lp_path_frame, textvariable=self.lp_folder_path, font=('Arial', 10), width=50).pack(side='left', fill='x', expand=True, padx=(0,10))
+        tk.Button(lp_path_frame, text="Browse", command=self.browse_lp_folder, bg='#4CAF50', fg='white', font=('Arial', 10), padx=10, pady=2).pack(side='right')
+
+        # UCH Excel file selection
+        uch_frame = tk.Frame(main_frame, bg='#f0f0f0')
+        uch_frame.pack(fill='x', pady=(0, 10))
+        tk.Label(uch_frame, text="Select Excel File with FADL_Calculation (for UCH Demand):", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(anchor='w')
+        uch_path_frame = tk.Frame(uch_frame, bg='#f0f0f0')
+        uch_path_frame.pack(fill='x', pady=(5,0))
+        tk.Entry(uch_path_frame, textvariable=self.uch_excel_path, font=('Arial', 10), width=50).pack(side='left', fill='x', expand=True, padx=(0,10))
+        tk.Button(uch_path_frame, text="Browse", command=self.browse_uch_excel, bg='#4CAF50', fg='white', font=('Arial', 10), padx=10, pady=2).pack(side='right')
+
+        # Excel save location
+        excel_frame = tk.Frame(main_frame, bg='#f0f0f0')
+        excel_frame.pack(fill='x', pady=(0, 15))
+        tk.Label(excel_frame, text="Save Excel File As:", font=('Arial', 10, 'bold'), bg='#f0f0f0').pack(anchor='w')
+        excel_path_frame = tk.Frame(excel_frame, bg='#f0f0f0')
+        excel_path_frame.pack(fill='x', pady=(5,0))
+        tk.Entry(excel_path_frame, textvariable=self.save_path, font=('Arial', 10), width=50).pack(side='left', fill='x', expand=True, padx=(0,10))
+        tk.Button(excel_path_frame, text="Browse", command=self.browse_save, bg='#2196F3', fg='white', font=('Arial', 10), padx=10, pady=2).pack(side='right')
+        
+        self.run_stats_sheet_var = tk.BooleanVar(value=self.run_stats_sheet)
+        tk.Checkbutton(main_frame, text="Add a Run Stats sheet (stage times)", variable=self.run_stats_sheet_var,
+                       font=('Arial', 10), bg='#f0f0f0').pack(anchor='w')
+
+        # Convert and Cancel buttons
+        button_frame = tk.Frame(main_frame, bg='#f0f0f0')
+        button_frame.pack(pady=20)
+        self.convert_button = tk.Button(button_frame, text="Convert to Excel", command=self.convert, width=20, bg='#FF9800', fg='white', font=('Arial', 12, 'bold'), padx=20, pady=10)
+        self.convert_button.pack(side='left', padx=(0, 10))
+        self.cancel_button = tk.Button(button_frame, text="Cancel", command=self.cancel_convert, state=tk.DISABLED, bg='#9E9E9E', fg='white', font=('Arial', 12, 'bold'), padx=20, pady=10)
+        self.cancel_button.pack(side='left')
+
+        # Progress Bar
+        self.progress = ttk.Progressbar(main_frame, mode='determinate', maximum=100)
+        self.progress.pack(fill='x', pady=(0, 2))
+        tk.Label(main_frame, textvariable=self.progress_text, font=('Arial', 9), bg='#f0f0f0').pack(anchor='w', pady=(0, 5))
+        
+        # Status label / Text Area
+        self.status_text = tk.Text(main_frame, height=5, width=70, font=('Consolas', 9), bg='#f8f8f8', relief=tk.SOLID, borderwidth=1)
+        self.status_text.pack(fill='both', expand=True, pady=(0,0))
+        scrollbar = tk.Scrollbar(main_frame, command=self.status_text.yview)
+        # scrollbar.pack(side='right', fill='y') # This can cause layout issues, let's see if text area scroll is enough
+        self.status_text.config(yscrollcommand=scrollbar.set)
+        self.update_status("Ready.")
+
+
+    def browse_pdf(self):
+        file = filedialog.askopenfilename(
+            title="Select PDF File",
+            filetypes=[("PDF Files", "*.pdf"), ("All files", "*.*")]
+        )
+        if file:
+            self.pdf_path.set(file)
+            # Auto-suggest excel filename if save_path is empty
+            if not self.save_path.get():
+                pdf_p = Path(file)
+                excel_name = pdf_p.parent / f"{pdf_p.stem}_FADL_converted.xlsx"
+                self.save_path.set(str(excel_name))
+            self.update_status(f"PDF selected: {file}")
+
+    def browse_lp_folder(self):
+        folder = filedialog.askdirectory(title="Select Folder with *.lp Files")
+        if folder:
+            self.lp_folder_path.set(folder)
+            self.update_status(f"LP folder selected: {folder}")
+
+    def browse_uch_excel(self):
+        file = filedialog.askopenfilename(
+            title="Select Excel File with FADL_Calculation",
+            filetypes=[("Excel Files", "*.xlsx"), ("Excel Files", "*.xls"),
+                       ("FADL Columnar Output", "*.parquet *.feather *.csv"), ("All files", "*.*")]
+        )
+        if file:
+            self.uch_excel_path.set(file)
+            self.update_status(f"UCH Excel file selected: {file}")
+
+    def browse_save(self):
+        # Suggest a filename based on PDF if available
+        initial_file = ""
+        if self.pdf_path.get():
+            pdf_p = Path(self.pdf_path.get())
+            initial_file = f"{pdf_p.stem}_FADL_converted.xlsx"
+        
+        file = filedialog.asksaveasfilename(
+            title="Save Excel File As",
+            initialfile=initial_file,
+            defaultextension=".xlsx", 
+            filetypes=[("Excel Files", "*.xlsx"), ("All files", "*.*")]
+        )
+        if file:
+            self.save_path.set(file)
+            self.update_status(f"Excel save location set: {file}")
+
+    # Called from the conversion thread as well, so these only queue for _drain_messages
+    def update_status(self, message):
+        self.messages.put(('status', f"{datetime.now().strftime('%H:%M:%S')} - {message}\n"))
+
+    def notify(self, msg_type, title, message):
+        self.messages.put(('notify', msg_type, title, message))
+
+    def report_progress(self, stage, done=1, total=1):
+        start, end = PROGRESS_STAGES[stage]
+        fraction = min(done, total) / total if total else 1.0
+        self.messages.put(('progress', start + (end - start) * fraction, f"{stage}: {done} of {total}" if total > 1 else stage))
+
+    def _drain_messages(self):
+        """Show what was queued for the window, on the Tk thread. Runs every 100 ms."""
+        try:
+            while True:
+                kind, *payload = self.messages.get_nowait()
+                if kind == 'status':
+                    self.status_text.insert(tk.END, payload[0])
+                    self.status_text.see(tk.END)
+                elif kind == 'progress':
+                    self.progress['value'], text = payload
+                    self.progress_text.set(text)
+                elif kind == 'notify':
+                    msg_type, title, message = payload
+                    if msg_type == "info": messagebox.showinfo(title, message)
+                    elif msg_type == "warning": messagebox.showwarning(title, message)
+                    elif msg_type == "error": messagebox.showerror(title, message)
+                elif kind == 'done':
+                    self._conversion_finished(payload[0])
+        except queue.Empty:
+            pass
+        self.root.after(100, self._drain_messages)
+
+    def convert(self):
+        if self.worker is not None and self.worker.is_alive():
+            return
+        self.run_stats_sheet = self.run_stats_sheet_var.get()
+        self.cancel_event.clear()
+        self.convert_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.progress['value'] = 0
+        self.progress_text.set("Starting...")
+        self.worker = threading.Thread(target=self._convert_in_background, daemon=True,
+                                       args=(self.pdf_path.get(), self.lp_folder_path.get(), self.uch_excel_path.get(), self.save_path.get()))
+        self.worker.start()
+
+    def _convert_in_background(self, pdf_file, lp_folder, uch_excel_file, excel_file):
+        succeeded = False
+        try:
+            succeeded = self.convert_files(pdf_file, lp_folder, uch_excel_file, excel_file)
+        except Exception as e:
+            self.update_status(f"Unexpected error: {e}")
+            self.notify("error", "Error", f"Unexpected error during conversion: {e}")
         finally:
-            self.progress.stop()
-            self.update_status("Conversion process finished.")
+            self.messages.put(('done', succeeded))
+
+    def cancel_convert(self):
+        if self.worker is not None and self.worker.is_alive():
+            self.cancel()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.update_status("Cancelling after the current step...")
+
+    def _conversion_finished(self, succeeded):
+        self.worker = None
+        self.convert_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if succeeded:
+            self.progress['value'] = 100
+        self.progress_text.set("Done." if succeeded else ("Cancelled." if self.cancel_event.is_set() else "Failed."))
+
+
+def main(argv=None):
+    """
+    Command-line runs, e.g. from cron. Writes the Annex 7 and Meter Reading workbook and returns
+    the exit code: 0 when it was written, 1 otherwise.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert and match FADL with Meter Reading. Without arguments the window opens.")
+    parser.add_argument("--pdf", help="Annex 7 PDF file.")
+    parser.add_argument("--lp-folder", help="Folder with the *.lp meter files.")
+    parser.add_argument("--uch", metavar="FADL_CALCULATION", help="Step 1 output with the FADL_Calculation sheet, or its Parquet/Feather/CSV copy.")
+    parser.add_argument("--output", required=True, help="Excel file to write.")
+    parser.add_argument("--no-pdf-cache", action="store_true", help="Always extract the PDF text again instead of reusing cached pages.")
+    parser.add_argument("--pdf-workers", type=int, help="Worker processes for PDF text extraction. Default: one per CPU.")
+    parser.add_argument("--no-run-report", action="store_true", help="Skip the '<output> - Run Stats.json' report of stage times and memory.")
+    parser.add_argument("--run-stats-sheet", action="store_true", help="Add a 'Run Stats' sheet to the workbook.")
+    parser.add_argument("--trace-memory", action="store_true", help="Report the memory each stage allocates (tracemalloc, several times slower).")
+    parser.add_argument("--metrics-file", default=METRICS_FILE_PATH, help=f"Cumulative metrics file (Prometheus text format), '' to skip. Default: {METRICS_FILE_PATH}")
+    args = parser.parse_args(argv)
+    if not (args.pdf or args.lp_folder):
+        parser.error("Give --pdf and/or --lp-folder, otherwise there is nothing to convert.")
+    if args.pdf_workers is not None and args.pdf_workers < 1:
+        parser.error("--pdf-workers must be at least 1.")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    converter = AnnexConverter()
+    converter.run_report = not args.no_run_report
+    converter.run_stats_sheet = args.run_stats_sheet
+    converter.trace_memory = args.trace_memory
+    converter.metrics_file = args.metrics_file or None
+    converter.use_pdf_cache = not args.no_pdf_cache
+    converter.pdf_workers = args.pdf_workers
+    return 0 if converter.convert_files(args.pdf, args.lp_folder, args.uch, args.output) else 1
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
     root = tk.Tk()
     app = FADLToExcelApp(root)
     root.mainloop()
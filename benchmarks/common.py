@@ -0,0 +1,136 @@
+"""
+Shared pieces of the benchmark suites: importing the FADL step scripts (their file names have
+spaces, so they cannot be imported by name), timing stages and keeping JSON baselines.
+"""
+import datetime
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path: # The step scripts import fadl_metrics from their own folder
+    sys.path.insert(0, REPO_DIR)
+STEP_SCRIPTS = {
+    'fadl_step1': "Step 1.  Demand Data for FADL.py",
+    'fadl_step2': "Step 2. Annex 7 and Meter Reading.py",
+}
+
+
+def load_step(module_name):
+    """The step script registered as module_name in STEP_SCRIPTS, loaded once."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_DIR, STEP_SCRIPTS[module_name]))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module # Registered before running it so worker processes can unpickle its functions
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_step_at_revision(module_name, revision):
+    """
+    The step script of module_name as committed at a git revision (e.g. 'HEAD', a tag or a
+    commit), loaded as its own module next to the working-tree one.
+    """
+    import re
+    import subprocess
+    import tempfile
+    source = subprocess.run(['git', '-C', REPO_DIR, 'show', f"{revision}:{STEP_SCRIPTS[module_name]}"],
+                            check=True, capture_output=True).stdout
+    revision_module = module_name + "_at_" + re.sub(r'\W', '_', revision)
+    if revision_module in sys.modules:
+        return sys.modules[revision_module]
+    script_dir = tempfile.mkdtemp(prefix="fadl-rev-")
+    script_path = os.path.join(script_dir, revision_module + ".py")
+    with open(script_path, 'wb') as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location(revision_module, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[revision_module] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def machine_info():
+    """
+    What the timings were measured on, stored with every benchmark result. excel_reader and
+    excel_writer are the backends the scripts pick by default: python-calamine and XlsxWriter
+    when installed, openpyxl otherwise.
+    """
+    import platform
+    import numpy as np
+    import pandas as pd
+    installed = lambda package: importlib.util.find_spec(package) is not None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'excel_reader': "calamine" if installed('python_calamine') else "openpyxl",
+            'excel_writer': "xlsxwriter" if installed('xlsxwriter') else "openpyxl"}
+
+
+def time_stage(timings, stage, func, *args, **kwargs):
+    """Call func, add its wall time to timings[stage] and return its result."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings.setdefault(stage, []).append(time.perf_counter() - started)
+    return result
+
+
+def stage_summary(seconds, rows=None):
+    """Median and best of the repeats of a stage, with rows per second when rows is given."""
+    summary = {'median': round(statistics.median(seconds), 6), 'min': round(min(seconds), 6), 'repeats': len(seconds)}
+    if rows is not None:
+        summary['rows'] = rows
+        summary['rows_per_second'] = round(rows / summary['median']) if summary['median'] > 0 else None
+    return summary
+
+
+def write_results(path, suite, results):
+    """Save benchmark results as a JSON baseline."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document = {'suite': suite, 'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'machine': machine_info(), 'results': results}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+        f.write("\n")
+
+
+def compare_results(baseline_path, results, tolerance=0.25, min_seconds=0.01, backend_stages=None):
+    """
+    Print current against baseline median times per scenario and stage. A stage regressed when it
+    is more than tolerance (a fraction) slower and by more than min_seconds, which keeps timer
+    noise of very short stages out. backend_stages maps a machine_info backend ('excel_reader',
+    'excel_writer') to the stages that depend on it; those stages are shown but not counted when
+    the baseline used another backend. Returns the list of regressions.
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    machine = machine_info()
+    if baseline['machine'] != machine:
+        print(f"Note: the baseline was recorded on a different machine or library versions ({baseline['machine']}).")
+    other_backend = {}
+    for backend, stages in (backend_stages or {}).items():
+        if baseline['machine'].get(backend) != machine[backend]:
+            print(f"Note: the baseline used {baseline['machine'].get(backend, 'an unrecorded')} {backend.replace('_', ' ')}, this run {machine[backend]}; "
+                  f"{', '.join(stages)} not checked for regressions.")
+            other_backend.update(dict.fromkeys(stages, True))
+    regressions = []
+    print(f"{'Scenario':<28}{'Stage':<26}{'Baseline s':>12}{'Current s':>12}{'Ratio':>8}")
+    for scenario, current in results.items():
+        before = baseline['results'].get(scenario)
+        if before is None:
+            print(f"{scenario:<28}(not in the baseline)")
+            continue
+        for stage, timing in current['stages'].items():
+            if stage not in before['stages']:
+                continue
+            old, new = before['stages'][stage]['median'], timing['median']
+            ratio = new / old if old > 0 else float('inf')
+            regressed = ratio > 1 + tolerance and new - old > min_seconds and stage not in other_backend
+            if regressed:
+                regressions.append((scenario, stage, old, new))
+            flag = '  REGRESSION' if regressed else ('  (other backend)' if stage in other_backend else '')
+            print(f"{scenario:<28}{stage:<26}{old:>12.4f}{new:>12.4f}{ratio:>8.2f}{flag}")
+    return regressions
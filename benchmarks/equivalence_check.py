@@ -0,0 +1,677 @@
+"""
+Differential equivalence harness. Runs a reference and a candidate implementation side by side
+on recorded inputs and on randomized ones, and reports the first minute (Step 1) or row (Step 2)
+where they diverge. A faster implementation is only trusted once this passes.
+
+The reference is the script as committed at --reference-rev, by default BASELINE_REVISION (the
+scripts before the optimization series), and the candidate is the working tree. Revisions that
+predate the GUI-free processors are driven through their original Tk classes
+(LoadProcessorApp.perform_minute_wise_processing, FADLToExcelApp.parse_pdf_data) with a stub root
+and status logging switched off.
+
+Step 1 compares the minute-wise result (Availability, Load, Target Load, highlighting and LPM)
+of one month, exactly unless --rounding-tolerance is given. --reference-engine picks the engine
+of a reference revision that has several; --reference-rev working-tree compares two engines of
+the working tree. Every candidate LPM column is also checked against a plain re-computation of
+the LPM definition.
+
+The other Step 1 modes check the working tree against itself on randomized cases: --mode
+incremental reruns a month from its checkpoint after editing, inserting or deleting instructions
+and compares it with a full recompute; --mode all-months compares an All Months run over two or
+three months with one continuous run over the span; --mode sub-minute compares the whole-minute
+samples of a sub-minute run (of one month, or of All Months) with the minute result.
+
+    python benchmarks/equivalence_check.py step1
+    python benchmarks/equivalence_check.py step1 --reference-rev HEAD --reference-engine Segments --random 500
+    python benchmarks/equivalence_check.py step1 --reference-rev working-tree --reference-engine "Minute Loop"
+    python benchmarks/equivalence_check.py step1 --mode incremental --random 200
+    python benchmarks/equivalence_check.py step2 --reference-rev HEAD~1
+
+Step 2 compares the Annex 7 rows parse_pdf_data produces (with the meter and UCH lookups, each
+side building them with its own loaders). The exit code is 1 when any case diverges.
+"""
+import argparse
+import datetime
+import importlib.util
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common import REPO_DIR, load_step, load_step_at_revision
+
+STEP1_COLUMNS = ['Date Time Stamp', 'Availability', 'Load', 'Target Load', 'LPM (30 Min Sum)', 'Highlight_Row']
+# The last place of the columns Step 1 rounds. Only --rounding-tolerance allows a difference of
+# one such unit; by default every value must match exactly.
+STEP1_ROUNDING_UNITS = {'Availability': 0.01, 'Load': 0.001, 'LPM (30 Min Sum)': 0.001}
+RECORDED_INPUT = os.path.join(REPO_DIR, "Dispatch Instructions.xlsx")
+RECORDED_OUTPUT = os.path.join(REPO_DIR, "FADL Calculation.xlsx")
+BASELINE_REVISION = "2c3df03" # The step scripts as they were before the optimization series
+WORKING_TREE = "working-tree"
+
+
+class _StubRoot:
+    """Stands in for the Tk root of the original GUI classes: scheduled callbacks and redraws do nothing."""
+
+    def after(self, *args):
+        pass
+
+    def update_idletasks(self):
+        pass
+
+
+class _StubVar:
+    """A Tk variable holding a fixed value."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _SilentMessagebox:
+    showinfo = showwarning = showerror = staticmethod(lambda *args, **kwargs: None)
+
+
+def _quiet(*args):
+    pass
+
+
+def is_legacy(module):
+    """True for a step script from before the GUI-free LoadProcessor / AnnexConverter classes."""
+    return not hasattr(module, 'LoadProcessor') and not hasattr(module, 'AnnexConverter')
+
+
+def _is_blank(value):
+    """Missing, or an empty string: both end up as an empty cell in the output workbook."""
+    return pd.isna(value) or (isinstance(value, str) and not value.strip())
+
+
+def _same_value(reference, candidate, atol, rtol):
+    reference_missing, candidate_missing = _is_blank(reference), _is_blank(candidate)
+    if reference_missing or candidate_missing:
+        return reference_missing and candidate_missing
+    try:
+        reference_number, candidate_number = float(reference), float(candidate)
+    except (TypeError, ValueError):
+        return str(reference).strip() == str(candidate).strip()
+    return abs(reference_number - candidate_number) <= atol + rtol * abs(reference_number)
+
+
+def first_divergence(reference_df, candidate_df, columns, atol=1e-9, rtol=0.0, row_label=None, column_atol=None):
+    """
+    None when both frames agree on columns (numbers within atol + rtol * |reference|, missing
+    values only matching missing values), otherwise a description of the first divergent row
+    and the number of rows that differ. column_atol overrides atol for some columns.
+    """
+    if len(reference_df) != len(candidate_df):
+        return f"row count differs: reference {len(reference_df)}, candidate {len(candidate_df)}"
+    missing = [column for column in columns if column not in reference_df.columns or column not in candidate_df.columns]
+    if missing:
+        return f"column(s) missing: {', '.join(missing)}"
+    differing_rows = np.zeros(len(reference_df), dtype=bool)
+    first = None
+    for column in columns:
+        reference_values, candidate_values = reference_df[column].to_numpy(dtype=object), candidate_df[column].to_numpy(dtype=object)
+        column_tolerance = (column_atol or {}).get(column, atol)
+        differs = np.fromiter((not _same_value(r, c, column_tolerance, rtol) for r, c in zip(reference_values, candidate_values)),
+                              dtype=bool, count=len(reference_values))
+        if differs.any():
+            row = int(np.argmax(differs))
+            if first is None or row < first[0]:
+                first = (row, column, reference_values[row], candidate_values[row])
+            differing_rows |= differs
+    if first is None:
+        return None
+    row, column, reference_value, candidate_value = first
+    where = f"{row_label(row)} (row {row})" if row_label else f"row {row}"
+    return f"first divergence at {where} in '{column}': reference {reference_value!r}, candidate {candidate_value!r}; {int(differing_rows.sum())} row(s) differ"
+
+
+def reference_lpm(timestamps, load):
+    """LPM (30 Min Sum) straight from its definition: at every :00 and :30, the sum of Load / 30 over the 30 minutes up to it."""
+    timestamps = pd.DatetimeIndex(timestamps)
+    lpm = [pd.NA] * len(timestamps)
+    for i, stamp in enumerate(timestamps):
+        if stamp.minute % 30 == 0 and i >= 29:
+            lpm[i] = round(sum(load[i - 29:i + 1]) / 30.0, 5)
+    return lpm
+
+
+# --- Step 1 ---
+
+def write_table_inputs(folder, dispatch_df, availability_df, prefix="Case "):
+    """The inputs as a Parquet table pair (see input_table_paths). Returns the path to load."""
+    os.makedirs(folder, exist_ok=True)
+    dispatch_path = os.path.join(folder, f"{prefix}Dispatch Instructions.parquet")
+    dispatch_df.to_parquet(dispatch_path, index=False)
+    availability_df.to_parquet(os.path.join(folder, f"{prefix}Availability.parquet"), index=False)
+    return dispatch_path
+
+
+def random_step1_case(seed, gap_policies=None, month_start=None):
+    """
+    A random month of inputs and settings (of month_start, a random month by default). Instructions mix ramps, instantaneous targets,
+    Target Time Stamps that override or contradict the Ramp Duration, missing target times and
+    durations, repeated targets and FCBL post-ramp types; hours may lack availability
+    (including the first one, which then needs a custom start load). gap_policies limits the
+    availability gap policies drawn (the original scripts only know 'fallback').
+    """
+    rng = np.random.default_rng(seed)
+    month_start = pd.Timestamp(2024 + int(rng.integers(0, 2)), int(rng.integers(1, 13)), 1) if month_start is None else pd.Timestamp(month_start)
+    month_end = month_start + pd.DateOffset(months=1)
+    total_minutes = int((month_end - month_start) / pd.Timedelta(minutes=1))
+    hours = pd.date_range(month_start, month_end, freq='h', inclusive='left')
+    has_availability = rng.random(len(hours)) >= rng.choice([0.0, 0.02, 0.2, 0.6])
+    if rng.random() < 0.15:
+        has_availability[0] = False
+    availability = np.round(rng.uniform(300, 560, len(hours)), int(rng.choice([0, 2])))
+    availability_df = pd.DataFrame({'Availability Time Stamp': hours, 'Date': hours.normalize(),
+                                    'From - To': "", 'Final Availability': availability})[has_availability]
+
+    count = int(rng.integers(0, 60))
+    special = [0, total_minutes - 1] + [60 * int(h) for h in rng.integers(0, len(hours), 3)]
+    candidates = np.unique(np.concatenate([rng.choice(total_minutes, size=count, replace=False), rng.choice(special, size=min(2, count))])) if count else np.array([], dtype=int)
+    fcbl_share = rng.choice([0.0, 0.3, 0.7, 1.0])
+    rows, previous_target = [], None
+    for minute in candidates:
+        notification = month_start + pd.Timedelta(minutes=int(minute))
+        duration = float(rng.integers(1, 40))
+        kind = rng.choice(['ramp', 'instant', 'override', 'past', 'no-target'], p=[0.45, 0.15, 0.15, 0.1, 0.15])
+        target_time = {'ramp': notification + pd.Timedelta(minutes=duration), 'instant': notification,
+                       'override': notification + pd.Timedelta(minutes=duration + int(rng.integers(2, 30))),
+                       'past': notification - pd.Timedelta(minutes=int(rng.integers(1, 10))), 'no-target': pd.NaT}[kind]
+        if rng.random() < 0.05:
+            duration = rng.choice([0.0, -5.0, np.nan])
+        target = previous_target if previous_target is not None and rng.random() < 0.15 else float(np.round(rng.uniform(0, 600), int(rng.choice([0, 1]))))
+        previous_target = target
+        rows.append({'Notification Time': notification, 'Target Time Stamp': target_time, 'Minutes': duration,
+                     'Availability': "", 'Target Load': "FCBL" if rng.random() < fcbl_share else f"{target:g}",
+                     'Target Demand (MW)': target})
+    dispatch_df = pd.DataFrame(rows, columns=['Notification Time', 'Target Time Stamp', 'Minutes', 'Availability', 'Target Load', 'Target Demand (MW)'])
+    dispatch_df['Notification Time'] = pd.to_datetime(dispatch_df['Notification Time'])
+    dispatch_df['Target Time Stamp'] = pd.to_datetime(dispatch_df['Target Time Stamp'])
+    if dispatch_df.empty: # The month is found from Col A, so keep one instruction
+        dispatch_df.loc[0] = [month_start + pd.Timedelta(hours=12), pd.NaT, 5.0, "", "400", 400.0]
+    custom = not has_availability[0] or rng.random() < 0.3
+    settings = {'start_load_type': "Custom" if custom else "FinalAvailabilityHourly",
+                'custom_load': float(np.round(rng.uniform(0, 600), 1)) if custom else 0.0,
+                'gap_policy': str(rng.choice(gap_policies or ['fallback', 'ffill']))}
+    description = (f"seed {seed}: {month_start:%b-%y}, {len(dispatch_df)} instructions, {int((~has_availability).sum())} hours without availability, "
+                   f"{'custom start ' + format(settings['custom_load'], 'g') + ' MW' if custom else 'availability start'}, gap policy {settings['gap_policy']}")
+    return dispatch_df, availability_df, month_start.strftime('%b-%y'), settings, description
+
+
+def write_workbook_inputs(folder, dispatch_df, availability_df, prefix="Case "):
+    """The inputs as an input workbook with the two sheets, which every revision can read. Returns its path."""
+    os.makedirs(folder, exist_ok=True)
+    workbook_path = os.path.join(folder, f"{prefix}Dispatch Instructions.xlsx")
+    with pd.ExcelWriter(workbook_path, datetime_format='YYYY-MM-DD HH:MM:SS') as writer:
+        dispatch_df.to_excel(writer, sheet_name="Dispatch Instructions", index=False)
+        availability_df.to_excel(writer, sheet_name="Availability", index=False)
+    return workbook_path
+
+
+def legacy_step1_month_result(module, input_path, month_label, settings):
+    """
+    step1_month_result for a revision with only the Tk LoadProcessorApp: the steps of its
+    _processing_logic up to perform_minute_wise_processing, without a window.
+    """
+    module.messagebox = _SilentMessagebox
+    app = module.LoadProcessorApp.__new__(module.LoadProcessorApp)
+    app.root = _StubRoot()
+    app.status_log = app.status_log_safe = app.update_progress_safe = _quiet
+    start_load_type = settings.get('start_load_type', "FinalAvailabilityHourly")
+    app.start_load_type_var = _StubVar(start_load_type)
+    app.availability_series_hourly_lookup = None
+    try:
+        _, _, available_months = app.read_excel_data(input_path)
+        if month_label not in available_months:
+            return ('error', f"{month_label} not in the input")
+        app._prepare_hourly_availability_lookup()
+        month_dt = datetime.datetime.strptime(month_label, '%b-%y')
+        start_load = step1_start_load(app, month_dt, settings)
+        if start_load is None:
+            return ('error', "no availability for the first hour")
+        month_end = month_dt + pd.DateOffset(months=1)
+        dispatch_df_month = pd.DataFrame()
+        if app.df_dispatch is not None and not app.df_dispatch.empty:
+            dispatch_dates = app.df_dispatch.iloc[:, 0]
+            dispatch_df_month = app.df_dispatch[(dispatch_dates >= month_dt) & (dispatch_dates < month_end)].copy()
+        # The original parser converts columns in place through iloc, which pandas 2 allowed by
+        # upcasting and pandas 3 refuses for an all-numeric or all-empty column; object columns take any value
+        dispatch_df_month = dispatch_df_month.astype(object)
+        return app.perform_minute_wise_processing(dispatch_df_month, app.df_availability, month_dt, start_load)
+    except Exception as e:
+        return ('error', f"{type(e).__name__}: {e}")
+
+
+def step1_start_load(processor, month_dt, settings):
+    """The start load of a run from month_dt: the custom load, or the availability of its first hour (None when there is none)."""
+    if settings.get('start_load_type') == "Custom":
+        return settings.get('custom_load', 0.0)
+    return processor.get_initial_availability_load(month_dt)
+
+
+def step1_month_result(module, input_path, month_label, engine, settings, checkpoint_dir=None):
+    """
+    The minute-wise result of one month from module's LoadProcessor, or the error it raised as
+    ('error', text). With checkpoint_dir the run is incremental, with its checkpoints kept there.
+    """
+    if is_legacy(module):
+        return legacy_step1_month_result(module, input_path, month_label, settings)
+    logger = logging.getLogger("fadl.equivalence")
+    try:
+        processor = module.LoadProcessor(logger, engine=engine, use_input_cache=False, incremental=checkpoint_dir is not None, **settings)
+        if checkpoint_dir is not None:
+            processor.checkpoint_store = module.RunCheckpointStore(checkpoint_dir)
+        if month_label not in processor.load_input(input_path):
+            return ('error', f"{month_label} not in the input")
+        month_dt = datetime.datetime.strptime(month_label, '%b-%y')
+        start_load = step1_start_load(processor, month_dt, settings)
+        if start_load is None:
+            return ('error', "no availability for the first hour")
+        month_end = month_dt + pd.DateOffset(months=1)
+        dispatch_dates = processor.df_dispatch.iloc[:, 0]
+        dispatch_df_month = processor.df_dispatch[(dispatch_dates >= month_dt) & (dispatch_dates < month_end)].copy()
+        return processor.perform_minute_wise_processing(dispatch_df_month, processor.df_availability, month_dt, start_load)
+    except Exception as e:
+        return ('error', f"{type(e).__name__}: {e}")
+
+
+def compare_step1(reference, candidate, atol, rtol, column_atol=None):
+    """Divergence text for two step1_month_result results (frames or errors), None when they agree."""
+    if isinstance(reference, tuple) or isinstance(candidate, tuple):
+        return None if (isinstance(reference, tuple) and isinstance(candidate, tuple)) else f"only one side failed: reference {reference if isinstance(reference, tuple) else 'ok'}, candidate {candidate if isinstance(candidate, tuple) else 'ok'}"
+    stamps = pd.DatetimeIndex(reference['Date Time Stamp'])
+    divergence = first_divergence(reference, candidate, STEP1_COLUMNS, atol, rtol, row_label=lambda row: f"{stamps[row]:%d-%m-%Y %H:%M}", column_atol=column_atol)
+    if divergence is None:
+        lpm_check = pd.DataFrame({'LPM (30 Min Sum)': reference_lpm(candidate['Date Time Stamp'], candidate['Load'].to_numpy(dtype=np.float64))})
+        divergence = first_divergence(lpm_check, candidate[['LPM (30 Min Sum)']], ['LPM (30 Min Sum)'], atol, rtol,
+                                      row_label=lambda row: f"{stamps[row]:%d-%m-%Y %H:%M}", column_atol=column_atol)
+        if divergence is not None:
+            divergence = "candidate LPM does not match its definition: " + divergence
+    return divergence
+
+
+def run_step1(args, reference_module, candidate_module):
+    failures = 0
+    cases = 0
+    column_atol = {column: max(args.atol, unit * (1 + 1e-9)) for column, unit in STEP1_ROUNDING_UNITS.items()} if args.rounding_tolerance else None
+    legacy_reference = is_legacy(reference_module)
+
+    def check(description, input_path, month_label, settings):
+        nonlocal failures, cases
+        cases += 1
+        reference = step1_month_result(reference_module, input_path, month_label, args.reference_engine, settings)
+        candidate = step1_month_result(candidate_module, input_path, month_label, args.candidate_engine, settings)
+        divergence = compare_step1(reference, candidate, args.atol, args.rtol, column_atol)
+        if divergence is None:
+            if args.verbose:
+                print(f"OK    {description}")
+            return True
+        failures += 1
+        print(f"FAIL  {description}\n      {divergence}")
+        return False
+
+    for input_path in args.recorded:
+        probe = candidate_module.LoadProcessor(logging.getLogger("fadl.equivalence"), use_input_cache=False)
+        for month_label in probe.load_input(input_path):
+            check(f"recorded {os.path.basename(input_path)} {month_label}", input_path, month_label, {})
+    if args.recorded_output:
+        recorded = pd.read_excel(args.recorded_output, sheet_name='FADL_Calculation')
+        month_label = pd.Timestamp(recorded['Date Time Stamp'].iloc[0]).strftime('%b-%y')
+        candidate = step1_month_result(candidate_module, args.recorded[0] if args.recorded else RECORDED_INPUT, month_label, args.candidate_engine, {})
+        cases += 1
+        columns = [column for column in STEP1_COLUMNS if column in recorded.columns]
+        stamps = pd.DatetimeIndex(recorded['Date Time Stamp'])
+        divergence = "candidate failed: " + candidate[1] if isinstance(candidate, tuple) else first_divergence(
+            recorded, candidate, columns, args.atol, args.rtol, row_label=lambda row: f"{stamps[row]:%d-%m-%Y %H:%M}", column_atol=column_atol)
+        if divergence is None:
+            print(f"OK    recorded output {os.path.basename(args.recorded_output)} ({month_label}) reproduced by the candidate")
+        else:
+            failures += 1
+            print(f"FAIL  recorded output {os.path.basename(args.recorded_output)} ({month_label})\n      {divergence}")
+
+    with tempfile.TemporaryDirectory(prefix="fadl-equivalence-") as work_dir:
+        for seed in range(args.seed, args.seed + args.random):
+            dispatch_df, availability_df, month_label, settings, description = random_step1_case(seed, gap_policies=['fallback'] if legacy_reference else None)
+            case_dir = os.path.join(work_dir, str(seed))
+            write_inputs = write_workbook_inputs if legacy_reference else write_table_inputs # Older revisions only read workbooks
+            input_path = write_inputs(case_dir, dispatch_df, availability_df)
+            if not check(description, input_path, month_label, settings) and args.keep_failures:
+                shutil.copytree(case_dir, os.path.join(args.keep_failures, f"step1 seed {seed}"), dirs_exist_ok=True)
+            shutil.rmtree(case_dir)
+    return cases, failures
+
+
+# --- Step 1 modes: incremental reruns, All Months and sub-minute steps against plain runs ---
+
+def edit_step1_instructions(dispatch_df, month_label, rng):
+    """dispatch_df with one to three instructions edited (target or ramp duration), inserted or deleted, and a description of the edits."""
+    edited = dispatch_df.reset_index(drop=True)
+    month_start = pd.Timestamp(datetime.datetime.strptime(month_label, '%b-%y'))
+    total_minutes = int((month_start + pd.DateOffset(months=1) - month_start) / pd.Timedelta(minutes=1))
+    edits = []
+    for _ in range(int(rng.integers(1, 4))):
+        kind = rng.choice(['edit', 'insert', 'delete'] if len(edited) > 1 else ['edit', 'insert'])
+        if kind == 'insert':
+            notification = month_start + pd.Timedelta(minutes=int(rng.integers(0, total_minutes)))
+            if (edited['Notification Time'] == notification).any():
+                continue
+            duration = float(rng.integers(1, 40))
+            target = float(np.round(rng.uniform(0, 600), 1))
+            row = pd.DataFrame([{'Notification Time': notification, 'Target Time Stamp': notification + pd.Timedelta(minutes=duration), 'Minutes': duration,
+                                 'Availability': "", 'Target Load': "FCBL" if rng.random() < 0.2 else f"{target:g}", 'Target Demand (MW)': target}])
+            edited = pd.concat([edited, row], ignore_index=True).sort_values('Notification Time', kind='stable').reset_index(drop=True)
+            edits.append(f"inserted {notification:%d %H:%M}")
+            continue
+        row = int(rng.integers(0, len(edited)))
+        notification = pd.Timestamp(edited.loc[row, 'Notification Time'])
+        if kind == 'delete':
+            edited = edited.drop(index=row).reset_index(drop=True)
+            edits.append(f"deleted {notification:%d %H:%M}")
+        elif rng.random() < 0.5:
+            target = float(np.round(rng.uniform(0, 600), 1))
+            edited.loc[row, 'Target Demand (MW)'] = target
+            if edited.loc[row, 'Target Load'] != "FCBL":
+                edited.loc[row, 'Target Load'] = f"{target:g}"
+            edits.append(f"new target at {notification:%d %H:%M}")
+        else:
+            duration = float(rng.integers(1, 40))
+            edited.loc[row, 'Minutes'] = duration
+            edited.loc[row, 'Target Time Stamp'] = notification + pd.Timedelta(minutes=duration)
+            edits.append(f"new ramp duration at {notification:%d %H:%M}")
+    return edited, ", ".join(edits) or "no edit"
+
+
+def incremental_case(args, module, case_dir, seed):
+    """
+    Run a random month incrementally, edit its instructions and rerun it from the checkpoint;
+    the rerun must match a full recompute of the edited input. Returns the case description,
+    the divergence (None when they match) and the minutes the rerun reused.
+    """
+    dispatch_df, availability_df, month_label, settings, description = random_step1_case(seed)
+    checkpoint_dir = os.path.join(case_dir, "checkpoints")
+    input_path = write_table_inputs(case_dir, dispatch_df, availability_df)
+    first_run = step1_month_result(module, input_path, month_label, "Segments", settings, checkpoint_dir)
+    if isinstance(first_run, tuple):
+        return description, None, 0
+    edited_df, edits = edit_step1_instructions(dispatch_df, month_label, np.random.default_rng([seed, 1]))
+    write_table_inputs(case_dir, edited_df, availability_df)
+    rerun = step1_month_result(module, input_path, month_label, "Segments", settings, checkpoint_dir)
+    full = step1_month_result(module, input_path, month_label, "Segments", settings)
+    checkpoint = module.RunCheckpointStore(checkpoint_dir).load(input_path, month_label)
+    reused_minutes = checkpoint['reused_minutes'] if checkpoint is not None else 0
+    return f"{description}; {edits}, rerun reused {reused_minutes} minute(s)", compare_step1(full, rerun, args.atol, args.rtol), reused_minutes
+
+
+def random_step1_span(seed):
+    """Random inputs over two or three consecutive months (each a random_step1_case), with the settings of the first."""
+    rng = np.random.default_rng([seed, 2])
+    first_month = pd.Timestamp(2024 + int(rng.integers(0, 2)), int(rng.integers(1, 13)), 1)
+    cases = [random_step1_case(seed * 10 + number, month_start=first_month + pd.DateOffset(months=number)) for number in range(int(rng.integers(2, 4)))]
+    dispatch_df = pd.concat([case[0] for case in cases], ignore_index=True)
+    availability_df = pd.concat([case[1] for case in cases], ignore_index=True)
+    settings = cases[0][3]
+    description = (f"seed {seed}: {cases[0][2]} to {cases[-1][2]}, {len(dispatch_df)} instructions, "
+                   f"{'custom start ' + format(settings['custom_load'], 'g') + ' MW' if settings['start_load_type'] == 'Custom' else 'availability start'}, gap policy {settings['gap_policy']}")
+    return dispatch_df, availability_df, settings, description
+
+
+def step1_span_result(module, input_path, engine, settings, all_months):
+    """
+    The minute-wise result over every month of the input: from process_all_months (all_months),
+    or from one continuous run of engine over the whole span, as if it were one long month.
+    ('error', text) when the run fails.
+    """
+    try:
+        processor = module.LoadProcessor(logging.getLogger("fadl.equivalence"), engine=engine, use_input_cache=False, incremental=False, **settings)
+        processor.load_input(input_path)
+        month_starts = processor._dispatch_month_range()
+        start_load = step1_start_load(processor, month_starts[0], settings)
+        if start_load is None:
+            return ('error', "no availability for the first hour")
+        if all_months:
+            return processor.process_all_months(month_starts, start_load)
+        span_end = pd.Timestamp(month_starts[-1]) + pd.DateOffset(months=1)
+        timestamps = pd.date_range(month_starts[0], span_end, freq='min', inclusive='left')
+        parsed_instructions = processor._month_instructions(month_starts[0], span_end)
+        is_following_fcbl_directive = processor.settings['start_load_type'] == "FinalAvailabilityHourly"
+        if engine == "Minute Loop":
+            results_df = processor._run_minute_loop(timestamps, parsed_instructions, start_load, is_following_fcbl_directive)
+        else:
+            results_df, _ = processor._run_segment_engine(timestamps, parsed_instructions, month_starts[0], start_load, is_following_fcbl_directive)
+        results_df['Target Load'], results_df['Highlight_Row'] = module.mark_instruction_windows(results_df['Date Time Stamp'], parsed_instructions)
+        lpm_half_hourly = module.compute_lpm_half_hourly(results_df['Date Time Stamp'], results_df['Load'].to_numpy(dtype=np.float64))
+        results_df['LPM (30 Min Sum)'] = module.lpm_column(results_df['Date Time Stamp'], lpm_half_hourly)
+        return results_df
+    except Exception as e:
+        return ('error', f"{type(e).__name__}: {e}")
+
+
+def all_months_case(args, module, case_dir, seed):
+    """Process a random span of months as All Months; it must match one continuous run of --reference-engine over the span."""
+    dispatch_df, availability_df, settings, description = random_step1_span(seed)
+    input_path = write_table_inputs(case_dir, dispatch_df, availability_df)
+    reference = step1_span_result(module, input_path, args.reference_engine, settings, all_months=False)
+    candidate = step1_span_result(module, input_path, "Segments", settings, all_months=True)
+    return description, compare_step1(reference, candidate, args.atol, args.rtol), None
+
+
+def sub_minute_case(args, module, case_dir, seed):
+    """
+    Process a random month (a span of months as All Months for odd seeds) in a sub-minute step;
+    its whole-minute samples must match the minute result of the same run.
+    """
+    sub_minute_steps = [step for step in module.STEP_SECONDS_CHOICES if step < 60]
+    step_seconds = sub_minute_steps[seed % len(sub_minute_steps)]
+    if seed % 2:
+        dispatch_df, availability_df, settings, description = random_step1_span(seed)
+        month_label = module.ALL_MONTHS_LABEL
+    else:
+        dispatch_df, availability_df, month_label, settings, description = random_step1_case(seed)
+    input_path = write_table_inputs(case_dir, dispatch_df, availability_df)
+    if month_label == module.ALL_MONTHS_LABEL:
+        minute_result = step1_span_result(module, input_path, "Segments", settings, all_months=True)
+    else:
+        minute_result = step1_month_result(module, input_path, month_label, "Segments", settings)
+    output_format = "Parquet" if importlib.util.find_spec('pyarrow') is not None else "CSV"
+    processor = module.LoadProcessor(logging.getLogger("fadl.equivalence"), use_input_cache=False, incremental=False, step_seconds=step_seconds,
+                                     write_excel=False, columnar_format=output_format, run_report=False, export_dir=case_dir, **settings)
+    processor.metrics_file = None
+    processor.load_input(input_path)
+    description = f"{description}, {step_seconds} s step"
+    if not processor.process_month(month_label):
+        return description, None if isinstance(minute_result, tuple) else "only the sub-minute run failed", None
+    if isinstance(minute_result, tuple):
+        return description, f"only the minute run failed: {minute_result[1]}", None
+    samples_path = os.path.join(case_dir, f"{os.path.splitext(module.DEFAULT_OUTPUT_FILE_NAME)[0]} - {step_seconds}s{module.COLUMNAR_FORMATS[output_format]}")
+    samples = pd.read_parquet(samples_path) if output_format == "Parquet" else pd.read_csv(samples_path, parse_dates=['Date Time Stamp'])
+    whole_minutes = samples[samples['Date Time Stamp'].dt.second == 0].reset_index(drop=True)
+    stamps = pd.DatetimeIndex(minute_result['Date Time Stamp'])
+    columns = [column for column in STEP1_COLUMNS if column != 'LPM (30 Min Sum)'] # Sub-minute runs give LPM only in the half-hourly summary
+    return description, first_divergence(minute_result, whole_minutes, columns, args.atol, args.rtol, row_label=lambda row: f"{stamps[row]:%d-%m-%Y %H:%M}"), None
+
+
+STEP1_MODE_CASES = {'incremental': incremental_case, 'all-months': all_months_case, 'sub-minute': sub_minute_case}
+
+
+def run_step1_mode(args, module):
+    """Randomized cases of one of STEP1_MODE_CASES on the working tree."""
+    failures = 0
+    cases = 0
+    resumed = 0
+    with tempfile.TemporaryDirectory(prefix="fadl-equivalence-") as work_dir:
+        for seed in range(args.seed, args.seed + args.random):
+            case_dir = os.path.join(work_dir, str(seed))
+            description, divergence, reused_minutes = STEP1_MODE_CASES[args.mode](args, module, case_dir, seed)
+            cases += 1
+            resumed += bool(reused_minutes)
+            if divergence is None:
+                if args.verbose:
+                    print(f"OK    {description}")
+            else:
+                failures += 1
+                print(f"FAIL  {description}\n      {divergence}")
+                if args.keep_failures:
+                    shutil.copytree(case_dir, os.path.join(args.keep_failures, f"step1 {args.mode} seed {seed}"), dirs_exist_ok=True)
+            shutil.rmtree(case_dir)
+    if args.mode == 'incremental':
+        print(f"{resumed} of {cases} rerun(s) resumed from a checkpoint instead of starting at the first minute.")
+    return cases, failures
+
+
+# --- Step 2 ---
+
+def random_step2_case(folder, seed):
+    """Random Step 2 inputs in folder: meter files, an Annex 7 PDF with irregular lines and a FADL_Calculation output."""
+    import step2_benchmark
+    rng = np.random.default_rng(seed)
+    days = int(rng.integers(1, 4))
+    fixtures = step2_benchmark.write_fixtures(folder, meters=int(rng.integers(1, 6)), days=days, pages=1, seed=seed)
+    lines = step2_benchmark.annex7_lines(days * 48 + int(rng.integers(0, 20)), seed=seed)
+    varied = []
+    for line in lines:
+        roll = rng.random()
+        if roll < 0.1: # No Time To: parse_pdf_data infers it from the 30 minute rule
+            parts = line.split()
+            time_position = 1 if '-' in parts[0] else 0
+            line = " ".join(parts[:time_position + 1] + parts[time_position + 2:])
+        elif roll < 0.15:
+            varied.append("Total / Page heading / Signature")
+        elif roll < 0.2: # No rate column
+            line = line.rsplit(" ", 1)[0]
+        varied.append(line)
+    pages = [varied[start:start + 50] for start in range(0, len(varied), 50)] or [["Annex 7"]]
+    step2_benchmark.write_text_pdf(fixtures['pdf'], pages)
+    return fixtures, f"seed {seed}: {len(fixtures['lp_files'])} meters, {days} days, {len(varied)} Annex 7 lines"
+
+
+def legacy_annex_converter(module):
+    """The Tk FADLToExcelApp of a revision without AnnexConverter, without its window and with update_status silenced."""
+    module.messagebox = _SilentMessagebox
+    app = module.FADLToExcelApp.__new__(module.FADLToExcelApp)
+    app.root = _StubRoot()
+    app.update_status = _quiet
+    return app
+
+
+def annex7_rows(module, pdf, lp_folder, uch):
+    """The Annex 7 frame module's converter builds from the inputs, or ('error', text)."""
+    try:
+        if is_legacy(module):
+            converter = legacy_annex_converter(module)
+        else:
+            converter = module.AnnexConverter(logging.getLogger("fadl.equivalence"))
+            converter.use_pdf_cache = False # Compare the extraction itself, not what an earlier run cached
+        meter_df = converter.process_lp_files_folder(lp_folder) if lp_folder else pd.DataFrame()
+        meter_lookup = None
+        if not meter_df.empty:
+            meter_df['Timestamp'] = pd.to_datetime(meter_df['Timestamp'])
+            meter_lookup = meter_df.set_index('Timestamp')
+        uch_lookup = converter.load_uch_excel_data(uch) if uch else None
+        return converter.parse_pdf_data(converter.extract_text_from_pdf(pdf), meter_lookup, uch_lookup)
+    except Exception as e:
+        return ('error', f"{type(e).__name__}: {e}")
+
+
+def run_step2(args, reference_module, candidate_module):
+    failures = 0
+    cases = 0
+
+    def check(description, pdf, lp_folder, uch):
+        nonlocal failures, cases
+        cases += 1
+        reference = annex7_rows(reference_module, pdf, lp_folder, uch)
+        candidate = annex7_rows(candidate_module, pdf, lp_folder, uch)
+        if isinstance(reference, tuple) or isinstance(candidate, tuple):
+            divergence = None if isinstance(reference, tuple) and isinstance(candidate, tuple) else f"only one side failed: {reference if isinstance(reference, tuple) else candidate}"
+        elif list(reference.columns) != list(candidate.columns):
+            divergence = f"columns differ: reference {list(reference.columns)}, candidate {list(candidate.columns)}"
+        else:
+            divergence = first_divergence(reference.reset_index(drop=True), candidate.reset_index(drop=True), list(reference.columns), args.atol, args.rtol,
+                                          row_label=lambda row: f"{reference['Date'].iloc[row]} {reference['Time From'].iloc[row]}")
+        if divergence is None:
+            if args.verbose:
+                print(f"OK    {description}")
+            return True
+        failures += 1
+        print(f"FAIL  {description}\n      {divergence}")
+        return False
+
+    if args.pdf:
+        check(f"recorded {os.path.basename(args.pdf)}", args.pdf, args.lp_folder, args.uch)
+    with tempfile.TemporaryDirectory(prefix="fadl-equivalence-") as work_dir:
+        for seed in range(args.seed, args.seed + args.random):
+            case_dir = os.path.join(work_dir, str(seed))
+            fixtures, description = random_step2_case(case_dir, seed)
+            if not check(description, fixtures['pdf'], fixtures['lp_folder'], fixtures['uch']) and args.keep_failures:
+                shutil.copytree(case_dir, os.path.join(args.keep_failures, f"step2 seed {seed}"), dirs_exist_ok=True)
+            shutil.rmtree(case_dir)
+    return cases, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that a candidate implementation gives the same results as the reference.")
+    parser.add_argument("step", choices=["step1", "step2"])
+    parser.add_argument("--mode", default="engines", choices=["engines"] + list(STEP1_MODE_CASES),
+                        help="Step 1: 'engines' compares the reference with the candidate; the other modes check the working tree's "
+                             "incremental reruns, All Months runs or sub-minute runs against plain runs on randomized cases.")
+    parser.add_argument("--reference-rev", default=BASELINE_REVISION,
+                        help=f"Git revision whose script is the reference, or {WORKING_TREE!r} for step1 engine against engine. Default: {BASELINE_REVISION} (before the optimizations).")
+    parser.add_argument("--reference-engine", default="Minute Loop", choices=["Segments", "Minute Loop"],
+                        help="Step 1 reference engine, for revisions that have engines, and the engine of the continuous run in --mode all-months.")
+    parser.add_argument("--candidate-engine", default="Segments", choices=["Segments", "Minute Loop"], help="Step 1 candidate engine.")
+    parser.add_argument("--random", type=int, default=100, help="Randomized cases to run.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first randomized case; a failing case is rerun with --seed N --random 1.")
+    parser.add_argument("--atol", type=float, default=1e-9, help="Absolute tolerance for numbers.")
+    parser.add_argument("--rtol", type=float, default=0.0, help="Relative tolerance for numbers.")
+    parser.add_argument("--rounding-tolerance", action="store_true", help="Step 1: allow one unit in the last place of the rounded columns (see STEP1_ROUNDING_UNITS).")
+    parser.add_argument("--recorded", nargs="*", help=f"Step 1 input workbooks whose every month is compared. Default: {os.path.basename(RECORDED_INPUT)}.")
+    parser.add_argument("--recorded-output", help=f"Step 1 output the candidate must reproduce from the first recorded input. Default: {os.path.basename(RECORDED_OUTPUT)}.")
+    parser.add_argument("--pdf", help="Step 2: a recorded Annex 7 PDF to compare (with --lp-folder and --uch).")
+    parser.add_argument("--lp-folder")
+    parser.add_argument("--uch")
+    parser.add_argument("--keep-failures", metavar="FOLDER", help="Copy the inputs of failing randomized cases here.")
+    parser.add_argument("--verbose", action="store_true", help="Also list the cases that match.")
+    args = parser.parse_args(argv)
+    logging.getLogger("fadl.equivalence").setLevel(logging.CRITICAL) # The processors' own status lines are not needed here
+
+    if args.step == "step1" and args.mode != "engines":
+        candidate_module = load_step('fadl_step1')
+        reference = {'incremental': "full recomputes", 'all-months': f"one continuous {args.reference_engine} run over the span",
+                     'sub-minute': "the minute result"}[args.mode]
+        print(f"Step 1 {args.mode}: working tree against {reference}, exact")
+        cases, failures = run_step1_mode(args, candidate_module)
+    elif args.step == "step1":
+        if args.recorded is None:
+            args.recorded = [RECORDED_INPUT] if os.path.exists(RECORDED_INPUT) else []
+        if args.recorded_output is None and args.recorded == [RECORDED_INPUT] and os.path.exists(RECORDED_OUTPUT):
+            args.recorded_output = RECORDED_OUTPUT
+        candidate_module = load_step('fadl_step1')
+        reference_module = candidate_module if args.reference_rev == WORKING_TREE else load_step_at_revision('fadl_step1', args.reference_rev)
+        reference_engine = "original minute loop" if is_legacy(reference_module) else args.reference_engine
+        print(f"Step 1: reference {args.reference_rev} ({reference_engine}), candidate working tree ({args.candidate_engine})"
+              f"{', last-place rounding tolerated' if args.rounding_tolerance else ', exact'}")
+        cases, failures = run_step1(args, reference_module, candidate_module)
+    else:
+        if args.mode != "engines":
+            parser.error("--mode is a step1 option")
+        if args.reference_rev == WORKING_TREE:
+            parser.error("step2 has no engines to compare; give a git revision as --reference-rev")
+        candidate_module = load_step('fadl_step2')
+        reference_module = load_step_at_revision('fadl_step2', args.reference_rev)
+        print(f"Step 2: reference {args.reference_rev}, candidate working tree")
+        cases, failures = run_step2(args, reference_module, candidate_module)
+    print(f"{cases - failures} of {cases} case(s) match{'' if failures else '.'}{f', {failures} diverge.' if failures else ''}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
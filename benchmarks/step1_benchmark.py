@@ -0,0 +1,189 @@
+"""
+Step 1 benchmark suite. Generates synthetic input workbooks ('Dispatch Instructions' and
+'Availability' laid out like the real ones) and times each stage of a run separately:
+read_excel_data, _prepare_instruction_table, _prepare_hourly_availability_lookup,
+perform_minute_wise_processing (or
+process_all_months for multi-month scenarios), the LPM pass and save_output_excel.
+
+    python benchmarks/step1_benchmark.py                                   # every scenario
+    python benchmarks/step1_benchmark.py --scenario dense --engine "Minute Loop"
+    python benchmarks/step1_benchmark.py --engine Segments --engine "Minute Loop" --save benchmarks/baselines/step1.json
+    python benchmarks/step1_benchmark.py --compare benchmarks/baselines/step1.json
+
+With both engines, the speedup of the Segments engine over the Minute Loop is printed per
+scenario; the saved baseline holds both. --compare exits with 1 when a stage got slower than
+the baseline by more than --tolerance.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common import compare_results, load_step, stage_summary, time_stage, write_results
+
+step1 = load_step('fadl_step1')
+
+# Instruction density is per day; fcbl_share is the share of instructions that hand over to
+# FCBL after the ramp, gap_share the share of hours without availability.
+SCENARIOS = {
+    'typical': {'months': 1, 'instructions_per_day': 6, 'fcbl_share': 0.4, 'gap_share': 0.0},
+    'sparse': {'months': 1, 'instructions_per_day': 1, 'fcbl_share': 0.4, 'gap_share': 0.0},
+    'dense': {'months': 1, 'instructions_per_day': 48, 'fcbl_share': 0.4, 'gap_share': 0.0},
+    'all-fcbl': {'months': 1, 'instructions_per_day': 6, 'fcbl_share': 1.0, 'gap_share': 0.0},
+    'gaps': {'months': 1, 'instructions_per_day': 6, 'fcbl_share': 0.4, 'gap_share': 0.1},
+    'february': {'months': 1, 'instructions_per_day': 6, 'fcbl_share': 0.4, 'gap_share': 0.0, 'month_start': "2025-02-01"},
+    'quarter': {'months': 3, 'instructions_per_day': 6, 'fcbl_share': 0.4, 'gap_share': 0.0},
+}
+DEFAULT_MONTH_START = "2025-05-01"
+STAGES = ['read_excel_data', 'prepare_instructions', 'prepare_availability', 'minute_wise_processing', 'lpm', 'save_output_excel']
+BACKEND_STAGES = {'excel_reader': ['read_excel_data'], 'excel_writer': ['save_output_excel']} # See compare_results
+
+
+def synthetic_inputs(month_start=DEFAULT_MONTH_START, months=1, instructions_per_day=6, fcbl_share=0.4, gap_share=0.0, seed=0):
+    """
+    Dispatch Instructions and Availability frames for months consecutive months. Instructions
+    fall on random minutes with 1-15 minute ramps; one in ten is instantaneous (Target Time
+    Stamp = Notification Time) and one in ten has no Target Time Stamp. gap_share of the hours
+    (never the first) have no availability row.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(month_start)
+    end = start + pd.DateOffset(months=months)
+    hours = pd.date_range(start, end, freq='h', inclusive='left')
+    hourly_availability = np.clip(np.round(rng.normal(520, 15, len(hours))), 300, 560).astype(int)
+    has_availability = rng.random(len(hours)) >= gap_share
+    has_availability[0] = True # The Availability start load is read from the first hour
+    availability_df = pd.DataFrame({
+        'Availability Time Stamp': hours, 'Date': hours.normalize(),
+        'From - To': [f"{h:%H:%M} - {h + pd.Timedelta(hours=1):%H:%M}" for h in hours],
+        'Final Availability': hourly_availability,
+    })[has_availability].reset_index(drop=True)
+
+    total_minutes = int((end - start) / pd.Timedelta(minutes=1))
+    count = min(total_minutes, rng.poisson(instructions_per_day * total_minutes / 1440))
+    minutes = np.sort(rng.choice(total_minutes, size=count, replace=False))
+    notification = start + pd.to_timedelta(minutes, unit='min')
+    ramp_minutes = rng.integers(1, 16, count)
+    kind = rng.random(count)
+    target_time = pd.Series(notification + pd.to_timedelta(ramp_minutes, unit='min'))
+    target_time[kind < 0.1] = notification[kind < 0.1]
+    target_time[(kind >= 0.1) & (kind < 0.2)] = pd.NaT
+    target_mw = rng.integers(280, 541, count)
+    is_fcbl = rng.random(count) < fcbl_share
+    dispatch_df = pd.DataFrame({
+        'Notification Time': notification, 'Target Time Stamp': target_time, 'Minutes': ramp_minutes.astype(float),
+        'Availability': hourly_availability[minutes // 60],
+        'Target Load': ["FCBL" if fcbl else int(mw) for fcbl, mw in zip(is_fcbl, target_mw)],
+        'Target Demand (MW)': target_mw, 'Demand Type': "Increase/Decrease Load", 'Plant Comments': "",
+    })
+    return dispatch_df, availability_df
+
+
+def write_input_workbook(path, dispatch_df, availability_df):
+    engine = 'xlsxwriter' if step1.xlsxwriter is not None else 'openpyxl'
+    with pd.ExcelWriter(path, engine=engine, datetime_format='YYYY-MM-DD HH:MM:SS') as writer:
+        dispatch_df.to_excel(writer, sheet_name=step1.DISPATCH_SHEET, index=False)
+        availability_df.to_excel(writer, sheet_name=step1.AVAILABILITY_SHEET, index=False)
+
+
+def run_once(input_path, work_dir, settings, timings):
+    """One timed Step 1 run of input_path. Returns the number of minutes computed."""
+    logger = logging.getLogger("fadl.benchmark.step1")
+    processor = step1.LoadProcessor(logger, file_path=input_path, export_dir=work_dir, use_input_cache=False, incremental=False, **settings)
+    _, _, available_months = time_stage(timings, 'read_excel_data', processor.read_excel_data, input_path)
+    if not available_months:
+        raise RuntimeError(f"The synthetic input has no months: {processor.notices}")
+    time_stage(timings, 'prepare_instructions', processor._prepare_instruction_table)
+    time_stage(timings, 'prepare_availability', processor._prepare_hourly_availability_lookup)
+    month_starts = processor._dispatch_month_range()
+    start_load = processor.get_initial_availability_load(month_starts[0])
+    if len(month_starts) > 1:
+        result_df = time_stage(timings, 'minute_wise_processing', processor.process_all_months, month_starts, start_load)
+    else:
+        result_df = time_stage(timings, 'minute_wise_processing', processor.perform_minute_wise_processing,
+                               None, processor.df_availability, month_starts[0], start_load)
+    time_stage(timings, 'lpm', step1.compute_lpm_half_hourly, result_df['Date Time Stamp'], result_df['Load'].to_numpy(dtype=np.float64))
+    output_path = os.path.join(work_dir, step1.DEFAULT_OUTPUT_FILE_NAME)
+    time_stage(timings, 'save_output_excel', processor.save_output_excel, result_df, output_path)
+    if output_path not in processor.output_paths:
+        raise RuntimeError(f"save_output_excel did not write the workbook: {processor.notices}")
+    return len(result_df)
+
+
+def run_scenario(params, engine, writer, repeat, seed=0):
+    """Time repeat runs of one scenario. Returns its result entry."""
+    params = dict(params)
+    month_start = params.pop('month_start', DEFAULT_MONTH_START)
+    dispatch_df, availability_df = synthetic_inputs(month_start, seed=seed, **params)
+    timings = {}
+    with tempfile.TemporaryDirectory(prefix="fadl-bench-") as work_dir:
+        input_path = os.path.join(work_dir, "Synthetic Input.xlsx")
+        write_input_workbook(input_path, dispatch_df, availability_df)
+        for _ in range(repeat):
+            minutes = run_once(input_path, work_dir, {'engine': engine, 'writer': writer}, timings)
+    stage_rows = {'read_excel_data': len(dispatch_df) + len(availability_df), 'prepare_instructions': len(dispatch_df),
+                  'prepare_availability': len(availability_df)}
+    return {
+        'params': dict(params, month_start=month_start, engine=engine, writer=writer, seed=seed),
+        'instructions': len(dispatch_df), 'availability_hours': len(availability_df), 'minutes': minutes,
+        'stages': {stage: stage_summary(timings[stage], stage_rows.get(stage, minutes)) for stage in STAGES},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stages of a Step 1 run on synthetic inputs.")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Scenario to run (repeatable). Default: all.")
+    parser.add_argument("--engine", action="append", choices=["Segments", "Minute Loop"], help="Engine to run (repeatable). Default: Segments.")
+    parser.add_argument("--writer", choices=["Fast", "Standard"], default="Fast")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per scenario; the median is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--months", type=int, help="Run a custom scenario of this many months instead of the presets.")
+    parser.add_argument("--instructions-per-day", type=float, default=6, help="Custom scenario.")
+    parser.add_argument("--fcbl-share", type=float, default=0.4, help="Custom scenario.")
+    parser.add_argument("--gap-share", type=float, default=0.0, help="Custom scenario.")
+    parser.add_argument("--month-start", default=DEFAULT_MONTH_START, help="Custom scenario.")
+    parser.add_argument("--save", metavar="JSON", help="Write the results as a baseline.")
+    parser.add_argument("--compare", metavar="JSON", help="Compare with a baseline, exit 1 on a regression.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline (0.25 = 25%%).")
+    args = parser.parse_args(argv)
+
+    if args.months:
+        scenarios = {'custom': {'months': args.months, 'instructions_per_day': args.instructions_per_day, 'fcbl_share': args.fcbl_share,
+                                'gap_share': args.gap_share, 'month_start': args.month_start}}
+    else:
+        scenarios = {name: SCENARIOS[name] for name in (args.scenario or SCENARIOS)}
+    results = {}
+    for engine in args.engine or ["Segments"]:
+        for name, params in scenarios.items():
+            key = f"{name}/{engine}"
+            if engine == "Minute Loop" and params['months'] > 1:
+                print(f"{key}: skipped, process_all_months always runs the Segments engine")
+                continue
+            result = run_scenario(params, engine, args.writer, args.repeat, args.seed)
+            results[key] = result
+            print(f"{key}: {result['instructions']} instructions, {result['minutes']} minutes")
+            for stage, timing in result['stages'].items():
+                print(f"    {stage:<24}{timing['median']:>9.4f}s (min {timing['min']:.4f}s, {timing['rows_per_second'] or 0:,} rows/s)")
+    for name in scenarios:
+        segments, minute_loop = results.get(f"{name}/Segments"), results.get(f"{name}/Minute Loop")
+        if segments and minute_loop:
+            loop_seconds, segment_seconds = (result['stages']['minute_wise_processing']['median'] for result in (minute_loop, segments))
+            print(f"{name}: minute_wise_processing {loop_seconds:.4f}s with the Minute Loop, {segment_seconds:.4f}s with Segments "
+                  f"(speedup {loop_seconds / segment_seconds:.1f}x)" if segment_seconds > 0 else f"{name}: Segments took no measurable time")
+    if args.save:
+        write_results(args.save, 'step1', results)
+        print(f"Baseline written: {args.save}")
+    if args.compare:
+        regressions = compare_results(args.compare, results, args.tolerance, backend_stages=BACKEND_STAGES)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
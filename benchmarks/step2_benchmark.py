@@ -0,0 +1,230 @@
+"""
+Step 2 benchmark suite and fixture generator. Generates synthetic *.lp meter files (one P.01
+block per day with half-hourly readings), Annex 7 style PDFs and a Step 1 FADL_Calculation
+output, then times each ingestion stage of AnnexConverter and reports rows per second.
+
+    python benchmarks/step2_benchmark.py                                   # every scenario
+    python benchmarks/step2_benchmark.py --meters 48 --days 31 --pages 40   # custom sizes
+    python benchmarks/step2_benchmark.py --write-fixtures /tmp/fixtures --meters 12
+    python benchmarks/step2_benchmark.py --save benchmarks/baselines/step2.json
+    python benchmarks/step2_benchmark.py --compare benchmarks/baselines/step2.json
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common import compare_results, load_step, stage_summary, time_stage, write_results
+
+step2 = load_step('fadl_step2')
+
+SCENARIOS = {
+    'month': {'meters': 4, 'days': 31, 'pages': 10},
+    'many-meters': {'meters': 36, 'days': 31, 'pages': 10},
+    'large-pdf': {'meters': 4, 'days': 31, 'pages': 60},
+}
+DEFAULT_MONTH_START = "2025-05-01"
+ANNEX_ROWS_PER_PAGE = 60
+STAGES = ['parse_lp_file', 'process_lp_files_folder', 'extract_text_from_pdf', 'extract_text_cached', 'parse_pdf_data',
+          'load_uch_excel_data', 'load_uch_columnar']
+
+
+def write_lp_files(folder, meters=4, days=31, month_start=DEFAULT_MONTH_START, seed=0):
+    """
+    meters files '<folder>/Meter NN.lp', each with one P.01(yymmddhhmmss) block per day followed
+    by 48 half-hourly reading lines '(status)(2.9 MW value)(...)'. Returns the paths.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    start = pd.Timestamp(month_start)
+    paths = []
+    for meter in range(1, meters + 1):
+        readings = np.round(rng.uniform(10, 15, (days, 48)), 4)
+        lines = []
+        for day in range(days):
+            lines.append(f"P.01({start + pd.Timedelta(days=day):%y%m%d%H%M%S})")
+            lines.extend(f"(00000000)({value:.4f})(00000000)" for value in readings[day])
+        path = os.path.join(folder, f"Meter {meter:02d}.lp")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        paths.append(path)
+    return paths
+
+
+def annex7_lines(rows, month_start=DEFAULT_MONTH_START, seed=0):
+    """
+    rows Annex 7 text lines of consecutive half hours: the first line of each day starts with
+    its date, the others with Time From and Time To only.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(month_start)
+    lines = []
+    for row in range(rows):
+        time_from = start + pd.Timedelta(minutes=30 * row)
+        demand = rng.uniform(250, 540)
+        achieved = demand - rng.uniform(0, 30)
+        non_compliance = max(0.0, demand - achieved - 5) / 2
+        date = f"{time_from:%d-%m-%Y} " if row == 0 or (time_from.hour == 0 and time_from.minute == 0) else ""
+        lines.append(f"{date}{time_from:%H:%M} {time_from + pd.Timedelta(minutes=30):%H:%M} {demand:.2f} {achieved:.2f} 5.00 "
+                     f"{non_compliance:.2f} {non_compliance * 6053.4:,.2f} 6.0534")
+    return lines
+
+
+def write_text_pdf(path, pages):
+    """A PDF with one page per list of text lines (Courier, one Tj per line), readable by PyPDF2."""
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"}
+    kids = []
+    for number, lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * number, 5 + 2 * number
+        text = ["BT", "/F1 8 Tf", "10 TL", "30 810 Td"]
+        text += ["(%s) Tj T*" % line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream = "\n".join(text + ["ET"]).encode('latin-1')
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                            b"/Resources << /Font << /F1 3 0 R >> >> >>" % content_id)
+        kids.append(b"%d 0 R" % page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offsets[object_id] for object_id in sorted(objects))
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(output)
+
+
+def write_annex7_pdf(path, pages=10, rows_per_page=ANNEX_ROWS_PER_PAGE, month_start=DEFAULT_MONTH_START, seed=0):
+    """An Annex 7 style PDF of pages pages with a heading and rows_per_page rows each. Returns the row count."""
+    lines = annex7_lines(pages * rows_per_page, month_start, seed)
+    write_text_pdf(path, [[f"Annex 7 - Non-Compliance of Dispatch Instructions (page {page + 1})"]
+                          + lines[page * rows_per_page:(page + 1) * rows_per_page] for page in range(pages)])
+    return len(lines)
+
+
+def write_fadl_calculation(path, days=31, month_start=DEFAULT_MONTH_START, seed=0):
+    """
+    A Step 1 output (FADL_Calculation and half-hourly summary sheets) of days days, plus its
+    Parquet copy when pyarrow is installed. Returns the minutes.
+    """
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range(pd.Timestamp(month_start), periods=days * 1440, freq='min')
+    load = np.round(rng.uniform(250, 540, len(stamps)), 3)
+    # Like Step 1, the LPM of a half hour sits on the row of the minute that ends it
+    half_hour_mean = pd.Series(load).groupby(np.arange(len(stamps)) // 30).transform('mean').shift(1)
+    ends_half_hour = (np.arange(len(stamps)) % 30 == 0) & (np.arange(len(stamps)) > 0)
+    result_df = pd.DataFrame({'Date Time Stamp': stamps, 'Availability': 540.0, 'Load': load, 'Target Load': "",
+                              'LPM (30 Min Sum)': np.where(ends_half_hour, half_hour_mean.round(3), np.nan)})
+    engine = 'xlsxwriter' if importlib.util.find_spec('xlsxwriter') is not None else 'openpyxl'
+    with pd.ExcelWriter(path, engine=engine, datetime_format='YYYY-MM-DD HH:MM:SS') as writer:
+        result_df.to_excel(writer, sheet_name='FADL_Calculation', index=False)
+        half_hourly = result_df[stamps.minute % 30 == 0]
+        pd.DataFrame({'Half Hourly Date': half_hourly['Date Time Stamp'], 'LPM (30 Min Sum)': half_hourly['LPM (30 Min Sum)']}).to_excel(
+            writer, sheet_name=f"{stamps[0]:%b-%y}", index=False)
+    try:
+        result_df.to_parquet(os.path.splitext(path)[0] + ".parquet", index=False)
+    except ImportError:
+        pass
+    return len(result_df)
+
+
+def write_fixtures(folder, meters=4, days=31, pages=10, month_start=DEFAULT_MONTH_START, seed=0):
+    """Every Step 2 input in folder: 'LP' with the meter files, 'Annex 7.pdf' and 'FADL Calculation.xlsx'."""
+    lp_paths = write_lp_files(os.path.join(folder, "LP"), meters, days, month_start, seed)
+    annex_rows = write_annex7_pdf(os.path.join(folder, "Annex 7.pdf"), pages, month_start=month_start, seed=seed)
+    minutes = write_fadl_calculation(os.path.join(folder, "FADL Calculation.xlsx"), days, month_start, seed)
+    return {'lp_folder': os.path.join(folder, "LP"), 'lp_files': lp_paths, 'pdf': os.path.join(folder, "Annex 7.pdf"),
+            'annex_rows': annex_rows, 'uch': os.path.join(folder, "FADL Calculation.xlsx"), 'minutes': minutes}
+
+
+def run_once(fixtures, timings, rows):
+    """One timed pass over every ingestion stage; rows gets the rows each stage produced."""
+    converter = step2.AnnexConverter(logging.getLogger("fadl.benchmark.step2"))
+    converter.pdf_cache = step2.PdfTextCache(tempfile.mkdtemp(prefix="pdf-cache-", dir=fixtures['work_dir'])) # Empty for each run
+    lp_df = time_stage(timings, 'parse_lp_file', converter.parse_lp_file, fixtures['lp_files'][0])
+    rows['parse_lp_file'] = len(lp_df)
+    meter_df = time_stage(timings, 'process_lp_files_folder', converter.process_lp_files_folder, fixtures['lp_folder'])
+    rows['process_lp_files_folder'] = len(meter_df) * len(fixtures['lp_files'])
+    text = time_stage(timings, 'extract_text_from_pdf', converter.extract_text_from_pdf, fixtures['pdf'])
+    rows['extract_text_from_pdf'] = fixtures['annex_rows']
+    if time_stage(timings, 'extract_text_cached', converter.extract_text_from_pdf, fixtures['pdf']) != text:
+        raise RuntimeError("The PDF text cache returned different text than the extraction.")
+    rows['extract_text_cached'] = fixtures['annex_rows']
+    uch_path = fixtures['uch']
+    excel_mtime = os.path.getmtime(uch_path)
+    columnar_path = os.path.splitext(uch_path)[0] + ".parquet"
+    if os.path.exists(columnar_path): # Hide the Parquet copy so the workbook itself is read
+        os.utime(columnar_path, (excel_mtime - 60, excel_mtime - 60))
+    uch_lookup = time_stage(timings, 'load_uch_excel_data', converter.load_uch_excel_data, uch_path)
+    rows['load_uch_excel_data'] = fixtures['minutes']
+    if os.path.exists(columnar_path):
+        os.utime(columnar_path, (excel_mtime + 60, excel_mtime + 60))
+        time_stage(timings, 'load_uch_columnar', converter.load_uch_excel_data, uch_path)
+        rows['load_uch_columnar'] = fixtures['minutes']
+    meter_df['Timestamp'] = pd.to_datetime(meter_df['Timestamp'])
+    annex_df = time_stage(timings, 'parse_pdf_data', converter.parse_pdf_data, text, meter_df.set_index('Timestamp'), uch_lookup)
+    rows['parse_pdf_data'] = len(annex_df)
+    if len(annex_df) != fixtures['annex_rows']:
+        raise RuntimeError(f"parse_pdf_data found {len(annex_df)} of the {fixtures['annex_rows']} Annex 7 rows.")
+
+
+def run_scenario(params, repeat, seed=0):
+    timings, rows = {}, {}
+    with tempfile.TemporaryDirectory(prefix="fadl-bench-") as work_dir:
+        fixtures = write_fixtures(work_dir, seed=seed, **params)
+        fixtures['work_dir'] = work_dir
+        for _ in range(repeat):
+            run_once(fixtures, timings, rows)
+    return {'params': dict(params, seed=seed), 'annex_rows': fixtures['annex_rows'], 'minutes': fixtures['minutes'],
+            'stages': {stage: stage_summary(timings[stage], rows[stage]) for stage in STAGES if stage in timings}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Step 2 ingestion stages on synthetic inputs, or write them as fixtures.")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Scenario to run (repeatable). Default: all.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per scenario; the median is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--meters", type=int, help="Custom scenario: number of *.lp files.")
+    parser.add_argument("--days", type=int, default=31, help="Custom scenario: days of readings and FADL_Calculation minutes.")
+    parser.add_argument("--pages", type=int, default=10, help=f"Custom scenario: Annex 7 pages of {ANNEX_ROWS_PER_PAGE} rows.")
+    parser.add_argument("--write-fixtures", metavar="FOLDER", help="Only write the inputs of the custom (or 'month') scenario to FOLDER.")
+    parser.add_argument("--save", metavar="JSON", help="Write the results as a baseline.")
+    parser.add_argument("--compare", metavar="JSON", help="Compare with a baseline, exit 1 on a regression.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline (0.25 = 25%%).")
+    args = parser.parse_args(argv)
+
+    custom = {'meters': args.meters or SCENARIOS['month']['meters'], 'days': args.days, 'pages': args.pages}
+    if args.write_fixtures:
+        fixtures = write_fixtures(args.write_fixtures, seed=args.seed, **custom)
+        print(f"{len(fixtures['lp_files'])} meter files in {fixtures['lp_folder']}, {fixtures['annex_rows']} Annex 7 rows in "
+              f"{fixtures['pdf']}, {fixtures['minutes']} minutes in {fixtures['uch']}")
+        return 0
+    scenarios = {'custom': custom} if args.meters else {name: SCENARIOS[name] for name in (args.scenario or SCENARIOS)}
+    results = {}
+    for name, params in scenarios.items():
+        result = run_scenario(params, args.repeat, args.seed)
+        results[name] = result
+        print(f"{name}: {params['meters']} meters x {params['days']} days, {result['annex_rows']} Annex 7 rows")
+        for stage, timing in result['stages'].items():
+            print(f"    {stage:<26}{timing['median']:>9.4f}s (min {timing['min']:.4f}s, {timing['rows']:,} rows, {timing['rows_per_second'] or 0:,} rows/s)")
+    if args.save:
+        write_results(args.save, 'step2', results)
+        print(f"Baseline written: {args.save}")
+    if args.compare:
+        regressions = compare_results(args.compare, results, args.tolerance, backend_stages={'excel_reader': ['load_uch_excel_data']})
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Run statistics shared by the FADL step scripts: stage timing and memory (RunStats), the
+'<output> - Run Stats.json' report and the cumulative Prometheus metrics file.
+"""
+import os
+import sys
+import time
+import json
+import datetime
+import platform
+import contextlib
+import tracemalloc
+try:
+    import resource # Unix only, for the process peak memory in run reports
+except ImportError:
+    resource = None
+if sys.platform == 'win32': # Windows has no resource module: the peak working set comes from psapi
+    import ctypes
+    from ctypes import wintypes
+
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD), ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t), ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+# Cumulative run metrics in the Prometheus text format, for a monitoring agent to scrape.
+# Step 1 and Step 2 add their own series to the same file.
+METRICS_FILE_PATH = os.path.join(os.path.expanduser("~"), "FADL Logs", "fadl_metrics.prom")
+RUN_STATS_COLUMNS = ['Stage', 'Wall Seconds', 'CPU Seconds', 'Process Peak MB', 'Allocated Peak MB', 'Calls']
+
+
+def _windows_peak_working_set_mb():
+    """PeakWorkingSetSize of this process from GetProcessMemoryInfo, None if the call fails."""
+    try:
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_current_process.restype = wintypes.HANDLE
+        get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(_ProcessMemoryCounters), wintypes.DWORD]
+        get_memory_info.restype = wintypes.BOOL
+        if not get_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize / (1024 * 1024)
+
+
+def process_peak_memory_mb():
+    """Highest memory use (resident set, or working set on Windows) of this process so far, None where the platform does not report it."""
+    if sys.platform == 'win32':
+        return _windows_peak_working_set_mb()
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == 'darwin' else 1024) # KiB on Linux, bytes on macOS
+
+
+class RunStats:
+    """
+    Wall time, CPU time and memory of the stages of one run, timed with
+    'with run_stats.stage("LPM"):'. A stage entered more than once adds up. CPU time is that of
+    this process (worker processes are not included).
+
+    process_peak_mb is the process's memory high-water mark when the stage ended, so the stage
+    where it jumps is the one that raised it. With trace_memory, allocated_peak_mb is the most
+    memory the stage allocated through Python (NumPy arrays included) on top of what was
+    allocated when it started. Tracing makes Python-heavy stages several times slower, so it is
+    off unless asked for.
+    """
+    def __init__(self, input_stats=None, trace_memory=False):
+        self.started = datetime.datetime.now()
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.counts = {} # Sizes of the run, e.g. minutes, instructions or Annex 7 rows
+        self._open = [] # [traced bytes at entry, highest traced bytes seen] of the open stages
+        self._tracing = False
+        if input_stats is not None: # Step 1's window reads the input before the run starts
+            self.stages = {name: dict(entry) for name, entry in input_stats.stages.items()}
+            self.counts = dict(input_stats.counts)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            if not self._open and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            _, peak = tracemalloc.get_traced_memory()
+            for entry in self._open:
+                entry[1] = max(entry[1], peak)
+            tracemalloc.reset_peak()
+            self._open.append([tracemalloc.get_traced_memory()[0]] * 2)
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+            entry = self.stages.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0, 'process_peak_mb': None})
+            entry['wall_seconds'] += wall
+            entry['cpu_seconds'] += cpu
+            entry['calls'] += 1
+            entry['process_peak_mb'] = process_peak_memory_mb()
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+                at_entry, seen = self._open.pop()
+                for open_entry in self._open:
+                    open_entry[1] = max(open_entry[1], peak)
+                if not self._open and self._tracing:
+                    tracemalloc.stop()
+                    self._tracing = False
+                entry['allocated_peak_mb'] = max(entry.get('allocated_peak_mb', 0.0), (max(seen, peak) - at_entry) / 1e6)
+
+    def rows(self):
+        """The stages as rows of RUN_STATS_COLUMNS, for the Run Stats sheet."""
+        def mb(value):
+            return round(value, 1) if value is not None else None
+        return [[name, round(entry['wall_seconds'], 3), round(entry['cpu_seconds'], 3), mb(entry['process_peak_mb']),
+                 mb(entry.get('allocated_peak_mb')), entry['calls']] for name, entry in self.stages.items()]
+
+    def summary(self):
+        """One line of where the run spent its time, for the status log."""
+        return ", ".join(f"{name} {entry['wall_seconds']:.2f}s" + (f" ({entry['allocated_peak_mb']:.0f} MB allocated)" if 'allocated_peak_mb' in entry else "")
+                         for name, entry in self.stages.items())
+
+    def report(self, **details):
+        """The run report: details (step, status, input, outputs...), the stages, the counts and the machine."""
+        stages = {name: {key: round(value, 6) if isinstance(value, float) else value for key, value in entry.items()}
+                  for name, entry in self.stages.items()}
+        peak_mb = process_peak_memory_mb()
+        return dict(details, started=self.started.isoformat(timespec='seconds'), finished=datetime.datetime.now().isoformat(timespec='seconds'),
+                    stages=stages, total_wall_seconds=round(sum(e['wall_seconds'] for e in self.stages.values()), 6),
+                    total_cpu_seconds=round(sum(e['cpu_seconds'] for e in self.stages.values()), 6), counts=self.counts,
+                    process_peak_mb=round(peak_mb, 1) if peak_mb is not None else None, memory_traced=self.trace_memory,
+                    machine={'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()})
+
+
+def write_run_report(report, output_path):
+    """Write a RunStats report as '<output name> - Run Stats.json' next to output_path. Returns its path."""
+    report_path = os.path.splitext(output_path)[0] + " - Run Stats.json"
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+        f.write("\n")
+    return report_path
+
+
+METRIC_HELP = {
+    'fadl_runs_total': ('counter', "FADL runs by step and status."),
+    'fadl_stage_seconds_total': ('counter', "Wall time spent in each stage."),
+    'fadl_stage_cpu_seconds_total': ('counter', "CPU time spent in each stage."),
+    'fadl_stage_calls_total': ('counter', "Times each stage ran."),
+    'fadl_items_total': ('counter', "Items processed (minutes, instructions, rows...)."),
+    'fadl_stage_process_peak_bytes': ('gauge', "Process memory high-water mark at the end of each stage in the last run."),
+    'fadl_stage_allocated_peak_bytes': ('gauge', "Peak memory allocated in each stage in the last run (traced runs only)."),
+    'fadl_last_run_seconds': ('gauge', "Wall time of the last run."),
+    'fadl_last_run_timestamp_seconds': ('gauge', "Unix time the last run finished."),
+}
+
+
+def update_metrics_file(path, report):
+    """
+    Add a run report to the cumulative metrics in path (Prometheus text format). The file is
+    rewritten whole under a lock file, so Step 1, Step 2 and batch workers can share it.
+    """
+    step = report['step']
+    updates = {f'fadl_runs_total{{step="{step}",status="{report["status"]}"}}': 1}
+    for name, entry in report['stages'].items():
+        labels = f'{{step="{step}",stage="{name}"}}'
+        updates.update({f'fadl_stage_seconds_total{labels}': entry['wall_seconds'], f'fadl_stage_cpu_seconds_total{labels}': entry['cpu_seconds'],
+                        f'fadl_stage_calls_total{labels}': entry['calls']})
+    for item, count in report['counts'].items():
+        updates[f'fadl_items_total{{step="{step}",item="{item}"}}'] = count
+    gauges = {}
+    for name, entry in report['stages'].items():
+        labels = f'{{step="{step}",stage="{name}"}}'
+        if entry.get('process_peak_mb') is not None:
+            gauges[f'fadl_stage_process_peak_bytes{labels}'] = round(entry['process_peak_mb'] * 1e6)
+        if entry.get('allocated_peak_mb') is not None:
+            gauges[f'fadl_stage_allocated_peak_bytes{labels}'] = round(entry['allocated_peak_mb'] * 1e6)
+    gauges.update({f'fadl_last_run_seconds{{step="{step}"}}': report['total_wall_seconds'],
+                   f'fadl_last_run_timestamp_seconds{{step="{step}"}}': round(time.time())})
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    lock_path = path + ".lock"
+    for _ in range(100):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > 30: # Left behind by a killed run
+                    os.remove(lock_path)
+            except OSError:
+                pass
+            time.sleep(0.05)
+    else:
+        raise TimeoutError(f"Metrics file {path} stayed locked.")
+    try:
+        series = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip() and not line.startswith('#'):
+                        key, value = line.rsplit(' ', 1)
+                        series[key] = float(value)
+        for key, value in updates.items():
+            series[key] = series.get(key, 0.0) + value
+        step_label = f'step="{step}"'
+        series = {key: value for key, value in series.items() # Gauges describe the last run only
+                  if not (METRIC_HELP.get(key.split('{')[0], ('counter',))[0] == 'gauge' and step_label in key)}
+        series.update({key: float(value) for key, value in gauges.items()})
+        lines = []
+        for metric, (metric_type, help_text) in METRIC_HELP.items():
+            metric_series = sorted(key for key in series if key.split('{')[0] == metric)
+            if metric_series:
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}"]
+                lines += [f"{key} {int(series[key]) if series[key].is_integer() else round(series[key], 6)}" for key in metric_series]
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+    finally:
+        os.remove(lock_path)